@@ -0,0 +1,95 @@
+import asyncio
+import os
+
+from .executor import Saturated
+
+
+class BatchScheduler:
+    """
+    Collects concurrent prediction requests into batched forward passes.
+
+    Callers `await submit(inputs)` with the tensors produced by `prepare_inputs`.
+    A single background task drains the queue, waiting at most `max_wait_ms`
+    for a batch to fill up to `max_batch_size`, runs `predict_batch` off the
+    event loop and resolves each caller's future with its own result.
+    """
+
+    def __init__(self, predict_batch, max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                 max_queue: int = 0, executor=None):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.max_queue = max(int(max_queue), 0)
+        self.executor = executor
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def saturated(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    async def submit(self, inputs):
+        if self._task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((inputs, future))
+        except asyncio.QueueFull:
+            raise Saturated("Inference queue is full")
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Callers that gave up (client disconnect, timeout) don't need a forward pass
+        return [(inputs, fut) for inputs, fut in batch if not fut.done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(self.executor, self.predict_batch, [inputs for inputs, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+
+def scheduler_from_env(predict_batch, executor=None):
+    return BatchScheduler(
+        predict_batch,
+        max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "8")),
+        max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "10")),
+        max_queue=int(os.getenv("BATCH_MAX_QUEUE", "64")),
+        executor=executor,
+    )
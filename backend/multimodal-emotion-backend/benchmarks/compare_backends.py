@@ -0,0 +1,80 @@
+"""
+Compare inference backends against eager fp32 on accuracy and latency.
+
+    python -m app.benchmarks.compare_backends --batch-size 8 --atol 0.02
+
+Feeds the same random audio/video batch and text hints through every
+backend, reports the max absolute probability difference and top-1
+agreement versus eager fp32, and the median latency of text encoding and
+classification. Exits non-zero if any backend exceeds the tolerance.
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import torch
+
+from ..model_wrapper import EmotionPredictor, _emotions, _model_path
+from ..inference_backends import BACKENDS, build_backend
+
+TEXTS = ["", "I can't believe you did this!", "What a wonderful surprise.", "Leave me alone."]
+
+
+def run_backend(backend, tokenizer, audio, video, repeat):
+    enc = tokenizer(TEXTS, return_tensors="pt", truncation=True, padding="max_length", max_length=128)
+    batch_size = audio.size(0)
+    text_ms, clf_ms = [], []
+    probs = None
+    with torch.no_grad():
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            emb = backend.encode_text(enc["input_ids"], enc["attention_mask"])
+            t1 = time.perf_counter()
+            text_emb = emb[torch.arange(batch_size) % emb.size(0)]
+            logits = backend.classify(text_emb, audio, video)
+            t2 = time.perf_counter()
+            text_ms.append((t1 - t0) * 1000.0)
+            clf_ms.append((t2 - t1) * 1000.0)
+            probs = torch.softmax(logits, dim=1)
+    return probs, statistics.median(text_ms), statistics.median(clf_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", default=_model_path)
+    parser.add_argument("--export-dir", default="exported")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--atol", type=float, default=0.02, help="Max allowed probability difference vs fp32")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    predictor = EmotionPredictor(args.model_path, _emotions)
+    model = predictor.model.cpu()
+    audio = torch.randn(args.batch_size, 1, 16000) * 0.1
+    video = torch.rand(args.batch_size, 3, 16, 112, 112)
+
+    reference, _, _ = run_backend(build_backend("eager", model), predictor.tokenizer, audio, video, 1)
+
+    failed = False
+    print(f"{'backend':<12}{'text ms':>10}{'classify ms':>13}{'max |dp|':>10}{'top-1 agree':>13}")
+    for name in args.backends:
+        try:
+            backend = build_backend(name, model, export_dir=args.export_dir)
+        except Exception as e:
+            print(f"{name:<12} unavailable: {e}")
+            continue
+        probs, text_ms, clf_ms = run_backend(backend, predictor.tokenizer, audio, video, args.repeat)
+        max_diff = (probs - reference).abs().max().item()
+        agree = (probs.argmax(dim=1) == reference.argmax(dim=1)).float().mean().item()
+        ok = max_diff <= args.atol
+        failed |= not ok
+        print(f"{name:<12}{text_ms:>10.1f}{clf_ms:>13.1f}{max_diff:>10.4f}{agree:>13.2%}{'' if ok else '  FAIL'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Local stand-ins for benchmarks: synthetic clips, a stub checkpoint and a fake OpenAI server."""
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_synthetic_video(path, seconds, fps=25, size=(640, 360), gop=250):
+    """H.264/AAC test pattern via ffmpeg, or a silent mp4v clip via OpenCV when ffmpeg is missing."""
+    if shutil.which("ffmpeg"):
+        subprocess.run(
+            ["ffmpeg", "-y", "-v", "error",
+             "-f", "lavfi", "-i", f"testsrc2=size={size[0]}x{size[1]}:rate={fps}:duration={seconds}",
+             "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+             "-c:v", "libx264", "-preset", "ultrafast", "-g", str(gop),
+             "-c:a", "aac", "-shortest", path],
+            check=True
+        )
+        return
+    import cv2
+    import numpy as np
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for i in range(int(seconds * fps)):
+        frame = np.full((size[1], size[0], 3), i % 256, dtype=np.uint8)
+        cv2.putText(frame, str(i), (20, size[1] // 2), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        writer.write(frame)
+    writer.release()
+
+
+def make_stub_model(out_dir, num_classes=7, bert_layers=2, base="bert-base-uncased"):
+    """
+    Write a randomly initialized checkpoint plus a BERT config/tokenizer directory.
+
+    The BERT stack is cut to `bert_layers` (hidden size stays 768 so the
+    fusion head matches) which keeps the file small while exercising the
+    real code path. Point MODEL_PATH and BERT_NAME at the returned paths.
+    """
+    import torch
+    from transformers import BertConfig, BertTokenizer
+
+    from ..model_wrapper import MultimodalModel
+
+    bert_dir = os.path.join(out_dir, "bert")
+    config = BertConfig.from_pretrained(base, num_hidden_layers=bert_layers)
+    config.save_pretrained(bert_dir)
+    BertTokenizer.from_pretrained(base).save_pretrained(bert_dir)
+
+    model = MultimodalModel(num_classes=num_classes, bert_config=config, pretrained_bert=False)
+    model_path = os.path.join(out_dir, "stub_model.pth")
+    torch.save(model.state_dict(), model_path)
+    return model_path, bert_dir
+
+
+class FakeOpenAIServer:
+    """
+    Minimal OpenAI-compatible `/v1/chat/completions` endpoint on localhost.
+
+    `latency` delays every response; `fail_every` answers every Nth
+    request with a 429 so retry paths can be exercised.
+    """
+
+    def __init__(self, latency=0.2, fail_every=0, reply=None):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.reply = reply or (
+            "### Explanation of Mismatch\nSynthetic feedback.\n\n"
+            "KEY SUMMARY: Add more vocal energy and keep an open posture."
+        )
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+                    n = fake.requests
+                time.sleep(fake.latency)
+                if fake.fail_every and n % fake.fail_every == 0:
+                    payload, status = {"error": {"message": "Rate limit reached", "type": "rate_limit"}}, 429
+                else:
+                    messages = body.get("messages", [])
+                    payload, status = {
+                        "id": f"chatcmpl-{n}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "gpt-4o-mini"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": fake.reply},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": sum(len(m.get("content", "")) // 4 for m in messages),
+                                  "completion_tokens": len(fake.reply) // 4,
+                                  "total_tokens": 0},
+                    }, 200
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", "0.1")
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
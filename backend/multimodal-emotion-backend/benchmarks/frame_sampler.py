@@ -0,0 +1,87 @@
+"""
+Benchmark the frame sampler against the original per-frame seek loop.
+
+    python -m app.benchmarks.frame_sampler --seconds 300 --repeat 3
+
+Generates a synthetic H.264 clip with ffmpeg (falls back to OpenCV's mp4v
+writer when ffmpeg is missing), then times each sampler and checks that
+the sequential pass returns the same frames as the seek loop.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from ..frame_sampler import sample_frames
+from .fixtures import make_synthetic_video
+
+
+def seek_sample_frames(video_path, num_frames=16, frame_size=112):
+    """The sampler `EmotionPredictor.extract_video_frames` used to run: one seek per frame."""
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(total // num_frames, 1)
+    frames = []
+    for i in range(0, total, step):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame = cv2.resize(frame, (frame_size, frame_size))
+        frames.append(frame)
+        if len(frames) >= num_frames:
+            break
+    cap.release()
+    return frames
+
+
+def time_sampler(fn, path, repeat):
+    timings = []
+    frames = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        frames = fn(path)
+        timings.append((time.perf_counter() - t0) * 1000.0)
+    return frames, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=300.0)
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--video", help="Benchmark an existing file instead of a synthetic clip")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.video
+        if not path:
+            path = os.path.join(tmp, "synthetic.mp4")
+            make_synthetic_video(path, args.seconds, fps=args.fps)
+
+        samplers = {
+            "seek (original)": seek_sample_frames,
+            "sequential": lambda p: sample_frames(p, mode="sequential"),
+            "keyframe": lambda p: sample_frames(p, mode="keyframe"),
+        }
+        results = {}
+        print(f"{'sampler':<18}{'median ms':>12}{'min ms':>12}{'frames':>8}")
+        for name, fn in samplers.items():
+            frames, timings = time_sampler(fn, path, args.repeat)
+            results[name] = frames
+            print(f"{name:<18}{statistics.median(timings):>12.1f}{min(timings):>12.1f}{len(frames):>8}")
+
+        reference, candidate = results["seek (original)"], results["sequential"]
+        identical = len(reference) == len(candidate) and all(
+            np.array_equal(a, b) for a, b in zip(reference, candidate)
+        )
+        print(f"sequential frames identical to seek loop: {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+End-to-end benchmark of the emotion pipeline, fully local.
+
+    python -m app.benchmarks.pipeline --seconds 30 --concurrency 1 4 16
+
+Builds a synthetic clip, a stub checkpoint (BERT cut to --bert-layers,
+pass --real-model to use MODEL_PATH instead) and a fake OpenAI server,
+then reports:
+
+  * per-stage latency percentiles from calling each stage directly
+    (upload write, ffprobe, legacy ffmpeg trim, single-pass decode,
+    moviepy audio, OpenCV frames, tokenization, BERT, CNN branches +
+    fusion head, OpenAI call),
+  * /predict throughput and latency at each concurrency level, plus the
+    server-side stage breakdown from /metrics,
+  * peak RSS of this process and of ffmpeg children.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from collections import OrderedDict
+
+from .fixtures import FakeOpenAIServer, make_stub_model, make_synthetic_video
+
+
+def summarize(samples):
+    from ..timing import percentile
+
+    values = sorted(samples)
+    return {q: percentile(values, p) for q, p in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))}
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'stage':<28}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for name, stats in rows.items():
+        print(f"{name:<28}{stats['p50']:>10}{stats['p90']:>10}{stats['p99']:>10}")
+
+
+def legacy_trim(input_path):
+    """
+    The old /predict preprocessing step: re-encode the clip to a fragmented
+    MP4 with ffmpeg before decoding it again. Kept here as a baseline only.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-v", "error", "-i", input_path,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c:v", "libx264", "-preset", "ultrafast",
+        "-c:a", "aac", "-b:a", "128k", "-ac", "2",
+        "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+        "-f", "mp4", "pipe:1",
+    ]
+    return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+
+
+def profile_stages(video_path, repeat):
+    import torch
+
+    from .. import model_wrapper, video_utils
+    from ..openai_client import generate_recommendations
+    from ..scratch import ScratchSpace
+
+    predictor = model_wrapper.get_predictor()
+    with open(video_path, "rb") as f:
+        video_bytes = f.read()
+    duration = video_utils.probe_media(video_path)["duration"]
+    enc = predictor.tokenizer("a short text hint", return_tensors="pt", truncation=True,
+                              padding="max_length", max_length=128)
+    emb = predictor.embed_text("a short text hint")
+    audio = predictor.extract_audio(video_path)
+    video = predictor.extract_video_frames(video_path)
+    prediction = {"predicted_emotion": "anger", "confidence": 0.5, "modalities": {}}
+    scratch_space = ScratchSpace(os.path.join(os.path.dirname(video_path), "scratch"), gc_interval_s=0)
+
+    def in_scratch(fn):
+        def run():
+            with scratch_space.session() as scratch:
+                return fn(scratch)
+        return run
+
+    stages = OrderedDict([
+        ("upload_write", in_scratch(lambda scratch: video_utils.save_upload(video_bytes, "bench.mp4", scratch))),
+        ("ffprobe", lambda: video_utils.probe_media(video_path)),
+        ("ffmpeg_trim (legacy)", in_scratch(
+            lambda scratch: legacy_trim(video_utils.save_upload(video_bytes, "bench.mp4", scratch)))),
+        ("single_pass_decode", lambda: video_utils.decode_clip(video_path, 0.0, min(duration, 300.0))),
+        ("moviepy_audio (legacy)", lambda: predictor.extract_audio(video_path)),
+        ("opencv_frames", lambda: predictor.extract_video_frames(video_path)),
+        ("tokenize", lambda: predictor.tokenizer("a short text hint", return_tensors="pt", truncation=True,
+                                                 padding="max_length", max_length=128)),
+        ("bert", lambda: predictor.backend.encode_text(enc["input_ids"], enc["attention_mask"])),
+        ("cnn_branches+head", lambda: predictor.backend.classify(emb, audio, video)),
+        ("openai", lambda: asyncio.run(generate_recommendations(prediction, "joy"))),
+    ])
+
+    rows = OrderedDict()
+    with torch.no_grad():
+        for name, fn in stages.items():
+            samples = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn()
+                samples.append((time.perf_counter() - t0) * 1000.0)
+            rows[name] = summarize(samples)
+    return rows
+
+
+async def load_test(video_path, levels, requests_per_level):
+    import httpx
+
+    from .. import main
+
+    with open(video_path, "rb") as f:
+        video_bytes = f.read()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        async def one(sem, latencies, statuses):
+            async with sem:
+                t0 = time.perf_counter()
+                resp = await client.post(
+                    "/predict",
+                    files={"video": ("bench.mp4", video_bytes, "video/mp4")},
+                    data={"user_emotion": "joy"},
+                )
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+                statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+        print(f"\n/predict load test ({requests_per_level} requests per level)")
+        print(f"{'concurrency':>12}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}  statuses")
+        for level in levels:
+            sem = asyncio.Semaphore(level)
+            latencies, statuses = [], {}
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(sem, latencies, statuses) for _ in range(requests_per_level)))
+            elapsed = time.perf_counter() - t0
+            stats = summarize(latencies)
+            print(f"{level:>12}{requests_per_level / elapsed:>10.2f}{stats['p50']:>10}{stats['p90']:>10}"
+                  f"{stats['p99']:>10}  {statuses}")
+
+        server_stages = (await client.get("/metrics")).json()["stages"]
+        print_table("Server-side stages (/metrics)", OrderedDict(
+            (name, {"p50": s["p50_ms"], "p90": s["p90_ms"], "p99": s["p99_ms"]})
+            for name, s in server_stages.items()
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30.0, help="Synthetic clip length")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per stage in the stage profile")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level")
+    parser.add_argument("--bert-layers", type=int, default=2)
+    parser.add_argument("--real-model", action="store_true")
+    parser.add_argument("--openai-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(latency=args.openai_latency) as fake:
+        # Everything below reads its configuration from the environment at import time
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ["OPENAI_API_KEY"] = "bench"
+        os.environ["RESULT_CACHE_MAX_BYTES"] = "0"
+        os.environ["EAGER_WARMUP"] = "0"
+        if not args.real_model:
+            os.environ["MODEL_PATH"] = os.path.join(tmp, "stub_model.pth")
+            os.environ["BERT_NAME"] = os.path.join(tmp, "bert")
+            make_stub_model(tmp, bert_layers=args.bert_layers)
+
+        video_path = os.path.join(tmp, "bench.mp4")
+        make_synthetic_video(video_path, args.seconds)
+
+        from .. import model_wrapper
+        model_wrapper.warmup()
+        print(f"startup phases (ms): {model_wrapper.startup_report()}")
+
+        print_table("Stage profile (direct calls)", profile_stages(video_path, args.repeat))
+        asyncio.run(load_test(video_path, args.concurrency, args.requests))
+
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0
+    print(f"\npeak RSS: {self_rss:.0f} MiB (process), {child_rss:.0f} MiB (largest child, e.g. ffmpeg)")
+
+
+if __name__ == "__main__":
+    main()
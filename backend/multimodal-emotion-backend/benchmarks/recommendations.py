@@ -0,0 +1,112 @@
+"""
+Exercise the async OpenAI client against a local fake server.
+
+    python -m app.benchmarks.recommendations --calls 64
+
+Runs three scenarios and exits non-zero if any expectation fails:
+
+  * coalescing: concurrent identical mismatches share one upstream request,
+  * 429 storm: every 2nd upstream request is rate limited, calls (each
+    with its own coalesce key) still succeed through Retry-After aware retries,
+  * deadline: a server slower than the per-call deadline yields a
+    "timeout" error dict within the deadline instead of hanging.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from .fixtures import FakeOpenAIServer
+
+
+def same(n):
+    """`n` copies of one mismatch, all under the same coalesce key."""
+    return [{"predicted_emotion": "anger", "confidence": 0.55, "modalities": {}}] * n
+
+
+# Every emotion but the intended "joy", in each confidence band: 18 distinct default coalesce keys
+_SPREAD = [(emotion, confidence) for confidence in (0.2, 0.55, 0.85)
+           for emotion in ("anger", "disgust", "fear", "neutral", "sadness", "surprise")]
+
+
+def distinct(n):
+    """`n` mismatches cycling through `_SPREAD`."""
+    return [{"predicted_emotion": emotion, "confidence": confidence, "modalities": {}}
+            for emotion, confidence in (_SPREAD[i % len(_SPREAD)] for i in range(n))]
+
+
+def _configure(base_url, rate):
+    # The client reads its settings from the environment at import time
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_RATE_PER_S"] = str(rate)
+    os.environ["OPENAI_BURST"] = str(max(int(rate), 1))
+
+
+async def _run(calls, predictions, deadline_s=None, distinct_keys=False):
+    """`distinct_keys` gives every call its own coalesce key, so each one reaches the server."""
+    from .. import openai_client
+
+    t0 = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(
+            openai_client.generate_recommendations(
+                prediction, "joy", deadline_s=deadline_s, coalesce_key=("bench", i) if distinct_keys else None,
+            )
+            for i, prediction in enumerate(predictions(calls))
+        ))
+    finally:
+        await openai_client.close_client()
+    return results, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server latency per request")
+    parser.add_argument("--rate", type=float, default=50.0, help="OPENAI_RATE_PER_S for the run")
+    args = parser.parse_args()
+
+    failures = []
+
+    with FakeOpenAIServer(latency=args.latency) as fake:
+        _configure(fake.base_url, args.rate)
+        from .. import openai_client
+
+        results, elapsed = asyncio.run(_run(args.calls, same))
+        ok = sum("error" not in r for r in results)
+        print(f"coalescing: {args.calls} calls -> {fake.requests} upstream requests, "
+              f"{ok} ok, {elapsed * 1000:.0f} ms")
+        if fake.requests != 1 or ok != args.calls:
+            failures.append("coalescing")
+
+    with FakeOpenAIServer(latency=args.latency, fail_every=2) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        before = openai_client.client_stats()
+        results, elapsed = asyncio.run(_run(args.calls, distinct, distinct_keys=True))
+        stats = openai_client.client_stats()
+        ok = sum("error" not in r for r in results)
+        retries = stats["retries"] - before["retries"]
+        rate_limited = stats["rate_limited"] - before["rate_limited"]
+        print(f"429 storm: {ok}/{len(results)} ok, {fake.requests} upstream requests, "
+              f"{rate_limited} rate limited, {retries} retries, {elapsed * 1000:.0f} ms")
+        if ok != len(results) or retries == 0 or rate_limited == 0:
+            failures.append("429 storm")
+
+    with FakeOpenAIServer(latency=2.0) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        results, elapsed = asyncio.run(_run(4, distinct, deadline_s=0.5, distinct_keys=True))
+        codes = {r.get("error") for r in results}
+        print(f"deadline: codes {codes}, {elapsed * 1000:.0f} ms for a 500 ms deadline")
+        if codes != {"timeout"} or elapsed > 1.5:
+            failures.append("deadline")
+
+    print(f"\nclient stats: {openai_client.client_stats()}")
+    if failures:
+        print(f"FAILED: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
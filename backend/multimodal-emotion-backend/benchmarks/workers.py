@@ -0,0 +1,165 @@
+"""
+Load test of multi-worker serving (gunicorn.conf.py) at several worker counts.
+
+    python -m app.benchmarks.workers --workers 1 2 4 --concurrency 16 --requests 128
+
+For each worker count, starts gunicorn on a free port with a stub
+checkpoint (pass --real-model to serve MODEL_PATH instead), a synthetic
+clip and a fake OpenAI server. It waits until every worker has warmed up,
+then fires --requests /predict calls over real HTTP at --concurrency.
+Reports throughput and latency, plus the summed RSS and PSS of the master
+and its workers. PSS counts shared pages once per sharer, so it stays
+close to flat as workers are added when the weights are really shared.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from .fixtures import FakeOpenAIServer, make_stub_model, make_synthetic_video
+from .pipeline import summarize
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid):
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except OSError:
+        children = []
+    for child in children:
+        pids.extend(process_tree(child))
+    return pids
+
+
+def memory_mib(pid):
+    """(RSS, PSS) in MiB summed over `pid` and its descendants (ffmpeg children included)."""
+    rss = pss = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+                    elif line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+        except OSError:
+            pass
+    return rss / 1024.0, pss / 1024.0
+
+
+def start_server(workers, port, env):
+    env = dict(env, WEB_CONCURRENCY=str(workers), PORT=str(port))
+    # `app.main:app` resolves against the directory that holds the package
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(PACKAGE_DIR, "gunicorn.conf.py")],
+        cwd=os.path.dirname(PACKAGE_DIR), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+
+
+async def run_level(base_url, video_bytes, workers, concurrency, requests, server):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        deadline = time.monotonic() + 300
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"gunicorn exited: {server.stderr.read().decode(errors='ignore')[-2000:]}")
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("Server did not become ready within 300s.")
+            await asyncio.sleep(0.5)
+
+        async def one(latencies, statuses):
+            t0 = time.perf_counter()
+            resp = await client.post(
+                "/predict",
+                files={"video": ("bench.mp4", video_bytes, "video/mp4")},
+                data={"user_emotion": "joy"},
+            )
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+        # Connections land on whichever worker accepts first; enough warmup calls reach every worker
+        await asyncio.gather(*(one([], {}) for _ in range(workers * 4)))
+
+        sem = asyncio.Semaphore(concurrency)
+        latencies, statuses = [], {}
+
+        async def bounded():
+            async with sem:
+                await one(latencies, statuses)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(bounded() for _ in range(requests)))
+        elapsed = time.perf_counter() - t0
+    return requests / elapsed, summarize(latencies), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--seconds", type=float, default=10.0, help="Synthetic clip length")
+    parser.add_argument("--bert-layers", type=int, default=2)
+    parser.add_argument("--real-model", action="store_true")
+    parser.add_argument("--pin", action="store_true", help="PIN_WORKERS=1 (CPU affinity per worker)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(latency=0.05) as fake:
+        env = dict(os.environ, OPENAI_BASE_URL=fake.base_url, OPENAI_API_KEY="bench",
+                   RESULT_CACHE_MAX_BYTES="0", RESULT_CACHE_DIR=os.path.join(tmp, "result_cache"),
+                   SCRATCH_DIR=os.path.join(tmp, "scratch"), PIN_WORKERS="1" if args.pin else "0")
+        if not args.real_model:
+            model_path, bert_dir = make_stub_model(tmp, bert_layers=args.bert_layers)
+            env.update(MODEL_PATH=model_path, BERT_NAME=bert_dir)
+
+        video_path = os.path.join(tmp, "bench.mp4")
+        make_synthetic_video(video_path, args.seconds)
+        with open(video_path, "rb") as f:
+            video_bytes = f.read()
+
+        print(f"{len(os.sched_getaffinity(0))} cores, {args.requests} requests at concurrency {args.concurrency}")
+        print(f"{'workers':>8}{'req/s':>10}{'speedup':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+              f"{'RSS MiB':>10}{'PSS MiB':>10}  statuses")
+        baseline = None
+        for workers in args.workers:
+            port = free_port()
+            server = start_server(workers, port, env)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                throughput, latency, statuses = asyncio.run(
+                    run_level(base_url, video_bytes, workers, args.concurrency, args.requests, server)
+                )
+                rss, pss = memory_mib(server.pid)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                try:
+                    server.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            baseline = baseline or throughput
+            print(f"{workers:>8}{throughput:>10.2f}{throughput / baseline:>8.2f}x{latency['p50']:>10}"
+                  f"{latency['p90']:>10}{latency['p99']:>10}{rss:>10.0f}{pss:>10.0f}  {statuses}")
+
+
+if __name__ == "__main__":
+    main()
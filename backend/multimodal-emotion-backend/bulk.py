@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import zipfile
+
+from .model_wrapper import prediction_version
+from .openai_client import generate_session_recommendations
+from .result_cache import cache_key
+from .video_utils import decode_file_async, probe_media_async
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".mkv", ".webm", ".avi")
+BULK_MAX_CLIPS = int(os.getenv("BULK_MAX_CLIPS", "100"))
+# Clips decoded at once; the batch scheduler groups their forwards
+BULK_DECODE_CONCURRENCY = int(os.getenv("BULK_DECODE_CONCURRENCY", str(min(os.cpu_count() or 1, 4))))
+
+
+def is_video_name(name: str) -> bool:
+    return name.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_archive(archive_path: str, scratch, max_clips: int = BULK_MAX_CLIPS) -> list:
+    """
+    Unpack the video members of a zip archive into the `scratch` session's directory,
+    reserving their combined size against the scratch quota before writing any.
+    Member paths are flattened, so "../" entries can't escape the directory.
+    Returns [(clip name, path)] in archive order.
+    """
+    clips = []
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [m for m in archive.infolist() if not m.is_dir() and is_video_name(m.filename)]
+        if len(members) > max_clips:
+            raise RuntimeError(f"Archive holds more than {max_clips} clips.")
+        scratch.reserve(sum(member.file_size for member in members))
+        for member in members:
+            path = scratch.path(member.filename)
+            with archive.open(member) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            clips.append((member.filename, path))
+    return clips
+
+
+def directory_clips(root: str, max_clips: int = BULK_MAX_CLIPS) -> list:
+    """[(relative name, path)] of the video files under `root`, sorted by name."""
+    clips = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if is_video_name(name):
+                path = os.path.join(dirpath, name)
+                clips.append((os.path.relpath(path, root), path))
+    clips.sort()
+    if len(clips) > max_clips:
+        raise RuntimeError(f"Directory holds more than {max_clips} clips.")
+    return clips
+
+
+class BulkScorer:
+    """
+    Scores a session of clips through the same stages as /predict.
+
+    Up to `concurrency` clips are probed and decoded at once while earlier
+    clips are embedded and classified, so ffmpeg and the model overlap.
+    Each clip goes through the shared `BatchScheduler`, which folds
+    concurrent clips into batched forward passes.
+    """
+
+    def __init__(self, executor, scheduler, result_cache, prepare_arrays, concurrency: int = BULK_DECODE_CONCURRENCY):
+        self.executor = executor
+        self.scheduler = scheduler
+        self.result_cache = result_cache
+        self.prepare_arrays = prepare_arrays
+        self.concurrency = max(int(concurrency), 1)
+
+    async def score_clip(self, name, path, digest=None):
+        loop = asyncio.get_running_loop()
+        digest = digest or await loop.run_in_executor(None, file_digest, path)
+        key = cache_key(digest, 0.0, None, version=prediction_version())
+        cached = await loop.run_in_executor(None, self.result_cache.get, key)
+        if cached is not None:
+            _, _, duration, prediction = cached
+            return {"clip": name, **prediction, "clip_duration_seconds": duration, "cache_hit": True}
+
+        probe = await probe_media_async(path)
+        audio, frames, duration = await decode_file_async(path, 0.0, None, probe=probe)
+        inputs = await self.executor.run(self.prepare_arrays, audio, frames)
+        prediction = await self.scheduler.submit(inputs)
+        await loop.run_in_executor(None, self.result_cache.put, key, audio, frames, duration, prediction)
+        return {"clip": name, **prediction, "clip_duration_seconds": duration, "cache_hit": False}
+
+    async def score(self, clips):
+        """
+        Yield one result dict per (name, path, digest-or-None) clip as soon as it
+        finishes (completion order, not input order). Failures are yielded as
+        {"clip", "error"} so one bad take doesn't end the session.
+        """
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def run(name, path, digest):
+            async with sem:
+                try:
+                    return await self.score_clip(name, path, digest)
+                except Exception as e:
+                    return {"clip": name, "error": str(e)}
+
+        tasks = [asyncio.ensure_future(run(*clip)) for clip in clips]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def score_session(scorer: BulkScorer, clips, user_emotion: str, intended: dict = None, recommend: bool = True):
+    """
+    Score a session and yield NDJSON-ready events: one {"type": "clip"} per take
+    as it finishes, then one {"type": "session"} with the totals and the
+    coaching for every mismatched take, produced by a single LLM request.
+    """
+    intended = intended or {}
+    mismatches = []
+    counts = {"clips": 0, "matches": 0, "errors": 0}
+
+    async for result in scorer.score(clips):
+        counts["clips"] += 1
+        wanted = intended.get(result["clip"], user_emotion)
+        event = {"type": "clip", "user_emotion": wanted, **result}
+        if "error" in result:
+            counts["errors"] += 1
+        else:
+            event["match"] = result["predicted_emotion"].lower() == wanted.lower().strip()
+            counts["matches"] += event["match"]
+            if not event["match"]:
+                mismatches.append({"clip": result["clip"], "intended": wanted,
+                                   "predicted_emotion": result["predicted_emotion"],
+                                   "confidence": result.get("confidence")})
+        yield event
+
+    session = {"type": "session", **counts, "recommendations": None}
+    if recommend and mismatches:
+        session["recommendations"] = await generate_session_recommendations(mismatches)
+    yield session
@@ -0,0 +1,62 @@
+"""
+Score every clip under a local directory in one batched session.
+
+    python -m app.bulk_predict ./takes --user-emotion joy > results.ndjson
+
+Writes the same NDJSON events as POST /predict/batch, one clip per line as
+it finishes, then the session summary. --emotions takes a JSON file that
+maps clip paths (relative to the directory) to their intended emotion.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from .batching import scheduler_from_env
+from .bulk import BULK_DECODE_CONCURRENCY, BulkScorer, directory_clips, score_session
+from .executor import executor_from_env
+from .model_wrapper import predict_batch, prepare_arrays, warmup
+from .openai_client import close_client
+from .result_cache import result_cache_from_env
+from .video_utils import TMP_DIR
+
+
+async def run(args, intended):
+    executor = executor_from_env()
+    scheduler = scheduler_from_env(predict_batch, executor=executor.pool)
+    scorer = BulkScorer(executor, scheduler, result_cache_from_env(TMP_DIR), prepare_arrays,
+                        concurrency=args.concurrency)
+    clips = [(name, path, None) for name, path in directory_clips(args.directory)]
+    print(f"{len(clips)} clips", file=sys.stderr)
+
+    await scheduler.start()
+    try:
+        async for event in score_session(scorer, clips, args.user_emotion, intended,
+                                         recommend=not args.no_recommendations):
+            print(json.dumps(event), flush=True)
+    finally:
+        await scheduler.stop()
+        await close_client()
+        executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--user-emotion", required=True)
+    parser.add_argument("--emotions", help="JSON file of clip path -> intended emotion")
+    parser.add_argument("--concurrency", type=int, default=BULK_DECODE_CONCURRENCY, help="Clips decoded at once")
+    parser.add_argument("--no-recommendations", action="store_true")
+    args = parser.parse_args()
+
+    intended = {}
+    if args.emotions:
+        with open(args.emotions, encoding="utf-8") as f:
+            intended = json.load(f)
+
+    warmup()
+    asyncio.run(run(args, intended))
+
+
+if __name__ == "__main__":
+    main()
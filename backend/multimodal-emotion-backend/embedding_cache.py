@@ -0,0 +1,48 @@
+import threading
+from collections import OrderedDict
+
+
+def normalize_text(text: str) -> str:
+    """Cache key for a text hint. bert-base-uncased lowercases and splits on whitespace anyway."""
+    return " ".join((text or "").split()).lower()
+
+
+class EmbeddingCache:
+    """Thread-safe bounded LRU cache with hit/miss counters."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(int(max_entries), 0)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
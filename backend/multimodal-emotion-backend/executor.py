@@ -0,0 +1,47 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Saturated(Exception):
+    """Raised instead of queueing more work once an executor or scheduler is full."""
+
+
+class BoundedExecutor:
+    """
+    Thread pool for CPU-heavy work with a hard cap on queued + running jobs.
+
+    Torch ops and numpy conversions release the GIL, so threads keep the
+    model in one process instead of copying it into every pool worker.
+    `run` raises `Saturated` rather than letting the backlog grow; callers
+    turn that into a 503 so clients back off.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 16):
+        self.max_workers = max(int(max_workers), 1)
+        self.max_pending = max(int(max_pending), self.max_workers)
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cpu")
+        self._pending = 0  # only touched from the event loop thread
+
+    @property
+    def saturated(self) -> bool:
+        return self._pending >= self.max_pending
+
+    async def run(self, fn, *args):
+        if self.saturated:
+            raise Saturated("CPU executor queue is full")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+def executor_from_env():
+    return BoundedExecutor(
+        max_workers=int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        max_pending=int(os.getenv("CPU_MAX_PENDING", "16")),
+    )
@@ -0,0 +1,33 @@
+"""
+Export MultimodalModel to TorchScript and/or ONNX for the optimized CPU backends.
+
+    python -m app.export_model --format all --out exported
+
+Set INFERENCE_BACKEND=torchscript|onnx and MODEL_EXPORT_DIR=<out> to serve
+the exported graphs.
+"""
+import argparse
+
+from .model_wrapper import EmotionPredictor, _emotions, _model_path
+from .inference_backends import export_onnx, export_torchscript
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=["torchscript", "onnx", "all"], default="all")
+    parser.add_argument("--model-path", default=_model_path)
+    parser.add_argument("--out", default="exported")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    model = EmotionPredictor(args.model_path, _emotions).model.cpu()
+    if args.format in ("torchscript", "all"):
+        for path in export_torchscript(model, args.out):
+            print(f"wrote {path}")
+    if args.format in ("onnx", "all"):
+        for path in export_onnx(model, args.out, opset=args.opset):
+            print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+OpenCV frame sampling for `EmotionPredictor.extract_video_frames`.
+
+Only the path-based fallback (`predict_from_video` / `prepare_inputs`) and
+the benchmarks use it; /predict and the bulk endpoints decode frames with
+ffmpeg's fps filter in `video_utils`, which already spaces them evenly
+inside the single decode pass.
+"""
+import subprocess
+
+import cv2
+import numpy as np
+
+SAMPLER_MODES = ("sequential", "keyframe")
+
+
+def plan_indices(total, num_frames=16):
+    """Frame indices sampled from a `total`-frame clip (same spacing as the original seek loop)."""
+    if total <= 0:
+        return []
+    step = max(total // num_frames, 1)
+    return [i * step for i in range(num_frames) if i * step < total]
+
+
+def _to_rgb(frame, frame_size):
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return cv2.resize(frame, (frame_size, frame_size))
+
+
+def _sequential_pass(cap, targets, frame_size):
+    """
+    Decode forward once, converting only the target frames.
+    `grab()` demuxes and decodes without the BGR copy, so skipped frames are cheap.
+    Returns (frames, frames_seen).
+    """
+    wanted = set(targets)
+    last = targets[-1]
+    frames = []
+    idx = 0
+    while idx <= last and cap.grab():
+        if idx in wanted:
+            ret, frame = cap.retrieve()
+            if ret:
+                frames.append(_to_rgb(frame, frame_size))
+        idx += 1
+    return frames, idx
+
+
+def _reservoir_pass(cap, num_frames, frame_size):
+    """
+    Evenly spaced frames from a clip of unknown length in one pass.
+    Keeps every `stride`-th frame and halves the reservoir (doubling the
+    stride) whenever it reaches 2 * num_frames, so memory stays bounded.
+    """
+    kept = []
+    stride = 1
+    idx = 0
+    while cap.grab():
+        if idx % stride == 0:
+            ret, frame = cap.retrieve()
+            if ret:
+                kept.append(_to_rgb(frame, frame_size))
+            if len(kept) >= 2 * num_frames:
+                kept = kept[::2]
+                stride *= 2
+        idx += 1
+    if len(kept) <= num_frames:
+        return kept
+    picks = np.linspace(0, len(kept) - 1, num_frames).round().astype(int)
+    return [kept[i] for i in picks]
+
+
+def keyframe_times(video_path):
+    """Presentation times (seconds) of video keyframes, read from packet flags without decoding."""
+    probe = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video_path],
+        capture_output=True, text=True, check=True
+    )
+    times = []
+    for line in probe.stdout.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) >= 2 and "K" in parts[1]:
+            try:
+                times.append(float(parts[0]))
+            except ValueError:
+                continue
+    return sorted(times)
+
+
+def _keyframe_pass(cap, video_path, targets, fps, frame_size):
+    """
+    Snap each target to its nearest keyframe and seek there. OpenCV still
+    decodes forward from the keyframe it lands on to the requested time, so
+    this saves work only when keyframes are far apart.
+    """
+    keys = np.asarray(keyframe_times(video_path))
+    if keys.size == 0 or fps <= 0:
+        raise RuntimeError("No keyframe index available.")
+    frames = []
+    for idx in targets:
+        t = idx / fps
+        snapped = keys[np.abs(keys - t).argmin()]
+        cap.set(cv2.CAP_PROP_POS_MSEC, snapped * 1000.0)
+        ret, frame = cap.read()
+        if ret:
+            frames.append(_to_rgb(frame, frame_size))
+    return frames
+
+
+def sample_frames(video_path, num_frames=16, frame_size=112, mode="sequential"):
+    """
+    Sample `num_frames` evenly spaced RGB frames, resized to `frame_size`.
+
+    "sequential" plans the indices up front and decodes the clip forward once.
+    "keyframe" snaps targets to keyframes and seeks to them, trading exact
+    spacing for less decoding on long GOPs; it falls back to the
+    sequential pass when the keyframe index can't be read. When
+    CAP_PROP_FRAME_COUNT is missing, the clip is sampled with a bounded
+    reservoir; when it overstates the real length, the plan is redone with
+    the number of frames actually decoded.
+    """
+    if mode not in SAMPLER_MODES:
+        raise ValueError(f"Unknown frame sampler mode: {mode}")
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total <= 0:
+            return _reservoir_pass(cap, num_frames, frame_size)
+
+        targets = plan_indices(total, num_frames)
+        if mode == "keyframe":
+            try:
+                return _keyframe_pass(cap, video_path, targets, cap.get(cv2.CAP_PROP_FPS), frame_size)
+            except Exception:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+        frames, seen = _sequential_pass(cap, targets, frame_size)
+        if len(frames) < len(targets) and 0 < seen < total:
+            # Frame count was wrong: replan against the frames that really exist
+            cap.release()
+            cap = cv2.VideoCapture(video_path)
+            frames, _ = _sequential_pass(cap, plan_indices(seen, num_frames), frame_size)
+        return frames
+    finally:
+        cap.release()
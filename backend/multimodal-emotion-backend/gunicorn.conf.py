@@ -0,0 +1,88 @@
+"""
+Multi-worker serving: gunicorn master + UvicornWorker processes.
+
+    gunicorn -c gunicorn.conf.py
+
+The master imports the app and loads the checkpoint once (`preload_app`),
+then forks WEB_CONCURRENCY workers that share the weight pages. Each worker
+gets an equal share of the cores, optionally pinned to them with
+PIN_WORKERS=1, and splits it between its CPU_WORKERS executor threads:
+each thread's forwards use share // CPU_WORKERS torch intra-op threads,
+so a busy server never runs more compute threads than there are cores.
+The model is only run inside workers.
+SCRATCH_MAX_BYTES and RESULT_CACHE_MAX_BYTES are totals for the server;
+each worker enforces its 1/WEB_CONCURRENCY share.
+"""
+import os
+
+# File-backed weights are shared through the page cache without needing a large /dev/shm
+os.environ.setdefault("MODEL_MMAP", "1")
+
+
+def _available_cores():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '7860')}"
+wsgi_app = "app.main:app"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(len(_available_cores()) // 2, 1))))
+# The preloaded app splits the scratch and result cache byte quotas across this many workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
+preload_app = True
+# Model loading and the first warmup forward can take a while on cold disks
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", "0"))
+PIN_WORKERS = os.getenv("PIN_WORKERS", "0") == "1"
+# Cores per worker; the preloaded app sizes its CPU executor from CPU_WORKERS
+CORES_PER_WORKER = THREADS_PER_WORKER or max(len(_available_cores()) // workers, 1)
+os.environ.setdefault("CPU_WORKERS", str(min(4, CORES_PER_WORKER)))
+CPU_WORKERS = max(int(os.environ["CPU_WORKERS"]), 1)
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker is forked
+    from app.model_wrapper import preload_shared_weights
+
+    preload_shared_weights()
+    server.log.info("Preloaded model weights for %s workers", workers)
+
+
+# CPU slots held by live workers; only touched in the master
+_taken_slots = set()
+
+
+def pre_fork(server, worker):
+    # A respawned worker takes the slot its predecessor gave back in child_exit
+    slot = next((s for s in range(workers) if s not in _taken_slots), None)
+    if slot is not None:
+        _taken_slots.add(slot)
+    worker.cpu_slot = slot
+
+
+def child_exit(server, worker):
+    _taken_slots.discard(getattr(worker, "cpu_slot", None))
+
+
+def post_fork(server, worker):
+    import torch
+
+    cores = _available_cores()
+    per_worker = CORES_PER_WORKER
+    # Up to CPU_WORKERS forwards run at once in this worker, each with its slice of the share
+    torch_threads = max(per_worker // CPU_WORKERS, 1)
+    torch.set_num_threads(torch_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Already fixed for this process
+    slot = getattr(worker, "cpu_slot", None)
+    if PIN_WORKERS and slot is not None and hasattr(os, "sched_setaffinity") and len(cores) >= workers * per_worker:
+        os.sched_setaffinity(0, cores[slot * per_worker:(slot + 1) * per_worker])
+    server.log.info("Worker %s: %s executor threads x %s torch threads", worker.pid, CPU_WORKERS, torch_threads)
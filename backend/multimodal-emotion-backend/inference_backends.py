@@ -0,0 +1,220 @@
+import os
+
+import torch
+import torch.nn as nn
+
+BACKENDS = ("eager", "int8", "torchscript", "onnx")
+
+TEXT_ENCODER_FILE = "text_encoder"
+FEATURES_FILE = "features"
+HEAD_FILE = "head"
+FUSION_DIM = 128 + 32 + 512
+
+
+# ---------- EXPORTABLE STAGES ----------
+# The graph is split at the pooled BERT embedding so every backend can still
+# skip the encoder on a text-embedding cache hit, and again at the fused
+# branch features so modality attribution can rerun only the head.
+class TextEncoder(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model.encode_text(input_ids, attention_mask)
+
+
+class FeatureEncoder(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, text_emb, audio, video):
+        return self.model.encode_features(text_emb, audio, video)
+
+
+class FusionHead(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, fusion):
+        return self.model.classify_features(fusion)
+
+
+def example_inputs(batch_size=2, seq_len=128, device="cpu"):
+    """Dummy inputs shaped like `EmotionPredictor` batches, used for tracing and export."""
+    return {
+        "input_ids": torch.zeros(batch_size, seq_len, dtype=torch.long, device=device),
+        "attention_mask": torch.ones(batch_size, seq_len, dtype=torch.long, device=device),
+        "text_emb": torch.zeros(batch_size, 768, device=device),
+        "audio": torch.zeros(batch_size, 1, 16000, device=device),
+        "video": torch.zeros(batch_size, 3, 16, 112, 112, device=device),
+        "fusion": torch.zeros(batch_size, FUSION_DIM, device=device),
+    }
+
+
+def trace_stages(model, device="cpu"):
+    """TorchScript-trace the text encoder, branch features and fusion head, frozen for inference."""
+    ex = example_inputs(device=device)
+    with torch.no_grad():
+        text_encoder = torch.jit.trace(TextEncoder(model).eval(), (ex["input_ids"], ex["attention_mask"]), strict=False)
+        features = torch.jit.trace(FeatureEncoder(model).eval(), (ex["text_emb"], ex["audio"], ex["video"]))
+        head = torch.jit.trace(FusionHead(model).eval(), (ex["fusion"],))
+    return tuple(torch.jit.optimize_for_inference(m) for m in (text_encoder, features, head))
+
+
+def export_torchscript(model, out_dir, device="cpu"):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = tuple(os.path.join(out_dir, f"{stem}.pt") for stem in (TEXT_ENCODER_FILE, FEATURES_FILE, HEAD_FILE))
+    for module, path in zip(trace_stages(model, device), paths):
+        torch.jit.save(module, path)
+    return paths
+
+
+def export_onnx(model, out_dir, opset=17):
+    os.makedirs(out_dir, exist_ok=True)
+    ex = example_inputs()
+    text_path = os.path.join(out_dir, f"{TEXT_ENCODER_FILE}.onnx")
+    features_path = os.path.join(out_dir, f"{FEATURES_FILE}.onnx")
+    head_path = os.path.join(out_dir, f"{HEAD_FILE}.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            TextEncoder(model).eval(), (ex["input_ids"], ex["attention_mask"]), text_path,
+            input_names=["input_ids", "attention_mask"], output_names=["text_emb"],
+            dynamic_axes={"input_ids": {0: "batch"}, "attention_mask": {0: "batch"}, "text_emb": {0: "batch"}},
+            opset_version=opset,
+        )
+        torch.onnx.export(
+            FeatureEncoder(model).eval(), (ex["text_emb"], ex["audio"], ex["video"]), features_path,
+            input_names=["text_emb", "audio", "video"], output_names=["fusion"],
+            dynamic_axes={"text_emb": {0: "batch"}, "audio": {0: "batch"}, "video": {0: "batch"}, "fusion": {0: "batch"}},
+            opset_version=opset,
+        )
+        torch.onnx.export(
+            FusionHead(model).eval(), (ex["fusion"],), head_path,
+            input_names=["fusion"], output_names=["logits"],
+            dynamic_axes={"fusion": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=opset,
+        )
+    return text_path, features_path, head_path
+
+
+# ---------- RUNTIME BACKENDS ----------
+class EagerBackend:
+    """Plain fp32 PyTorch modules."""
+
+    name = "eager"
+
+    def __init__(self, model):
+        self.model = model
+
+    def encode_text(self, input_ids, attention_mask):
+        return self.model.encode_text(input_ids, attention_mask)
+
+    def features(self, text_emb, audio, video):
+        return self.model.encode_features(text_emb, audio, video)
+
+    def head(self, fusion):
+        return self.model.classify_features(fusion)
+
+    def classify(self, text_emb, audio, video):
+        return self.model.forward_from_text_embedding(text_emb, audio, video)
+
+
+class Int8Backend(EagerBackend):
+    """Dynamic int8 quantization of every nn.Linear (BERT and the fusion head). CPU only."""
+
+    name = "int8"
+
+    def __init__(self, model):
+        if next(model.parameters()).device.type != "cpu":
+            raise RuntimeError("Dynamic int8 quantization is only supported on CPU.")
+        super().__init__(torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8))
+
+
+class TorchScriptBackend:
+    """Frozen TorchScript graphs, loaded from `export_dir` or traced from the eager model."""
+
+    name = "torchscript"
+
+    def __init__(self, model, export_dir=None, device="cpu"):
+        stems = (TEXT_ENCODER_FILE, FEATURES_FILE, HEAD_FILE)
+        paths = [os.path.join(export_dir or "", f"{stem}.pt") for stem in stems]
+        if export_dir and all(os.path.exists(p) for p in paths):
+            self.text_encoder, self.feature_encoder, self.fusion_head = (
+                torch.jit.load(p, map_location=device) for p in paths
+            )
+        else:
+            self.text_encoder, self.feature_encoder, self.fusion_head = trace_stages(model, device)
+
+    def encode_text(self, input_ids, attention_mask):
+        return self.text_encoder(input_ids, attention_mask)
+
+    def features(self, text_emb, audio, video):
+        return self.feature_encoder(text_emb, audio, video)
+
+    def head(self, fusion):
+        return self.fusion_head(fusion)
+
+    def classify(self, text_emb, audio, video):
+        return self.head(self.features(text_emb, audio, video))
+
+
+class OnnxBackend:
+    """ONNX Runtime sessions over the graphs written by `export_model` (exported on demand)."""
+
+    name = "onnx"
+
+    def __init__(self, model, export_dir=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("INFERENCE_BACKEND=onnx requires the onnxruntime package.")
+
+        export_dir = export_dir or "exported"
+        paths = [os.path.join(export_dir, f"{stem}.onnx") for stem in (TEXT_ENCODER_FILE, FEATURES_FILE, HEAD_FILE)]
+        if not all(os.path.exists(p) for p in paths):
+            paths = export_onnx(model, export_dir)
+        text_path, features_path, head_path = paths
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ["CPUExecutionProvider"]
+        self.text_session = ort.InferenceSession(text_path, opts, providers=providers)
+        self.features_session = ort.InferenceSession(features_path, opts, providers=providers)
+        self.head_session = ort.InferenceSession(head_path, opts, providers=providers)
+
+    def encode_text(self, input_ids, attention_mask):
+        (out,) = self.text_session.run(None, {
+            "input_ids": input_ids.cpu().numpy(),
+            "attention_mask": attention_mask.cpu().numpy(),
+        })
+        return torch.from_numpy(out)
+
+    def features(self, text_emb, audio, video):
+        (out,) = self.features_session.run(None, {
+            "text_emb": text_emb.cpu().numpy(),
+            "audio": audio.cpu().numpy(),
+            "video": video.cpu().numpy(),
+        })
+        return torch.from_numpy(out)
+
+    def head(self, fusion):
+        (out,) = self.head_session.run(None, {"fusion": fusion.cpu().numpy()})
+        return torch.from_numpy(out)
+
+    def classify(self, text_emb, audio, video):
+        return self.head(self.features(text_emb, audio, video))
+
+
+def build_backend(name, model, export_dir=None, device="cpu"):
+    if name == "eager":
+        return EagerBackend(model)
+    if name == "int8":
+        return Int8Backend(model)
+    if name == "torchscript":
+        return TorchScriptBackend(model, export_dir, device)
+    if name == "onnx":
+        return OnnxBackend(model, export_dir)
+    raise ValueError(f"Unknown inference backend: {name} (expected one of {', '.join(BACKENDS)})")
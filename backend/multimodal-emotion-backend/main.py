@@ -1,12 +1,64 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from starlette.responses import JSONResponse
-from typing import Optional
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, WebSocket
+from starlette.responses import JSONResponse, StreamingResponse
+from typing import List, Optional
 
-from .video_utils import save_upload_and_trim
-from .model_wrapper import predict_from_video
-from .openai_client import generate_recommendations
+from .video_utils import TMP_DIR, stream_upload_to_disk, probe_media_async, decode_file_async, decode_timeline_async
+from .model_wrapper import (
+    prediction_version, prepare_arrays, predict_batch, predict_timeline, text_cache_stats, is_ready, startup_report, warmup,
+)
+from .openai_client import client_stats, close_client
+from .recommendation_cache import cached_recommendations, recommendation_cache_from_env
+from .batching import scheduler_from_env
+from .streaming import StreamSession
+from .bulk import BULK_MAX_CLIPS, BulkScorer, extract_archive, is_video_name, score_session
+from .executor import Saturated, executor_from_env
+from .result_cache import cache_key, result_cache_from_env
+from .scratch import ScratchQuotaExceeded, scratch_space_from_env
+from .timing import StageTimer, StageMetrics
 
-app = FastAPI(title="Multimodal Emotion Detection API")
+logger = logging.getLogger(__name__)
+
+cpu_executor = executor_from_env()
+result_cache = result_cache_from_env(TMP_DIR)
+scratch_space = scratch_space_from_env(os.path.join(TMP_DIR, "scratch"))
+recommendation_cache = recommendation_cache_from_env()
+scheduler = scheduler_from_env(predict_batch, executor=cpu_executor.pool)
+bulk_scorer = BulkScorer(cpu_executor, scheduler, result_cache, prepare_arrays)
+stage_metrics = StageMetrics()
+stream_clients = {"connected": 0}
+_warmup_error = None
+
+
+def _background_warmup():
+    global _warmup_error
+    try:
+        warmup()
+        logger.info("Model ready, startup phases (ms): %s", startup_report())
+    except Exception as e:
+        _warmup_error = str(e)
+        logger.exception("Model warmup failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await scheduler.start()
+    scratch_space.start_gc()
+    # Load the model in the background so the port opens immediately; /ready reports progress
+    if os.getenv("EAGER_WARMUP", "1") == "1":
+        asyncio.get_running_loop().run_in_executor(None, _background_warmup)
+    yield
+    await scheduler.stop()
+    await close_client()
+    scratch_space.stop_gc()
+    cpu_executor.shutdown()
+
+
+app = FastAPI(title="Multimodal Emotion Detection API", lifespan=lifespan)
 
 
 @app.post("/predict")
@@ -14,11 +66,17 @@ async def predict(
     video: UploadFile = File(...),
     user_emotion: str = Form(...),
     start_time: Optional[str] = Form(None),
-    end_time: Optional[str] = Form(None)
+    end_time: Optional[str] = Form(None),
+    timeline: bool = Form(False),
+    window_seconds: Optional[str] = Form(None),
+    hop_seconds: Optional[str] = Form(None)
 ):
     """
     Upload a video and optionally provide start and end times (in seconds).
     If no times are provided, defaults to analyzing the full clip (up to 5 minutes).
+    With `timeline=true` the clip is scored in overlapping windows of
+    `window_seconds` (default 2) every `hop_seconds` (default half a window),
+    and the response adds per-window probabilities to the aggregated prediction.
     """
     # --- Validate file type ---
     if not video.content_type.startswith("video/"):
@@ -35,18 +93,67 @@ async def predict(
 
     start_val = to_float(start_time, 0.0)
     end_val = to_float(end_time, None)
+    window_val = max(to_float(window_seconds, 2.0), 0.5)
+    hop_val = max(to_float(hop_seconds, window_val / 2), 0.1)
 
-    # --- Video trimming ---
-    try:
-        trimmed_path, duration = save_upload_and_trim(await video.read(), video.filename, start_val, end_val)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Video trimming failed: {e}")
+    # --- Shed load before accepting the upload ---
+    if cpu_executor.saturated or scheduler.saturated:
+        raise HTTPException(status_code=503, detail="Server busy, please retry shortly.")
 
-    # --- Model prediction ---
-    try:
-        prediction = predict_from_video(trimmed_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Model inference failed: {e}")
+    loop = asyncio.get_running_loop()
+    timer = StageTimer()
+
+    # --- Upload and decode scratch lives only as long as this request ---
+    async with scratch_space.session() as scratch:
+        # --- Identical upload + window already analyzed? ---
+        with timer.stage("upload"):
+            try:
+                input_path, digest = await stream_upload_to_disk(video, scratch)
+            except ScratchQuotaExceeded:
+                raise HTTPException(status_code=503, detail="Scratch space full, please retry shortly.")
+        variant = f"timeline:{window_val:.3f}:{hop_val:.3f}" if timeline else ""
+        key = cache_key(digest, start_val, end_val, variant, prediction_version())
+        with timer.stage("cache_lookup"):
+            cached = await loop.run_in_executor(None, result_cache.get, key)
+        cache_hit = cached is not None
+
+        if cache_hit:
+            _, _, duration, prediction = cached
+        else:
+            # --- Decode the requested window (single async ffmpeg pass) ---
+            try:
+                with timer.stage("probe"):
+                    probe = await probe_media_async(input_path)
+                with timer.stage("decode"):
+                    if timeline:
+                        audio, frames, duration, frame_rate = await decode_timeline_async(
+                            input_path, start_val, end_val, window_seconds=window_val, probe=probe
+                        )
+                    else:
+                        audio, frames, duration = await decode_file_async(input_path, start_val, end_val, probe=probe)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Video decoding failed: {e}")
+
+            # --- Model prediction ---
+            # Single clips are batched with other in-flight requests; a timeline is already one batch
+            try:
+                if timeline:
+                    with timer.stage("inference"):
+                        prediction = await cpu_executor.run(predict_timeline, audio, frames, frame_rate, hop_val, start_val)
+                else:
+                    with timer.stage("embed"):
+                        inputs = await cpu_executor.run(prepare_arrays, audio, frames)
+                    with timer.stage("inference"):
+                        prediction = await scheduler.submit(inputs)
+            except Saturated:
+                raise HTTPException(status_code=503, detail="Server busy, please retry shortly.")
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Model inference failed: {e}")
+
+            # A timeline's decode spans the whole clip (tens of MB); its windows are in the prediction already
+            stored = (None, None) if timeline else (audio, frames)
+            with timer.stage("cache_store"):
+                await loop.run_in_executor(None, result_cache.put, key, *stored, duration, prediction)
 
     predicted_emotion = prediction.get("predicted_emotion", "unknown")
     confidence = prediction.get("confidence", None)
@@ -57,16 +164,149 @@ async def predict(
 
     if not match:
         try:
-            recommendations = generate_recommendations(prediction, user_emotion)
+            with timer.stage("recommendations"):
+                recommendations = await cached_recommendations(recommendation_cache, prediction, user_emotion)
         except Exception as e:
             recommendations = f"Recommendation generation failed: {e}"
 
+    stage_metrics.record(timer)
+
     # --- Build final response ---
-    return JSONResponse({
+    body = {
         "predicted_emotion": predicted_emotion,
         "confidence": confidence,
         "user_emotion": user_emotion,
         "match": match,
         "recommendations": recommendations,
         "clip_duration_seconds": duration,
-    })
+        "cache_hit": cache_hit,
+    }
+    if timeline:
+        body["timeline"] = prediction.get("timeline", [])
+    return JSONResponse(body, headers={"Server-Timing": timer.server_timing()})
+
+
+@app.post("/predict/batch")
+async def predict_bulk(
+    user_emotion: str = Form(...),
+    videos: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    emotions: Optional[str] = Form(None)
+):
+    """
+    Score a session of takes, uploaded as several `videos` and/or one zip `archive`.
+    `emotions` optionally maps clip names to their intended emotion (JSON),
+    otherwise every take is compared with `user_emotion`.
+    Streams NDJSON: one line per clip as it finishes, then a session summary
+    with the recommendations for all mismatched takes.
+    """
+    try:
+        intended = json.loads(emotions) if emotions else {}
+        if not isinstance(intended, dict):
+            raise ValueError
+    except ValueError:
+        raise HTTPException(status_code=400, detail="`emotions` must be a JSON object of clip name -> emotion.")
+
+    uploads = [v for v in (videos or []) if v.filename]
+    if not uploads and archive is None:
+        raise HTTPException(status_code=400, detail="Upload one or more videos or a zip archive.")
+    if len(uploads) > BULK_MAX_CLIPS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_CLIPS} clips per request.")
+    if cpu_executor.saturated or scheduler.saturated:
+        raise HTTPException(status_code=503, detail="Server busy, please retry shortly.")
+
+    # Uploads are closed once this handler returns, so spool everything before streaming
+    scratch = scratch_space.session()
+    clips = []
+    try:
+        for upload in uploads:
+            if not (upload.content_type or "").startswith("video/") and not is_video_name(upload.filename):
+                raise HTTPException(status_code=400, detail=f"{upload.filename} is not a video.")
+            path, digest = await stream_upload_to_disk(upload, scratch)
+            clips.append((upload.filename, path, digest))
+        if archive is not None:
+            archive_path, _ = await stream_upload_to_disk(archive, scratch)
+            members = await asyncio.get_running_loop().run_in_executor(
+                None, extract_archive, archive_path, scratch, BULK_MAX_CLIPS - len(clips)
+            )
+            clips.extend((name, path, None) for name, path in members)
+    except HTTPException:
+        await scratch.aclose()
+        raise
+    except ScratchQuotaExceeded:
+        await scratch.aclose()
+        raise HTTPException(status_code=503, detail="Scratch space full, please retry shortly.")
+    except Exception as e:
+        await scratch.aclose()
+        raise HTTPException(status_code=400, detail=f"Could not read the uploaded clips: {e}")
+
+    async def events():
+        # If the client never starts reading, the scratch GC reclaims the session after SCRATCH_MAX_AGE_S
+        try:
+            async for event in score_session(bulk_scorer, clips, user_emotion, intended):
+                yield json.dumps(event) + "\n"
+        finally:
+            await scratch.aclose()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.websocket("/predict/stream")
+async def predict_stream(websocket: WebSocket):
+    """
+    Live inference over a rolling window, with no upload or ffmpeg step.
+    Binary messages start with a kind byte: 0x01 + float32 mono PCM at 16 kHz,
+    or 0x02 + one or more 112x112 RGB frames. A JSON text message
+    {"interval_ms": 500, "user_emotion": "joy"} adjusts the session.
+    A {"type": "prediction"} message is sent every interval while data arrives.
+    """
+    await websocket.accept()
+
+    async def infer(audio, frames):
+        inputs = await cpu_executor.run(prepare_arrays, audio, frames)
+        return await scheduler.submit(inputs)
+
+    stream_clients["connected"] += 1
+    try:
+        await StreamSession(websocket, infer).run()
+    finally:
+        stream_clients["connected"] -= 1
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "text_embedding_cache": text_cache_stats(),
+        "result_cache": result_cache.stats(),
+        "recommendation_cache": recommendation_cache.stats(),
+        "scratch": scratch_space.stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Rolling per-stage latency percentiles for /predict (same stages as its Server-Timing header)."""
+    return {
+        "stages": stage_metrics.summary(),
+        "text_embedding_cache": text_cache_stats(),
+        "result_cache": result_cache.stats(),
+        "recommendation_cache": recommendation_cache.stats(),
+        "openai": client_stats(),
+        "stream_clients": stream_clients["connected"],
+        "scratch": scratch_space.stats(),
+    }
+
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the model is loaded, with per-phase startup timings in ms."""
+    body = {"ready": is_ready(), "startup_ms": startup_report()}
+    if _warmup_error:
+        body["error"] = _warmup_error
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
@@ -1,20 +1,48 @@
 import torch
 import torch.nn as nn
 import numpy as np
-import cv2
-from moviepy import VideoFileClip
-from transformers import BertTokenizer, BertModel
+from transformers import BertConfig, BertTokenizer, BertModel
+import contextlib
 import os
+import threading
+import time
+
+from .embedding_cache import EmbeddingCache, normalize_text
+from .frame_sampler import sample_frames
+from .inference_backends import build_backend
 
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
 # ---------- MODEL DEFINITION ----------
+BERT_NAME = os.getenv("BERT_NAME", "bert-base-uncased")
+
+# Where each branch's features sit in the fused vector the head sees
+MODALITY_SLICES = {"text": slice(0, 128), "audio": slice(128, 160), "visual": slice(160, 672)}
+# Report per-modality probability shifts (one extra head pass per modality, batched with the real one)
+MODALITY_ATTRIBUTION = os.getenv("MODALITY_ATTRIBUTION", "1") == "1"
+
+
+def _skip_weight_init():
+    """Skip BERT's random init when every weight is about to be overwritten by a checkpoint."""
+    try:
+        from transformers.modeling_utils import no_init_weights
+        return no_init_weights()
+    except ImportError:
+        return contextlib.nullcontext()
+
+
 class MultimodalModel(nn.Module):
-    def __init__(self, num_classes=7):
+    def __init__(self, num_classes=7, bert_config=None, pretrained_bert=True):
         super(MultimodalModel, self).__init__()
 
         # --- Text (BERT) ---
-        self.bert = BertModel.from_pretrained('bert-base-uncased')
+        # When the full checkpoint is loaded afterwards, build BERT from its
+        # config only instead of downloading and loading the pretrained weights first
+        if pretrained_bert:
+            self.bert = BertModel.from_pretrained(BERT_NAME)
+        else:
+            with _skip_weight_init():
+                self.bert = BertModel(bert_config or BertConfig.from_pretrained(BERT_NAME))
         for param in self.bert.parameters():
             param.requires_grad = False
         self.text_fc = nn.Linear(768, 128)
@@ -46,56 +74,93 @@ class MultimodalModel(nn.Module):
             nn.Linear(128, num_classes)
         )
 
-    def forward(self, input_ids, attention_mask, audio, video):
+    def encode_text(self, input_ids, attention_mask):
+        # BERT is frozen, so this pooled embedding depends only on the text and can be cached
         bert_out = self.bert(input_ids=input_ids, attention_mask=attention_mask)
-        text_feat = self.text_fc(bert_out.last_hidden_state.mean(dim=1))
+        return bert_out.last_hidden_state.mean(dim=1)
+
+    def forward(self, input_ids, attention_mask, audio, video):
+        return self.forward_from_text_embedding(self.encode_text(input_ids, attention_mask), audio, video)
+
+    def forward_from_text_embedding(self, text_emb, audio, video):
+        return self.classify_features(self.encode_features(text_emb, audio, video))
+
+    def encode_features(self, text_emb, audio, video):
+        """Branch encoders only: the fused (batch, 672) vector laid out as MODALITY_SLICES."""
+        text_feat = self.text_fc(text_emb)
         audio_feat = self.audio_cnn(audio).mean(dim=2)
         video_feat = self.video_cnn(video).view(video.size(0), -1)
-        fusion = torch.cat([text_feat, audio_feat, video_feat], dim=1)
+        return torch.cat([text_feat, audio_feat, video_feat], dim=1)
+
+    def classify_features(self, fusion):
         return self.fc(fusion)
 
 # ---------- PREDICTOR ----------
 class EmotionPredictor:
-    def __init__(self, model_path: str, emotions: list):
-        self.model = MultimodalModel(num_classes=len(emotions)).to(device)
-        self.model.load_state_dict(torch.load(model_path, map_location=device))
-        self.model.eval()
-        self.tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
+    def __init__(self, model_path: str, emotions: list, mmap: bool = False, bert_config=None,
+                 backend: str = "eager", export_dir: str = None, state_dict=None):
+        self.load_timings = {}
+
+        with self._phase("bert_config"):
+            bert_config = bert_config or BertConfig.from_pretrained(BERT_NAME)
+        with self._phase("build_model"):
+            self.model = MultimodalModel(num_classes=len(emotions), bert_config=bert_config, pretrained_bert=False)
+        with self._phase("load_checkpoint"):
+            if state_dict is not None:
+                # Weights preloaded by the gunicorn master: adopt its tensors rather than copying them
+                self.model.load_state_dict(state_dict, assign=True)
+            else:
+                # mmap keeps the weights in the page cache instead of copying them into the heap
+                map_location = 'cpu' if mmap else device
+                state_dict = torch.load(model_path, map_location=map_location, mmap=mmap, weights_only=True)
+                self.model.load_state_dict(state_dict, assign=mmap)
+            self.model.to(device).eval()
+        with self._phase("backend"):
+            self.backend = build_backend(backend, self.model, export_dir=export_dir, device=device)
+        with self._phase("tokenizer"):
+            self.tokenizer = BertTokenizer.from_pretrained(BERT_NAME)
+
         self.emotions = emotions
+        self.text_cache = EmbeddingCache(max_entries=int(os.getenv("TEXT_CACHE_SIZE", "1024")))
+        self.frame_sampler = os.getenv("FRAME_SAMPLER", "sequential")
+
+    @contextlib.contextmanager
+    def _phase(self, name):
+        t0 = time.perf_counter()
+        yield
+        self.load_timings[name] = round((time.perf_counter() - t0) * 1000.0, 1)
 
     def extract_audio(self, video_path, target_len=16000):
         try:
+            from moviepy import VideoFileClip  # only the file-based fallback path needs moviepy
+
             clip = VideoFileClip(video_path)
             audio_array = clip.audio.to_soundarray(fps=16000)
             clip.close()
             if audio_array.ndim == 2:
                 audio_array = audio_array.mean(axis=1)
-            if len(audio_array) > target_len:
-                audio_array = audio_array[:target_len]
-            elif len(audio_array) < target_len:
-                pad = target_len - len(audio_array)
-                audio_array = np.pad(audio_array, (0, pad))
         except Exception:
             audio_array = np.zeros(target_len, dtype=np.float32)
+        return self.audio_to_tensor(audio_array, target_len)
+
+    @staticmethod
+    def audio_to_tensor(audio_array, target_len=16000):
+        """Crop or zero-pad mono samples to `target_len` and shape them as (1, 1, target_len)."""
+        if len(audio_array) > target_len:
+            audio_array = audio_array[:target_len]
+        elif len(audio_array) < target_len:
+            pad = target_len - len(audio_array)
+            audio_array = np.pad(audio_array, (0, pad))
         return torch.tensor(audio_array, dtype=torch.float32).unsqueeze(0).unsqueeze(0)
 
     def extract_video_frames(self, video_path, num_frames=16, frame_size=112):
-        cap = cv2.VideoCapture(video_path)
-        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        step = max(total // num_frames, 1)
-        frames = []
-        for i in range(0, total, step):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = cv2.resize(frame, (frame_size, frame_size))
-            frames.append(frame)
-            if len(frames) >= num_frames:
-                break
-        cap.release()
+        frames = sample_frames(video_path, num_frames, frame_size, mode=self.frame_sampler)
+        return self.frames_to_tensor(frames, num_frames, frame_size)
 
+    @staticmethod
+    def frames_to_tensor(frames, num_frames=16, frame_size=112):
+        """Pad RGB uint8 frames to `num_frames` by repeating the last one, shaped (1, 3, T, H, W)."""
+        frames = list(frames[:num_frames])
         if len(frames) == 0:
             frames = [np.zeros((frame_size, frame_size, 3), dtype=np.uint8)] * num_frames
         while len(frames) < num_frames:
@@ -104,33 +169,228 @@ class EmotionPredictor:
         video_tensor = torch.tensor(np.stack(frames), dtype=torch.float32).permute(3,0,1,2) / 255.0
         return video_tensor.unsqueeze(0)
 
-    def predict_from_video(self, video_path: str, text_hint: str = ""):
-        enc = self.tokenizer(text_hint, return_tensors='pt', truncation=True, padding='max_length', max_length=128)
-        input_ids = enc['input_ids'].to(device)
-        attention_mask = enc['attention_mask'].to(device)
-        audio = self.extract_audio(video_path).to(device)
-        video = self.extract_video_frames(video_path).to(device)
+    def embed_text(self, text_hint: str = ""):
+        """Pooled BERT embedding for `text_hint`, served from the LRU cache when possible."""
+        key = normalize_text(text_hint)
+        emb = self.text_cache.get(key)
+        if emb is None:
+            enc = self.tokenizer(key, return_tensors='pt', truncation=True, padding='max_length', max_length=128)
+            with torch.no_grad():
+                emb = self.backend.encode_text(enc['input_ids'].to(device), enc['attention_mask'].to(device)).cpu()
+            self.text_cache.put(key, emb)
+        return emb
+
+    def prepare_inputs(self, video_path: str, text_hint: str = ""):
+        """Decode and embed a single clip into batch-of-one CPU tensors."""
+        return {
+            "text_emb": self.embed_text(text_hint),
+            "audio": self.extract_audio(video_path),
+            "video": self.extract_video_frames(video_path),
+        }
+
+    def prepare_arrays(self, audio, frames, text_hint: str = ""):
+        """Same as `prepare_inputs`, for audio/frames already decoded by `video_utils.decode_clip`."""
+        return {
+            "text_emb": self.embed_text(text_hint),
+            "audio": self.audio_to_tensor(audio),
+            "video": self.frames_to_tensor(frames),
+        }
 
+    def _classify(self, text_emb, audio, video):
+        """
+        Softmax probabilities for a batch, plus the probabilities with each
+        modality's features zeroed ((modalities, batch, classes), or None when
+        MODALITY_ATTRIBUTION is off). The branch encoders run once; only the
+        fusion head sees the ablated copies, stacked into the same pass.
+        """
         with torch.no_grad():
-            logits = self.model(input_ids, attention_mask, audio, video)
-            probs = torch.softmax(logits, dim=1)
-            conf, idx = torch.max(probs, dim=1)
-            pred_emo = self.emotions[idx.item()]
+            if not MODALITY_ATTRIBUTION:
+                return torch.softmax(self.backend.classify(text_emb, audio, video), dim=1).cpu(), None
+            fusion = self.backend.features(text_emb, audio, video)
+            variants = [fusion]
+            for sl in MODALITY_SLICES.values():
+                ablated = fusion.clone()
+                ablated[:, sl] = 0
+                variants.append(ablated)
+            probs = torch.softmax(self.backend.head(torch.cat(variants)), dim=1).cpu()
+        probs = probs.view(len(variants), fusion.size(0), -1)
+        return probs[0], probs[1:]
 
+    def predict_batch(self, batch: list):
+        """Run one forward pass over a list of `prepare_inputs` results."""
+        text_emb = torch.cat([b["text_emb"] for b in batch]).to(device)
+        audio = torch.cat([b["audio"] for b in batch]).to(device)
+        video = torch.cat([b["video"] for b in batch]).to(device)
+
+        probs, ablated = self._classify(text_emb, audio, video)
+        if ablated is None:
+            return [self._format_prediction(row) for row in probs]
+        return [self._format_prediction(row, ablated[:, i]) for i, row in enumerate(probs)]
+
+    def predict_timeline(self, audio, frames, frame_rate, hop_seconds, text_hint: str = "",
+                         offset: float = 0.0, sample_rate: int = 16000, num_frames: int = 16,
+                         max_batch: int = 32, max_windows: int = 256):
+        """
+        Score overlapping windows of an already decoded clip.
+
+        Window i covers `num_frames` consecutive frames starting at frame
+        i * hop (frames are sampled at `frame_rate`) plus the first second
+        of audio from the same instant, matching the single-clip inputs.
+        Windows run through the classifier in batches of `max_batch` with
+        one shared text embedding; the aggregate is the mean probability.
+        The hop is widened as needed to keep at most `max_windows` windows.
+        """
+        span_frames = max(len(frames) - num_frames, 0)
+        hop_frames = max(1, int(round(hop_seconds * frame_rate)), -(-span_frames // max(max_windows - 1, 1)))
+        starts = list(range(0, span_frames + 1, hop_frames))
+        text_emb = self.embed_text(text_hint).to(device)
+
+        chunks, ablated_chunks = [], []
+        for i in range(0, len(starts), max_batch):
+            idxs = starts[i:i + max_batch]
+            audio_t = torch.cat([
+                self.audio_to_tensor(audio[int(round(f / frame_rate * sample_rate)):], sample_rate)
+                for f in idxs
+            ]).to(device)
+            video_t = torch.cat([self.frames_to_tensor(frames[f:f + num_frames], num_frames) for f in idxs]).to(device)
+            probs, ablated = self._classify(text_emb.expand(len(idxs), -1), audio_t, video_t)
+            chunks.append(probs)
+            ablated_chunks.append(ablated)
+        probs = torch.cat(chunks)
+        ablated = torch.cat(ablated_chunks, dim=1).mean(dim=1) if ablated_chunks[0] is not None else None
+
+        result = self._format_prediction(probs.mean(dim=0), ablated)
+        result["aggregation"] = "mean"
+        result["timeline"] = []
+        for f, row in zip(starts, probs):
+            window = self._format_prediction(row)
+            result["timeline"].append({
+                "start": round(offset + f / frame_rate, 3),
+                "end": round(offset + (f + num_frames) / frame_rate, 3),
+                "predicted_emotion": window["predicted_emotion"],
+                "confidence": window["confidence"],
+                "probabilities": {emo: round(p, 4) for emo, p in zip(self.emotions, row.tolist())},
+            })
+        return result
+
+    def _format_prediction(self, probs, ablated=None):
+        """
+        `modalities` holds, per modality, how much the predicted emotion's
+        probability drops when that modality's features are zeroed
+        (negative: the modality argues against the prediction).
+        """
+        conf, idx = torch.max(probs, dim=0)
+        pred_emo = self.emotions[idx.item()]
+
+        modalities = {}
+        if ablated is not None:
+            modalities = {
+                name: round(float(conf.item() - row[idx].item()), 3)
+                for name, row in zip(MODALITY_SLICES, ablated)
+            }
         return {
             "predicted_emotion": pred_emo,
             "confidence": float(conf.item()),
-            "modalities": {
-                "audio": round(probs[0].mean().item(), 3),
-                "text": round(probs[0].mean().item(), 3),
-                "visual": round(probs[0].mean().item(), 3)
-            }
+            "modalities": modalities,
         }
 
+    def predict_from_video(self, video_path: str, text_hint: str = ""):
+        return self.predict_batch([self.prepare_inputs(video_path, text_hint)])[0]
+
 # ---------- Singleton Predictor ----------
+# Built on first use (or by `warmup()` in the background) so importing this
+# module is cheap and the server can report readiness while the model loads.
 _emotions = ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"]
 _model_path = os.getenv("MODEL_PATH", "best_multimodal_model.pth")
-_predictor = EmotionPredictor(_model_path, _emotions)
+_model_mmap = os.getenv("MODEL_MMAP", "0") == "1"
+_backend = os.getenv("INFERENCE_BACKEND", "eager")
+_export_dir = os.getenv("MODEL_EXPORT_DIR", "exported")
+_predictor = None
+_predictor_lock = threading.Lock()
+_startup_report = {}
+_shared_state_dict = None
+# Bump when the prediction dict's layout changes (2: `modalities` holds probability shifts)
+PREDICTION_FORMAT = 2
+_prediction_version = None
+
+def prediction_version() -> str:
+    """
+    Identifies what produces a prediction: output format, inference backend,
+    attribution setting and checkpoint. Part of every result cache key, so
+    changing any of them never serves predictions made under the old setup.
+    """
+    global _prediction_version
+    if _prediction_version is None:
+        try:
+            st = os.stat(_model_path)
+            checkpoint = f"{os.path.abspath(_model_path)}:{st.st_size}:{int(st.st_mtime)}"
+        except OSError:
+            checkpoint = _model_path
+        _prediction_version = f"{PREDICTION_FORMAT}|{_backend}|attr={int(MODALITY_ATTRIBUTION)}|{checkpoint}"
+    return _prediction_version
+
+def preload_shared_weights():
+    """
+    Load the checkpoint once in a pre-fork parent (the gunicorn master) so every
+    forked worker builds its predictor on the same physical pages.
+
+    With MODEL_MMAP=1 the tensors are file-backed mmaps shared through the
+    page cache; otherwise they are moved into shared memory (/dev/shm must
+    hold the whole checkpoint). Nothing here runs a forward pass or starts a
+    torch thread pool, which would not survive the fork.
+    """
+    global _shared_state_dict
+    t0 = time.perf_counter()
+    state_dict = torch.load(_model_path, map_location='cpu', mmap=_model_mmap, weights_only=True)
+    if not _model_mmap:
+        for tensor in state_dict.values():
+            tensor.share_memory_()
+    _shared_state_dict = state_dict
+    _startup_report["preload_weights"] = round((time.perf_counter() - t0) * 1000.0, 1)
+
+def get_predictor():
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                t0 = time.perf_counter()
+                predictor = EmotionPredictor(_model_path, _emotions, mmap=_model_mmap,
+                                             backend=_backend, export_dir=_export_dir,
+                                             state_dict=_shared_state_dict)
+                _startup_report.update(predictor.load_timings)
+                _startup_report["total_load"] = round((time.perf_counter() - t0) * 1000.0, 1)
+                _predictor = predictor
+    return _predictor
+
+def is_ready():
+    return _predictor is not None
+
+def startup_report():
+    return dict(_startup_report)
+
+def warmup():
+    """Load the model and run one dummy forward so the first request doesn't pay for lazy init."""
+    predictor = get_predictor()
+    t0 = time.perf_counter()
+    predictor.predict_batch([predictor.prepare_arrays(np.zeros(16000, dtype=np.float32), [])])
+    _startup_report["warmup_forward"] = round((time.perf_counter() - t0) * 1000.0, 1)
 
 def predict_from_video(video_path: str):
-    return _predictor.predict_from_video(video_path)
+    return get_predictor().predict_from_video(video_path)
+
+def prepare_inputs(video_path: str, text_hint: str = ""):
+    return get_predictor().prepare_inputs(video_path, text_hint)
+
+def prepare_arrays(audio, frames, text_hint: str = ""):
+    return get_predictor().prepare_arrays(audio, frames, text_hint)
+
+def predict_batch(batch: list):
+    return get_predictor().predict_batch(batch)
+
+def predict_timeline(audio, frames, frame_rate, hop_seconds, offset: float = 0.0):
+    return get_predictor().predict_timeline(audio, frames, frame_rate, hop_seconds, offset=offset,
+                                            max_batch=int(os.getenv("TIMELINE_MAX_BATCH", "32")),
+                                            max_windows=int(os.getenv("TIMELINE_MAX_WINDOWS", "256")))
+
+def text_cache_stats():
+    return _predictor.text_cache.stats() if _predictor is not None else None
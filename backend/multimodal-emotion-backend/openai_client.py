@@ -1,15 +1,217 @@
 # app/openai_client.py
+import asyncio
+import json
+import logging
 import os
-from openai import OpenAI
+import random
+import threading
+import time
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import httpx
+import openai
+from openai import AsyncOpenAI
 
-def generate_recommendations(prediction: dict, user_emotion: str) -> dict:
+logger = logging.getLogger(__name__)
+
+# ---------- SETTINGS ----------
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Whole-call budget, retries and rate-limit waits included
+OPENAI_DEADLINE_S = float(os.getenv("OPENAI_DEADLINE_S", "20"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_RATE_PER_S = float(os.getenv("OPENAI_RATE_PER_S", "5"))
+OPENAI_BURST = int(os.getenv("OPENAI_BURST", "10"))
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 8.0
+
+CONFIDENCE_BANDS = ((0.4, "low"), (0.7, "medium"), (1.01, "high"))
+
+RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def confidence_band(confidence) -> str:
+    try:
+        confidence = float(confidence)
+    except (TypeError, ValueError):
+        return "unknown"
+    for upper, band in CONFIDENCE_BANDS:
+        if confidence < upper:
+            return band
+    return CONFIDENCE_BANDS[-1][1]
+
+
+# ---------- RATE LIMITING ----------
+class TokenBucket:
     """
-    Uses OpenAI's new SDK interface (>=1.0.0) to generate structured, motivational,
-    and actionable recommendations when predicted emotion doesn't match the user's intended one.
+    Reservation-style token bucket shared by every call in the process.
+
+    `reserve()` takes a token immediately (the balance may go negative) and
+    returns how long the caller must sleep before sending, so waiting callers
+    are served in arrival order without a lock held across awaits. A 429's
+    Retry-After pauses the whole bucket, so one rate-limit response slows
+    every caller down instead of each one discovering it separately.
     """
 
+    def __init__(self, rate: float, capacity: int):
+        self.rate = max(float(rate), 1e-6)
+        self.capacity = max(int(capacity), 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1.0
+            wait = max(-self.tokens / self.rate, 0.0)
+            return max(wait, self.paused_until - now)
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1.0)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+# ---------- CLIENT ----------
+_bucket = TokenBucket(OPENAI_RATE_PER_S, OPENAI_BURST)
+_clients = {}  # event loop -> AsyncOpenAI
+_inflight = {}
+_stats = {"calls": 0, "requests": 0, "retries": 0, "coalesced": 0, "rate_limited": 0, "timeouts": 0, "errors": 0}
+
+
+def get_client() -> AsyncOpenAI:
+    """
+    One pooled client per event loop: the httpx connection pool is reused by
+    every call instead of reconnecting (and re-handshaking TLS) each time.
+    Clients of loops that have since closed are dropped when a new loop
+    asks for one. SDK retries are off; `_complete` retries with its own
+    deadline and jitter.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        for old_loop in [other for other in _clients if other.is_closed()]:
+            # Its connections can't be closed from another loop; the pool goes with the loop
+            del _clients[old_loop]
+        limits = httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                              max_keepalive_connections=OPENAI_MAX_CONNECTIONS)
+        client = _clients[loop] = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(OPENAI_DEADLINE_S, connect=5.0)),
+        )
+    return client
+
+
+async def close_client():
+    """Close every pooled client: this loop's here, those of other running loops on their own loop."""
+    loop = asyncio.get_running_loop()
+    clients = list(_clients.items())
+    _clients.clear()
+    for owner, client in clients:
+        if owner is loop:
+            await client.close()
+        elif owner.is_running():
+            asyncio.run_coroutine_threadsafe(client.close(), owner)
+
+
+def client_stats() -> dict:
+    return dict(_stats, inflight=len(_inflight))
+
+
+def _retry_after(error) -> float:
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0.0
+    try:
+        return max(float(response.headers.get("retry-after", 0)), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+async def _complete(messages, deadline, max_tokens=800, temperature=0.7, **extra) -> str:
+    """Chat completion within `deadline` (loop time), with rate limiting and jittered retries."""
+    loop = asyncio.get_running_loop()
+    client = get_client()
+    attempt = 0
+    while True:
+        wait = _bucket.reserve()
+        if loop.time() + wait >= deadline:
+            _bucket.refund()
+            raise asyncio.TimeoutError("Rate limit wait exceeds the call deadline")
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        _stats["requests"] += 1
+        try:
+            response = await client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=max(deadline - loop.time(), 0.1),
+                **extra,
+            )
+            return response.choices[0].message.content.strip()
+        except RETRYABLE as e:
+            attempt += 1
+            retry_after = _retry_after(e)
+            if isinstance(e, openai.RateLimitError):
+                _stats["rate_limited"] += 1
+                _bucket.pause(retry_after or BACKOFF_BASE_S)
+            # Full jitter, but never sooner than the server asked for
+            delay = max(random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt)), retry_after)
+            if attempt > OPENAI_MAX_RETRIES or loop.time() + delay >= deadline:
+                raise
+            _stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+
+async def _coalesced(key, factory):
+    """
+    Run `factory()` once per key at a time; concurrent callers with the same
+    key await the same task. The task is shielded so one caller going away
+    (client disconnect) doesn't cancel it for the others.
+    """
+    task = _inflight.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+
+        def release(done):
+            if _inflight.get(key) is done:
+                del _inflight[key]
+
+        task.add_done_callback(release)
+    else:
+        _stats["coalesced"] += 1
+    return await asyncio.shield(task)
+
+
+def _parse_recommendation(full_text: str) -> dict:
+    # Extract KEY SUMMARY line if present
+    key_summary = None
+    for line in full_text.splitlines():
+        if line.strip().startswith("KEY SUMMARY:"):
+            key_summary = line.strip().replace("KEY SUMMARY:", "").strip()
+            break
+
+    return {
+        "full_recommendation": full_text,
+        "key_summary": key_summary or "No summary provided."
+    }
+
+
+def build_messages(prediction: dict, user_emotion: str) -> list:
     system_prompt = (
         "You are an expert communication and performance coach. "
         "You analyze emotion delivery in videos and provide detailed, structured feedback. "
@@ -44,34 +246,120 @@ def generate_recommendations(prediction: dict, user_emotion: str) -> dict:
     **Finally**, conclude with a one-line takeaway starting with:
     `KEY SUMMARY:` (example: KEY SUMMARY: Add more vocal energy and maintain open body posture to express enthusiasm.)
     """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+async def generate_recommendations(prediction: dict, user_emotion: str, deadline_s: float = None,
+                                   coalesce_key=None) -> dict:
+    """
+    Structured, motivational and actionable recommendations for when the
+    predicted emotion doesn't match the user's intended one.
+
+    Identical in-flight requests (same predicted/intended pair and confidence
+    band, unless `coalesce_key` says otherwise) share one API call. Failures are logged and come back as an error
+    dict with an `error` code ("timeout", "rate_limited" or "api_error")
+    instead of raising.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (deadline_s or OPENAI_DEADLINE_S)
+    key = coalesce_key or (
+        prediction["predicted_emotion"].lower(), user_emotion.lower().strip(), confidence_band(prediction.get("confidence"))
+    )
+    messages = build_messages(prediction, user_emotion)
+    _stats["calls"] += 1
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=800,
-            temperature=0.7
+        full_text = await asyncio.wait_for(
+            _coalesced(key, lambda: _complete(messages, deadline)),
+            timeout=max(deadline - loop.time(), 0.0),
         )
+        return _parse_recommendation(full_text)
+
+    except (asyncio.TimeoutError, openai.APITimeoutError):
+        _stats["timeouts"] += 1
+        code = "timeout"
+    except openai.RateLimitError:
+        _stats["errors"] += 1
+        code = "rate_limited"
+    except Exception:
+        _stats["errors"] += 1
+        logger.exception("Recommendation request failed")
+        code = "api_error"
+
+    logger.warning("Recommendations unavailable (%s) for %s", code, key)
+    return {
+        "full_recommendation": "Recommendations are temporarily unavailable. Please try again shortly.",
+        "key_summary": "OpenAI API failed to generate feedback.",
+        "error": code,
+    }
+
+
+async def generate_session_recommendations(takes: list, deadline_s: float = None) -> dict:
+    """
+    Coaching for a whole session of takes in one request.
+
+    `takes` holds {"clip", "intended", "predicted_emotion", "confidence"} for
+    each mismatched take. Returns {"session_summary", "takes": {clip: {"key_summary",
+    "full_recommendation"}}}, or an error dict shaped like `generate_recommendations`'.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (deadline_s or OPENAI_DEADLINE_S * 2)
+    listing = "\n".join(
+        f"- {t['clip']}: intended **{t['intended']}**, detected **{t['predicted_emotion']}** "
+        f"(confidence {t.get('confidence')})"
+        for t in takes
+    )
+    messages = [
+        {"role": "system", "content": (
+            "You are an expert communication and performance coach reviewing a rehearsal session. "
+            "Reply with a single JSON object only."
+        )},
+        {"role": "user", "content": f"""
+    In these takes the speaker's intended emotion differed from the one the multimodal model detected:
+
+    {listing}
+
+    Return JSON of the form:
+    {{"session_summary": "3-5 sentences on patterns across the takes and what to practice first",
+      "takes": [{{"clip": "<clip name as given>", "recommendation": "2-3 specific, actionable tips",
+                 "key_summary": "one-line takeaway"}}]}}
+    """},
+    ]
+    _stats["calls"] += 1
+
+    try:
+        raw = await asyncio.wait_for(
+            _complete(messages, deadline, max_tokens=min(400 + 150 * len(takes), 4000),
+                      response_format={"type": "json_object"}),
+            timeout=max(deadline - loop.time(), 0.0),
+        )
+        data = json.loads(raw)
+        per_take = {}
+        for entry in data.get("takes", []):
+            if isinstance(entry, dict) and entry.get("clip"):
+                per_take[str(entry["clip"])] = {
+                    "full_recommendation": entry.get("recommendation", ""),
+                    "key_summary": entry.get("key_summary") or "No summary provided.",
+                }
+        return {"session_summary": data.get("session_summary", ""), "takes": per_take}
+
+    except (asyncio.TimeoutError, openai.APITimeoutError):
+        _stats["timeouts"] += 1
+        code = "timeout"
+    except openai.RateLimitError:
+        _stats["errors"] += 1
+        code = "rate_limited"
+    except Exception:
+        _stats["errors"] += 1
+        logger.exception("Session recommendation request failed")
+        code = "api_error"
 
-        full_text = response.choices[0].message.content.strip()
-
-        # Extract KEY SUMMARY line if present
-        key_summary = None
-        for line in full_text.splitlines():
-            if line.strip().startswith("KEY SUMMARY:"):
-                key_summary = line.strip().replace("KEY SUMMARY:", "").strip()
-                break
-
-        return {
-            "full_recommendation": full_text,
-            "key_summary": key_summary or "No summary provided."
-        }
-
-    except Exception as e:
-        return {
-            "full_recommendation": f"OpenAI API error: {e}",
-            "key_summary": "OpenAI API failed to generate feedback."
-        }
+    logger.warning("Session recommendations unavailable (%s) for %d takes", code, len(takes))
+    return {
+        "session_summary": "Recommendations are temporarily unavailable. Please try again shortly.",
+        "takes": {},
+        "error": code,
+    }
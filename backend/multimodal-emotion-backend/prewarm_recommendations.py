@@ -0,0 +1,71 @@
+"""
+Pre-generate recommendation variants for every intended/predicted mismatch pair.
+
+    python -m app.prewarm_recommendations --out recommendations.json
+
+With 7 emotions there are 42 mismatch pairs; each is generated for every
+confidence band and modality profile (narrow with --bands / --profiles).
+An existing --out file is topped up rather than regenerated. Serve it with
+RECOMMENDATION_CACHE_PATH=<out> (and a RECOMMENDATION_VARIANTS no larger
+than --variants, so warmed entries count as complete).
+"""
+import argparse
+import asyncio
+import itertools
+
+from .model_wrapper import _emotions
+from .openai_client import CONFIDENCE_BANDS, client_stats, close_client, generate_recommendations
+from .recommendation_cache import (
+    MODALITY_PROFILES, RecommendationCache, recommendation_key, template_prediction,
+)
+
+
+async def prewarm(cache, combos, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def fill(intended, predicted, band, profile):
+        nonlocal failed
+        key = recommendation_key(intended, predicted, band, profile)
+        async with sem:
+            # Distinct coalesce keys per variant, otherwise the pool would be one answer repeated
+            for attempt in range(cache.variants * 2):
+                if cache.get(key) is not None:
+                    return
+                recommendation = await generate_recommendations(
+                    template_prediction(predicted, band, profile), intended, coalesce_key=(key, attempt)
+                )
+                if "error" in recommendation:
+                    failed += 1
+                    return
+                cache.add(key, recommendation)
+
+    await asyncio.gather(*(fill(*combo) for combo in combos))
+    await close_client()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="recommendations.json")
+    parser.add_argument("--variants", type=int, default=3)
+    parser.add_argument("--bands", nargs="+", default=[band for _, band in CONFIDENCE_BANDS])
+    parser.add_argument("--profiles", nargs="+", choices=MODALITY_PROFILES, default=list(MODALITY_PROFILES))
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    # No TTL while warming; the serving process applies its own on load
+    cache = RecommendationCache(max_entries=10 ** 6, ttl_s=0, variants=args.variants, path=args.out)
+    pairs = list(itertools.permutations(_emotions, 2))
+    combos = [(i, p, band, profile) for i, p in pairs for band in args.bands for profile in args.profiles]
+    print(f"{len(pairs)} mismatch pairs, {len(combos)} entries x {args.variants} variants")
+
+    failed = asyncio.run(prewarm(cache, combos, args.concurrency))
+    cache.save(args.out)
+    stats = cache.stats()
+    print(f"wrote {args.out}: {stats['complete_entries']}/{len(combos)} complete entries, "
+          f"{failed} failed, OpenAI client {client_stats()}")
+
+
+if __name__ == "__main__":
+    main()
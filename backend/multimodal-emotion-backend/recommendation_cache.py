@@ -0,0 +1,157 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from .openai_client import confidence_band, generate_recommendations
+
+MODALITY_PROFILES = ("audio", "text", "visual", "balanced")
+# A modality "leads" when zeroing it costs the prediction at least this much more probability
+# than zeroing the weakest one (see `EmotionPredictor._format_prediction`)
+MODALITY_MARGIN = float(os.getenv("MODALITY_PROFILE_MARGIN", "0.1"))
+
+
+def modality_profile(modalities) -> str:
+    """Coarse shape of the per-modality probability shifts: the leading modality, or "balanced"."""
+    try:
+        scores = {name: float(value) for name, value in (modalities or {}).items()}
+    except (TypeError, ValueError):
+        return "balanced"
+    if not scores:
+        return "balanced"
+    top = max(scores, key=scores.get)
+    return top if scores[top] - min(scores.values()) >= MODALITY_MARGIN else "balanced"
+
+
+def recommendation_key(intended: str, predicted: str, band: str, profile: str) -> str:
+    return "|".join((intended.lower().strip(), predicted.lower().strip(), band, profile))
+
+
+def template_prediction(predicted: str, band: str, profile: str) -> dict:
+    """
+    The prediction as the LLM sees it for a cached entry: only the fields in
+    the key, so every request that maps to an entry is described identically.
+    """
+    modalities = {"dominant": profile} if profile != "balanced" else {"dominant": "none (balanced)"}
+    return {"predicted_emotion": predicted, "confidence": f"{band} band", "modalities": modalities}
+
+
+class RecommendationCache:
+    """
+    Bounded LRU of recommendation variants per (intended, predicted,
+    confidence band, modality profile).
+
+    An entry only serves hits once it holds `variants` answers, picked at
+    random so repeat visitors don't see identical text; until then each miss
+    adds one more. Entries expire `ttl_s` after they were created. The cache
+    can be saved to and loaded from a JSON file (see `prewarm_recommendations`).
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_s: float = 7 * 24 * 3600, variants: int = 3, path: str = None):
+        self.max_entries = max(int(max_entries), 0)
+        self.ttl_s = float(ttl_s)
+        self.variants = max(int(variants), 1)
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+            except (OSError, ValueError, KeyError, TypeError):
+                pass  # A bad warm file just means a cold cache
+
+    def _expired(self, entry, now):
+        return self.ttl_s > 0 and now - entry["created"] > self.ttl_s
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is None or len(entry["variants"]) < self.variants:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return random.choice(entry["variants"])
+
+    def add(self, key, recommendation: dict):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry, time.time()):
+                entry = {"created": time.time(), "variants": []}
+                self._entries[key] = entry
+            # Coalesced callers all add the same answer; keep one copy
+            if len(entry["variants"]) < self.variants and recommendation not in entry["variants"]:
+                entry["variants"].append(recommendation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def load(self, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        now = time.time()
+        with self._lock:
+            for key, entry in data.get("entries", {}).items():
+                if not self._expired(entry, now):
+                    self._entries[key] = {"created": entry["created"], "variants": entry["variants"][:self.variants]}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self, path=None):
+        path = path or self.path
+        with self._lock:
+            data = {"entries": dict(self._entries)}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "complete_entries": sum(len(e["variants"]) >= self.variants for e in self._entries.values()),
+                "max_entries": self.max_entries,
+                "variants": self.variants,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+
+async def cached_recommendations(cache: RecommendationCache, prediction: dict, user_emotion: str) -> dict:
+    """Recommendations from `cache` when the entry is full, otherwise one more LLM variant for it."""
+    predicted = prediction["predicted_emotion"]
+    band = confidence_band(prediction.get("confidence"))
+    profile = modality_profile(prediction.get("modalities"))
+    key = recommendation_key(user_emotion, predicted, band, profile)
+
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    recommendation = await generate_recommendations(
+        template_prediction(predicted, band, profile), user_emotion, coalesce_key=key
+    )
+    if "error" not in recommendation:
+        cache.add(key, recommendation)
+    return recommendation
+
+
+def recommendation_cache_from_env():
+    return RecommendationCache(
+        max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "512")),
+        ttl_s=float(os.getenv("RECOMMENDATION_CACHE_TTL_S", str(7 * 24 * 3600))),
+        variants=int(os.getenv("RECOMMENDATION_VARIANTS", "3")),
+        path=os.getenv("RECOMMENDATION_CACHE_PATH") or None,
+    )
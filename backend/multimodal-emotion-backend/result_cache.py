@@ -0,0 +1,125 @@
+import hashlib
+import io
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def cache_key(content_digest: str, start, end, variant: str = "", version: str = "") -> str:
+    """
+    Key for an upload's content hash plus the requested trim window, analysis
+    mode and the `version` of whatever produces the prediction.
+    """
+    window = f"{float(start or 0):.3f}:{float(end or 0):.3f}"
+    return hashlib.sha256(f"{content_digest}|{window}|{variant}|{version}".encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Size-bounded on-disk cache of decoded features and predictions.
+
+    Each entry is one `.npz` file holding the prediction as JSON plus,
+    when given, the decoded audio/frame arrays. Reads bump the file's mtime, and writes evict the
+    least recently used entries until the directory fits in `max_bytes`.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max(int(max_bytes), 0)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self._sizes = {}
+        for name in os.listdir(root):
+            if name.endswith(".npz"):
+                self._sizes[name[:-4]] = os.path.getsize(os.path.join(root, name))
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.npz")
+
+    def get(self, key):
+        """Return (audio, frames, duration, prediction) or None; the arrays are None if not stored."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = (
+                    data["audio"] if "audio" in data.files else None,
+                    data["frames"] if "frames" in data.files else None,
+                    float(data["duration"]),
+                    json.loads(str(data["prediction"])),
+                )
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key, audio, frames, duration, prediction):
+        """Store an entry; pass None for `audio`/`frames` to keep only the prediction."""
+        if self.max_bytes == 0:
+            return
+        arrays = {name: value for name, value in (("audio", audio), ("frames", frames)) if value is not None}
+        buf = io.BytesIO()
+        np.savez(buf, **arrays, duration=np.float64(duration), prediction=np.str_(json.dumps(prediction)))
+        payload = buf.getvalue()
+        if len(payload) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            # A full or read-only cache dir must never fail the request itself
+            return
+
+        with self._lock:
+            self._sizes[key] = len(payload)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        def last_used(k):
+            try:
+                return os.path.getmtime(self._path(k))
+            except OSError:
+                return 0.0
+
+        for key in sorted(self._sizes, key=last_used):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            total -= self._sizes.pop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._sizes),
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def result_cache_from_env(default_root):
+    # Workers share the directory but each tracks only its own writes, so each gets a share of the limit
+    workers = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+    return ResultCache(
+        os.getenv("RESULT_CACHE_DIR", os.path.join(default_root, "result_cache")),
+        max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024))) // workers,
+    )
@@ -0,0 +1,340 @@
+import asyncio
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# "disk" keeps scratch files under SCRATCH_DIR; "tmpfs" under /dev/shm; "memfd" additionally
+# backs single files with anonymous memory, handed to ffmpeg as a /proc/<pid>/fd path
+SCRATCH_BACKEND = os.getenv("SCRATCH_BACKEND", "disk")
+TMPFS_ROOT = "/dev/shm/multimodal_backend"
+
+
+class ScratchQuotaExceeded(RuntimeError):
+    """No room under the scratch byte quota within the wait timeout."""
+
+
+def _tree_size(path):
+    if not os.path.isdir(path) or os.path.islink(path):
+        try:
+            return os.lstat(path).st_size
+        except OSError:
+            return 0
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def memfd_supported() -> bool:
+    return hasattr(os, "memfd_create") and os.path.isdir(f"/proc/{os.getpid()}/fd")
+
+
+class ScratchSession:
+    """
+    Scratch files for one request, all removed (and their bytes returned to
+    the quota) by `close()`. Use as a context manager, sync or async.
+
+    Bytes are reserved before they are written, so a full quota makes the
+    writer wait instead of filling the disk. A session that already holds
+    bytes never waits for more: it fails at once, so two half-written
+    sessions can't each sit on part of the quota waiting for the other.
+    """
+
+    def __init__(self, space, name):
+        self.space = space
+        self.name = name
+        self.created = time.time()
+        self.reserved = 0
+        self._dir = None
+        self._files = []
+        self._count = 0
+        self.closed = False
+
+    @property
+    def dir(self) -> str:
+        """This session's directory, created on first use."""
+        if self._dir is None:
+            self._dir = os.path.join(self.space.root, self.name)
+            os.makedirs(self._dir, exist_ok=True)
+        return self._dir
+
+    def path(self, filename: str) -> str:
+        """A fresh path in the session directory; `filename` is reduced to its basename."""
+        self._count += 1
+        return os.path.join(self.dir, f"{self._count:04d}_{os.path.basename(filename or 'upload')}")
+
+    def new_file(self, filename: str):
+        """
+        Open a new scratch file for writing; returns (path, file object).
+        The session owns the file object and closes it on `close()`; flush
+        before handing `path` to another process. With the memfd backend the
+        file lives in anonymous memory and `path` is its /proc fd link.
+        """
+        if self.space.memfd:
+            fd = os.memfd_create(os.path.basename(filename or "upload"), os.MFD_CLOEXEC)
+            f = os.fdopen(fd, "w+b")
+            path = f"/proc/{os.getpid()}/fd/{fd}"
+        else:
+            path = self.path(filename)
+            f = open(path, "w+b")
+        self._files.append(f)
+        return path, f
+
+    def reserve(self, nbytes: int, timeout: float = None):
+        self.space.reserve(nbytes, timeout, held=self.reserved)
+        self.reserved += nbytes
+
+    async def reserve_async(self, nbytes: int, timeout: float = None):
+        """`reserve` without blocking the event loop while the quota is full."""
+        await self.space.reserve_async(nbytes, timeout, held=self.reserved)
+        self.reserved += nbytes
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for f in self._files:
+            try:
+                f.close()
+            except OSError:
+                pass
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+        self.space._finish(self)
+
+    async def aclose(self):
+        # Closing files and removing one request directory is quick; doing it inline keeps
+        # quota releases from queueing behind other work on the default executor
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+class ScratchSpace:
+    """
+    Per-request scratch storage under `root` with a global byte quota.
+
+    `session()` hands out a `ScratchSession`; its bytes count against
+    `max_bytes` until it is closed, and writers block for up to `wait_s`
+    when the quota is full before giving up with ScratchQuotaExceeded.
+    A background thread (`start_gc`) removes whatever sessions left behind:
+    entries under `root` older than `max_age_s` that no live session owns,
+    and live sessions that were never closed within that age.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 1024 ** 3, backend: str = "disk",
+                 max_age_s: float = 3600, gc_interval_s: float = 60, wait_s: float = 10):
+        self.backend = backend
+        self.memfd = backend == "memfd" and memfd_supported()
+        self.root = root
+        self.max_bytes = max(int(max_bytes), 0)
+        self.max_age_s = float(max_age_s)
+        self.gc_interval_s = float(gc_interval_s)
+        self.wait_s = float(wait_s)
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        self.rejected = 0
+        self.gc_runs = 0
+        self.gc_removed_bytes = 0
+        self._live = {}
+        self._cond = threading.Condition()
+        self._async_waiters = []
+        self._stop = threading.Event()
+        self._gc_thread = None
+        os.makedirs(root, exist_ok=True)
+
+    def session(self) -> ScratchSession:
+        session = ScratchSession(self, f"req_{uuid.uuid4().hex}")
+        with self._cond:
+            self._live[session.name] = session
+        return session
+
+    def try_reserve(self, nbytes: int) -> bool:
+        with self._cond:
+            if self.used + nbytes > self.max_bytes:
+                return False
+            self._take(nbytes)
+            return True
+
+    def _check(self, nbytes, held):
+        """Reject a reservation that could never be granted; returns whether it may wait."""
+        if held + nbytes > self.max_bytes:
+            self.rejected += 1
+            raise ScratchQuotaExceeded(f"{held + nbytes} bytes is more than the whole scratch quota.")
+        return not held
+
+    def reserve(self, nbytes: int, timeout: float = None, held: int = 0):
+        """
+        Take `nbytes` of quota, waiting up to `timeout` (default `wait_s`) for room.
+        `held` is what the caller already has reserved; callers holding bytes
+        don't wait, so hold-and-wait can't deadlock the quota.
+        """
+        timeout = self.wait_s if timeout is None else timeout
+        with self._cond:
+            may_wait = self._check(nbytes, held)
+            if self.used + nbytes > self.max_bytes:
+                self.waits += 1
+                if not may_wait or not self._cond.wait_for(lambda: self.used + nbytes <= self.max_bytes, timeout):
+                    self.rejected += 1
+                    raise ScratchQuotaExceeded("Scratch space is full.")
+            self._take(nbytes)
+
+    async def reserve_async(self, nbytes: int, timeout: float = None, held: int = 0):
+        """`reserve` for coroutines: waits on a future woken by `_finish`, not on a thread."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.wait_s if timeout is None else timeout)
+        counted = False
+        while True:
+            with self._cond:
+                may_wait = self._check(nbytes, held)
+                if self.used + nbytes <= self.max_bytes:
+                    self._take(nbytes)
+                    return
+                if not counted:
+                    self.waits += 1
+                    counted = True
+                remaining = deadline - loop.time()
+                if not may_wait or remaining <= 0:
+                    self.rejected += 1
+                    raise ScratchQuotaExceeded("Scratch space is full.")
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def _take(self, nbytes):
+        self.used += nbytes
+        self.peak = max(self.peak, self.used)
+
+    def _finish(self, session):
+        with self._cond:
+            self._live.pop(session.name, None)
+            self.used = max(self.used - session.reserved, 0)
+            session.reserved = 0
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def gc(self):
+        """One collection pass; returns the bytes removed."""
+        cutoff = time.time() - self.max_age_s
+        with self._cond:
+            stale = [s for s in self._live.values() if s.created < cutoff]
+            live = set(self._live) - {s.name for s in stale}
+        removed = 0
+        for session in stale:
+            removed += _tree_size(session._dir) if session._dir else 0
+            session.close()
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            entries = []
+        for entry in entries:
+            if entry.name in live:
+                continue
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                    continue
+            except OSError:
+                continue
+            removed += _tree_size(entry.path)
+            _remove(entry.path)
+        with self._cond:
+            self.gc_runs += 1
+            self.gc_removed_bytes += removed
+        return removed
+
+    def _gc_loop(self):
+        while not self._stop.wait(self.gc_interval_s):
+            self.gc()
+
+    def start_gc(self):
+        if self._gc_thread is None and self.gc_interval_s > 0:
+            self._stop.clear()
+            self._gc_thread = threading.Thread(target=self._gc_loop, name="scratch-gc", daemon=True)
+            self._gc_thread.start()
+
+    def stop_gc(self):
+        self._stop.set()
+        if self._gc_thread is not None:
+            self._gc_thread.join(timeout=5)
+            self._gc_thread = None
+
+    def stats(self) -> dict:
+        with self._cond:
+            body = {
+                "backend": "memfd" if self.memfd else self.backend,
+                "root": self.root,
+                "used_bytes": self.used,
+                "peak_bytes": self.peak,
+                "max_bytes": self.max_bytes,
+                "live_sessions": len(self._live),
+                "quota_waits": self.waits,
+                "quota_rejections": self.rejected,
+                "gc_runs": self.gc_runs,
+                "gc_removed_bytes": self.gc_removed_bytes,
+            }
+        try:
+            usage = shutil.disk_usage(self.root)
+            body["filesystem"] = {"total_bytes": usage.total, "free_bytes": usage.free}
+        except OSError:
+            body["filesystem"] = None
+        return body
+
+
+def scratch_space_from_env(default_root):
+    backend = SCRATCH_BACKEND
+    if backend in ("tmpfs", "memfd") and os.path.isdir("/dev/shm"):
+        default_root = TMPFS_ROOT
+    # Each worker process keeps its own count, so the server-wide quota is split between them
+    workers = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+    return ScratchSpace(
+        os.getenv("SCRATCH_DIR", default_root),
+        max_bytes=int(os.getenv("SCRATCH_MAX_BYTES", str(1024 ** 3))) // workers,
+        backend=backend,
+        max_age_s=float(os.getenv("SCRATCH_MAX_AGE_S", "3600")),
+        gc_interval_s=float(os.getenv("SCRATCH_GC_INTERVAL_S", "60")),
+        wait_s=float(os.getenv("SCRATCH_WAIT_S", "10")),
+    )
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+
+from .executor import Saturated
+
+AUDIO_SAMPLES = 16000
+NUM_FRAMES = 16
+FRAME_SIZE = 112
+FRAME_BYTES = FRAME_SIZE * FRAME_SIZE * 3
+
+# Binary message kinds (first byte of each WebSocket binary message)
+MSG_AUDIO = 0x01  # float32 little-endian mono PCM at 16 kHz
+MSG_FRAMES = 0x02  # one or more 112x112 RGB uint8 frames, row-major
+
+STREAM_INTERVAL_MS = int(os.getenv("STREAM_INTERVAL_MS", "500"))
+STREAM_MIN_INTERVAL_MS = 100
+# Don't predict from less than this much audio (a quarter second by default)
+STREAM_MIN_AUDIO_SAMPLES = int(os.getenv("STREAM_MIN_AUDIO_SAMPLES", "4000"))
+
+
+class RingBuffer:
+    """
+    Fixed-capacity ring of items of one shape, allocated once.
+    `write` overwrites the oldest items; `snapshot` copies them out oldest
+    first into a caller-owned array, so steady state allocates nothing.
+    """
+
+    def __init__(self, capacity: int, item_shape=(), dtype=np.float32):
+        self.capacity = int(capacity)
+        self.data = np.zeros((self.capacity, *item_shape), dtype=dtype)
+        self.pos = 0
+        self.filled = 0
+        self.written = 0
+
+    def write(self, items):
+        n = len(items)
+        if n == 0:
+            return
+        self.written += n
+        if n >= self.capacity:
+            items = items[-self.capacity:]
+            n = self.capacity
+        end = self.pos + n
+        if end <= self.capacity:
+            self.data[self.pos:end] = items
+        else:
+            head = self.capacity - self.pos
+            self.data[self.pos:] = items[:head]
+            self.data[:n - head] = items[head:]
+        self.pos = end % self.capacity
+        self.filled = min(self.capacity, self.filled + n)
+
+    def snapshot(self, out):
+        """Fill `out` (same shape as the ring) oldest first; returns the filled prefix view."""
+        if self.filled < self.capacity:
+            out[:self.filled] = self.data[:self.filled]
+        else:
+            tail = self.capacity - self.pos
+            out[:tail] = self.data[self.pos:]
+            out[tail:] = self.data[:self.pos]
+        return out[:self.filled]
+
+
+class StreamSession:
+    """
+    One live WebSocket client: rolling audio/frame windows shaped like the
+    model inputs, predicted every `interval_ms` while new data keeps arriving.
+
+    `infer(audio, frames)` is awaited for each prediction; routing it through
+    the shared `BatchScheduler` batches ticks from all connected clients into
+    the same forward passes.
+    """
+
+    def __init__(self, websocket, infer, interval_ms: int = STREAM_INTERVAL_MS):
+        self.websocket = websocket
+        self.infer = infer
+        self.interval_ms = interval_ms
+        self.user_emotion = None
+        self.audio = RingBuffer(AUDIO_SAMPLES, dtype=np.float32)
+        self.frames = RingBuffer(NUM_FRAMES, (FRAME_SIZE, FRAME_SIZE, 3), dtype=np.uint8)
+        self._audio_out = np.zeros_like(self.audio.data)
+        self._frames_out = np.zeros_like(self.frames.data)
+        self._last_written = (0, 0)
+        self.sent = 0
+        self.skipped = 0
+
+    def configure(self, message: dict):
+        if "interval_ms" in message:
+            self.interval_ms = max(int(message["interval_ms"]), STREAM_MIN_INTERVAL_MS)
+        if "user_emotion" in message:
+            self.user_emotion = message["user_emotion"] or None
+
+    def ingest(self, payload: bytes):
+        """Append one binary message to the matching ring. Raises ValueError on a malformed payload."""
+        if not payload:
+            raise ValueError("Empty message.")
+        kind, body = payload[0], memoryview(payload)[1:]
+        if kind == MSG_AUDIO:
+            if len(body) % 4:
+                raise ValueError("Audio payload must be float32 samples.")
+            self.audio.write(np.frombuffer(body, dtype="<f4"))
+        elif kind == MSG_FRAMES:
+            if len(body) % FRAME_BYTES:
+                raise ValueError(f"Frame payload must be a multiple of {FRAME_BYTES} bytes (112x112 RGB).")
+            self.frames.write(np.frombuffer(body, dtype=np.uint8).reshape(-1, FRAME_SIZE, FRAME_SIZE, 3))
+        else:
+            raise ValueError(f"Unknown message kind {kind}.")
+
+    async def _receive(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            try:
+                if message.get("bytes") is not None:
+                    self.ingest(message["bytes"])
+                elif message.get("text") is not None:
+                    self.configure(json.loads(message["text"]))
+            except (ValueError, TypeError, AttributeError) as e:
+                await self.websocket.send_json({"type": "error", "detail": str(e)})
+
+    def _ready(self):
+        written = (self.audio.written, self.frames.written)
+        return written != self._last_written and self.audio.filled >= STREAM_MIN_AUDIO_SAMPLES
+
+    async def _emit(self):
+        next_tick = time.monotonic()
+        while True:
+            next_tick += self.interval_ms / 1000.0
+            await asyncio.sleep(max(next_tick - time.monotonic(), 0.0))
+            if not self._ready():
+                continue
+            self._last_written = (self.audio.written, self.frames.written)
+            audio = self.audio.snapshot(self._audio_out)
+            frames = self.frames.snapshot(self._frames_out)
+            t0 = time.perf_counter()
+            try:
+                prediction = await self.infer(audio, frames)
+            except Saturated:
+                # Drop this tick rather than queue behind a full scheduler; the next one has fresher data
+                self.skipped += 1
+                continue
+            except Exception as e:
+                await self.websocket.send_json({"type": "error", "detail": f"Model inference failed: {e}"})
+                continue
+            event = {
+                "type": "prediction",
+                "seq": self.sent,
+                "latency_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+                "window": {"audio_samples": len(audio), "frames": len(frames)},
+                **prediction,
+            }
+            if self.user_emotion:
+                event["match"] = prediction["predicted_emotion"].lower() == self.user_emotion.lower().strip()
+            await self.websocket.send_json(event)
+            self.sent += 1
+            if time.monotonic() > next_tick:
+                next_tick = time.monotonic()
+
+    async def run(self):
+        receiver = asyncio.ensure_future(self._receive())
+        emitter = asyncio.ensure_future(self._emit())
+        try:
+            await asyncio.wait({receiver, emitter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            receiver.cancel()
+            emitter.cancel()
+            # A send to a closed socket just ends the emitter; nothing to report
+            await asyncio.gather(receiver, emitter, return_exceptions=True)
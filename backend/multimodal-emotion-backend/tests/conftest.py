@@ -0,0 +1,10 @@
+import os
+import sys
+import types
+
+# The backend runs as the package `app` (gunicorn.conf.py, benchmarks); its modules use relative imports
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "app" not in sys.modules:
+    package = types.ModuleType("app")
+    package.__path__ = [PACKAGE_DIR]
+    sys.modules["app"] = package
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.batching import BatchScheduler
+from app.executor import Saturated
+
+
+class RecordingModel:
+    """predict_batch stand-in: echoes each input doubled and records the batch sizes."""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def __call__(self, inputs):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(len(inputs))
+        return [x * 2 for x in inputs]
+
+
+def test_concurrent_submits_are_flushed_as_full_batches():
+    model = RecordingModel()
+
+    async def scenario():
+        scheduler = BatchScheduler(model, max_batch_size=4, max_wait_ms=1000)
+        try:
+            return await asyncio.gather(*(scheduler.submit(i) for i in range(8)))
+        finally:
+            await scheduler.stop()
+
+    # Full batches go out at once, long before the 1s wait runs out
+    assert asyncio.run(asyncio.wait_for(scenario(), 0.5)) == [i * 2 for i in range(8)]
+    assert model.batches == [4, 4]
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+    model = RecordingModel()
+
+    async def scenario():
+        scheduler = BatchScheduler(model, max_batch_size=8, max_wait_ms=20)
+        try:
+            return await asyncio.gather(*(scheduler.submit(i) for i in range(3)))
+        finally:
+            await scheduler.stop()
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 1)) == [0, 2, 4]
+    assert model.batches == [3]
+
+
+def test_full_queue_raises_saturated():
+    gate = threading.Event()
+    model = RecordingModel(gate)
+
+    async def scenario():
+        scheduler = BatchScheduler(model, max_batch_size=1, max_wait_ms=0, max_queue=1)
+        first = asyncio.ensure_future(scheduler.submit(1))
+        await asyncio.sleep(0.05)  # The first request is in the (blocked) forward pass
+        second = asyncio.ensure_future(scheduler.submit(2))
+        await asyncio.sleep(0)
+        assert scheduler.saturated
+        with pytest.raises(Saturated):
+            await scheduler.submit(3)
+        gate.set()
+        results = await asyncio.gather(first, second)
+        await scheduler.stop()
+        return results
+
+    try:
+        assert asyncio.run(asyncio.wait_for(scenario(), 2)) == [2, 4]
+    finally:
+        gate.set()
+
+
+def test_batch_failure_reaches_every_caller():
+    def broken(inputs):
+        raise RuntimeError("model exploded")
+
+    async def scenario():
+        scheduler = BatchScheduler(broken, max_batch_size=4, max_wait_ms=10)
+        results = await asyncio.gather(*(scheduler.submit(i) for i in range(2)), return_exceptions=True)
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [str(r) for r in results] == ["model exploded", "model exploded"]
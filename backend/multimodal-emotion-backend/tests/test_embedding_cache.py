@@ -0,0 +1,26 @@
+from app.embedding_cache import EmbeddingCache, normalize_text
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {"entries": 2, "max_entries": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = EmbeddingCache(max_entries=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_text_hints_differing_in_case_and_spacing_share_a_key():
+    assert normalize_text("  Happy\tand   SAD ") == normalize_text("happy and sad") == "happy and sad"
+    assert normalize_text(None) == ""
@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("cv2")
+
+from app.frame_sampler import plan_indices  # noqa: E402
+
+
+def test_indices_are_evenly_spaced_from_the_first_frame():
+    assert plan_indices(160, 16) == list(range(0, 160, 10))
+
+
+def test_remainder_frames_at_the_end_are_skipped():
+    # 170 // 16 == 10, so the last 10 frames are never sampled, as with the original seek loop
+    assert plan_indices(170, 16) == list(range(0, 160, 10))
+
+
+def test_short_clips_yield_every_frame_once():
+    assert plan_indices(5, 16) == [0, 1, 2, 3, 4]
+
+
+def test_empty_or_unknown_length_yields_nothing():
+    assert plan_indices(0, 16) == []
+    assert plan_indices(-1, 16) == []
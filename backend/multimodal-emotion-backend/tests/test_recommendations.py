@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from app.benchmarks.fixtures import FakeOpenAIServer  # noqa: E402
+from app.benchmarks.recommendations import _run, distinct, same  # noqa: E402
+
+
+@pytest.fixture
+def openai_client(monkeypatch):
+    from app import openai_client
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    # A fresh bucket per test, roomy enough that only the fake server's 429s slow calls down
+    monkeypatch.setattr(openai_client, "_bucket", openai_client.TokenBucket(50.0, 50))
+    return openai_client
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    servers = []
+
+    def start(**kwargs):
+        server = FakeOpenAIServer(**kwargs).__enter__()
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
+def test_identical_calls_share_one_request(openai_client, fake_server):
+    fake = fake_server(latency=0.2)
+    before = openai_client.client_stats()
+
+    results, _ = asyncio.run(_run(16, same))
+
+    assert all("error" not in r for r in results)
+    assert fake.requests == 1
+    assert openai_client.client_stats()["coalesced"] - before["coalesced"] == 15
+
+
+def test_rate_limited_requests_are_retried(openai_client, fake_server):
+    fake = fake_server(latency=0.05, fail_every=2)
+    before = openai_client.client_stats()
+
+    results, _ = asyncio.run(_run(32, distinct, distinct_keys=True))
+
+    stats = openai_client.client_stats()
+    assert all("error" not in r for r in results)
+    assert stats["rate_limited"] - before["rate_limited"] > 0
+    assert stats["retries"] - before["retries"] > 0
+    assert fake.requests > 32
+
+
+def test_slow_server_times_out_within_the_deadline(openai_client, fake_server):
+    fake_server(latency=2.0)
+
+    results, elapsed = asyncio.run(_run(4, distinct, deadline_s=0.5, distinct_keys=True))
+
+    assert {r.get("error") for r in results} == {"timeout"}
+    assert elapsed < 1.5
@@ -0,0 +1,64 @@
+import os
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.result_cache import ResultCache, cache_key  # noqa: E402
+
+PREDICTION = {"predicted_emotion": "joy", "confidence": 0.9}
+
+
+def _put(cache, key):
+    cache.put(key, np.zeros(4000, dtype=np.float32), np.zeros((2, 8, 8, 3), dtype=np.uint8), 1.5, PREDICTION)
+
+
+def test_round_trip_with_and_without_arrays(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=1024 ** 2)
+    _put(cache, "clip")
+    cache.put("timeline", None, None, 2.0, PREDICTION)
+
+    audio, frames, duration, prediction = cache.get("clip")
+    assert audio.shape == (4000,) and frames.shape == (2, 8, 8, 3)
+    assert (duration, prediction) == (1.5, PREDICTION)
+    assert cache.get("timeline") == (None, None, 2.0, PREDICTION)
+    assert cache.get("missing") is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_least_recently_read_entry_is_evicted_first(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=1024 ** 2)
+    _put(cache, "a")
+    entry_size = cache.stats()["bytes"]
+    cache.max_bytes = 2 * entry_size
+    _put(cache, "b")
+    # Make "a" the older file, then read it so it becomes the most recently used
+    old = time.time() - 60
+    os.utime(os.path.join(str(tmp_path), "a.npz"), (old, old))
+    os.utime(os.path.join(str(tmp_path), "b.npz"), (old + 1, old + 1))
+    assert cache.get("a") is not None
+    _put(cache, "c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["entries"] == 2
+
+
+def test_disabled_cache_writes_nothing(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=0)
+    _put(cache, "a")
+    assert cache.get("a") is None
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_keys_differ_by_window_variant_and_version():
+    base = cache_key("digest", 0, None, "", "v1")
+    assert cache_key("digest", 0.0, 0, "", "v1") == base  # Equivalent windows share a key
+    assert len({
+        base,
+        cache_key("digest", 1.0, None, "", "v1"),
+        cache_key("digest", 0, None, "timeline:2.000:1.000", "v1"),
+        cache_key("digest", 0, None, "", "v2"),
+        cache_key("other", 0, None, "", "v1"),
+    }) == 5
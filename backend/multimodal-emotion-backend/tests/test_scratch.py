@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.scratch import ScratchQuotaExceeded, ScratchSpace
+
+
+def test_session_holding_bytes_fails_instead_of_waiting(tmp_path):
+    space = ScratchSpace(str(tmp_path), max_bytes=100, wait_s=5)
+
+    async def scenario():
+        first, second = space.session(), space.session()
+        await first.reserve_async(60)
+        await second.reserve_async(40)
+        # Neither can grow while the other holds its share; the second fails at once and frees its bytes
+        with pytest.raises(ScratchQuotaExceeded):
+            await second.reserve_async(10)
+        await second.aclose()
+        await first.reserve_async(30)
+        await first.aclose()
+
+    asyncio.run(asyncio.wait_for(scenario(), 1))
+    assert space.used == 0
+    assert space.rejected == 1
+
+
+def test_waiting_reservation_wakes_when_another_session_closes(tmp_path):
+    space = ScratchSpace(str(tmp_path), max_bytes=100, wait_s=5)
+
+    async def scenario():
+        holder = space.session()
+        await holder.reserve_async(80)
+        waiter = space.session()
+        pending = asyncio.ensure_future(waiter.reserve_async(50))
+        await asyncio.sleep(0.01)
+        assert not pending.done()
+        await holder.aclose()
+        await pending
+        assert waiter.reserved == 50
+        await waiter.aclose()
+
+    asyncio.run(asyncio.wait_for(scenario(), 1))
+    assert space.waits == 1
+    assert space.used == 0
+
+
+def test_reservation_larger_than_quota_fails_fast(tmp_path):
+    space = ScratchSpace(str(tmp_path), max_bytes=100, wait_s=5)
+    session = space.session()
+    session.reserve(60)
+    with pytest.raises(ScratchQuotaExceeded):
+        session.reserve(60)
+    session.close()
+    assert space.used == 0
@@ -0,0 +1,42 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.streaming import RingBuffer  # noqa: E402
+
+
+def _snapshot(ring):
+    return ring.snapshot(np.zeros_like(ring.data)).tolist()
+
+
+def test_partial_ring_returns_only_what_was_written():
+    ring = RingBuffer(5)
+    ring.write(np.array([1, 2], dtype=np.float32))
+    assert _snapshot(ring) == [1, 2]
+    assert (ring.filled, ring.written) == (2, 2)
+
+
+def test_writes_wrap_around_and_snapshot_oldest_first():
+    ring = RingBuffer(5)
+    ring.write(np.arange(1, 5, dtype=np.float32))
+    ring.write(np.array([5, 6, 7], dtype=np.float32))  # Splits across the end of the array
+    assert _snapshot(ring) == [3, 4, 5, 6, 7]
+    ring.write(np.array([8], dtype=np.float32))
+    assert _snapshot(ring) == [4, 5, 6, 7, 8]
+    assert ring.written == 8
+
+
+def test_write_longer_than_capacity_keeps_the_newest_items():
+    ring = RingBuffer(3)
+    ring.write(np.array([1], dtype=np.float32))
+    ring.write(np.arange(2, 9, dtype=np.float32))
+    assert _snapshot(ring) == [6, 7, 8]
+    assert ring.written == 8
+
+
+def test_items_keep_their_shape():
+    ring = RingBuffer(2, (2, 2), dtype=np.uint8)
+    frames = np.arange(3 * 4, dtype=np.uint8).reshape(3, 2, 2)
+    for frame in frames:
+        ring.write(frame[None])
+    assert np.array_equal(ring.snapshot(np.zeros_like(ring.data)), frames[1:])
@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Wall-clock time per named pipeline stage for a single request."""
+
+    def __init__(self):
+        self.stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - t0) * 1000.0
+
+    def server_timing(self) -> str:
+        """Value for the `Server-Timing` response header (durations in ms)."""
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.stages.items())
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    idx = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return round(sorted_values[idx], 1)
+
+
+class StageMetrics:
+    """Rolling per-stage latency samples across requests, summarized as percentiles."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, timer: StageTimer):
+        with self._lock:
+            for name, ms in timer.stages.items():
+                self._samples.setdefault(name, deque(maxlen=self.window)).append(ms)
+                self._counts[name] = self._counts.get(name, 0) + 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+            counts = dict(self._counts)
+        return {
+            name: {
+                "count": counts[name],
+                "p50_ms": percentile(values, 0.50),
+                "p90_ms": percentile(values, 0.90),
+                "p99_ms": percentile(values, 0.99),
+                "max_ms": round(values[-1], 1) if values else None,
+            }
+            for name, values in snapshot.items()
+        }
@@ -1,63 +1,257 @@
 import os
-import uuid
+import math
+import json
+import hashlib
+import asyncio
 import subprocess
-import tempfile
+import threading
+
+import numpy as np
 
 TMP_DIR = "/tmp/multimodal_backend"
 os.makedirs(TMP_DIR, exist_ok=True)
 
-def save_upload_and_trim(file_bytes, filename, start=None, end=None):
+MAX_CLIP_SECONDS = 300.0
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def save_upload(file_bytes, filename, scratch):
+    """Write the raw upload to the request's scratch session and return its path."""
+    scratch.reserve(len(file_bytes))
+    input_path, f = scratch.new_file(filename)
+    f.write(file_bytes)
+    f.flush()
+    return input_path
+
+
+async def stream_upload_to_disk(upload, scratch, chunk_size=UPLOAD_CHUNK_SIZE):
     """
-    Trim video reliably using ffmpeg subprocess.
-    Handles multi-stream MP4s (5.1 audio, chapters, subtitles).
+    Copy a Starlette UploadFile into the request's scratch session chunk by chunk,
+    never holding it all in memory. The declared upload size is reserved against
+    the scratch quota before anything is written, so a full quota makes the upload
+    wait (or fail) up front rather than part way through holding half its bytes.
+    Only bytes beyond the declared size are reserved as they arrive.
+    Returns (path, sha256 hex digest of the content).
     """
-    input_path = os.path.join(TMP_DIR, f"{uuid.uuid4().hex}_{filename}")
-    with open(input_path, "wb") as f:
-        f.write(file_bytes)
+    reserved = getattr(upload, "size", None) or 0
+    if reserved:
+        await scratch.reserve_async(reserved)
+    input_path, f = scratch.new_file(upload.filename)
+    digest = hashlib.sha256()
+    written = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        written += len(chunk)
+        if written > reserved:
+            await scratch.reserve_async(written - reserved)
+            reserved = written
+        digest.update(chunk)
+        f.write(chunk)
+    f.flush()
+    return input_path, digest.hexdigest()
+
+
+_PROBE_ARGS = ["ffprobe", "-v", "error", "-show_entries", "format=duration:stream=codec_type", "-of", "json"]
 
+
+def _parse_probe(stdout):
+    info = {"duration": MAX_CLIP_SECONDS, "has_video": True, "has_audio": True}
+    try:
+        data = json.loads(stdout or "{}")
+        codec_types = {s.get("codec_type") for s in data.get("streams", [])}
+        info["has_video"] = "video" in codec_types
+        info["has_audio"] = "audio" in codec_types
+        info["duration"] = float(data["format"]["duration"])
+    except Exception:
+        pass
+    return info
+
+
+def probe_media(input_path):
+    """
+    Read container duration and stream types with a single ffprobe call.
+    Only headers are parsed, nothing is decoded. Falls back to 300s when unknown.
+    """
+    try:
+        probe = subprocess.run(_PROBE_ARGS + [input_path], capture_output=True, text=True, check=True)
+    except Exception:
+        return _parse_probe(None)
+    return _parse_probe(probe.stdout)
+
+
+async def probe_media_async(input_path):
+    """`probe_media` on an asyncio subprocess."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *_PROBE_ARGS, input_path, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, _ = await proc.communicate()
+    except Exception:
+        return _parse_probe(None)
+    return _parse_probe(stdout.decode(errors="ignore") if proc.returncode == 0 else None)
+
+
+def resolve_window(start, end, duration):
+    """Clamp the requested [start, end] window to the clip and the 5 minute limit."""
     start = float(start or 0)
     end = float(end or 0)
+    if end == 0 or end > duration:
+        end = min(duration, MAX_CLIP_SECONDS)
+    if end - start > MAX_CLIP_SECONDS:
+        end = start + MAX_CLIP_SECONDS
+    return start, end
+
+
+def _decode_command(input_path, start, end, probe, audio_fd, num_frames, frame_size,
+                    sample_rate, audio_seconds, frame_rate=None):
+    if not probe["has_video"] and not probe["has_audio"]:
+        raise RuntimeError("Upload contains no audio or video stream.")
+
+    span = max(end - start, 1e-3)
+    frame_rate = frame_rate or num_frames / span
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-ss", str(start), "-to", str(end), "-i", input_path]
+    if probe["has_video"]:
+        cmd += [
+            "-map", "0:v:0",
+            "-vf", f"fps={frame_rate:.6f},scale={frame_size}:{frame_size}:flags=bilinear",
+            "-frames:v", str(num_frames),
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1",
+        ]
+    if audio_fd is not None:
+        cmd += [
+            "-map", "0:a:0",
+            "-t", str(audio_seconds),
+            "-ac", "1", "-ar", str(sample_rate),
+            "-f", "f32le", f"pipe:{audio_fd}",
+        ]
+    return cmd
 
-    # Determine duration (fallback to 300s if not available)
+
+def _decode_output(returncode, video_bytes, audio_bytes, stderr, frame_size):
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed:\n{stderr.decode(errors='ignore')[:500]}")
+
+    frame_bytes = frame_size * frame_size * 3
+    usable = len(video_bytes) - len(video_bytes) % frame_bytes
+    frames = np.frombuffer(video_bytes[:usable], dtype=np.uint8).reshape(-1, frame_size, frame_size, 3)
+    audio = np.frombuffer(audio_bytes, dtype=np.float32)
+    return audio, frames
+
+
+def decode_clip(input_path, start, end, num_frames=16, frame_size=112,
+                sample_rate=16000, audio_seconds=1.0, probe=None, frame_rate=None):
+    """
+    Decode the [start, end] window in one ffmpeg pass, without re-encoding.
+
+    Produces the first `audio_seconds` of mono float32 audio at `sample_rate`
+    and `num_frames` evenly spaced RGB frames resized to `frame_size`, as
+    numpy arrays of shape (samples,) and (frames, H, W, 3). Audio is written
+    to an extra pipe so both streams come out of the same demux/decode.
+    `frame_rate` overrides the even spacing with a fixed sampling rate.
+    """
+    probe = probe or probe_media(input_path)
+    audio_r, audio_w = os.pipe() if probe["has_audio"] else (None, None)
+    audio_chunks = []
     try:
-        probe = subprocess.run(
-            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
-             "-of", "default=noprint_wrappers=1:nokey=1", input_path],
-            capture_output=True, text=True, check=True
+        cmd = _decode_command(input_path, start, end, probe, audio_w, num_frames, frame_size,
+                              sample_rate, audio_seconds, frame_rate)
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            pass_fds=(audio_w,) if audio_w is not None else (),
         )
-        duration = float(probe.stdout.strip())
     except Exception:
-        duration = 300.0
+        for fd in (audio_r, audio_w):
+            if fd is not None:
+                os.close(fd)
+        raise
+
+    reader = None
+    if audio_w is not None:
+        os.close(audio_w)
+
+        def _drain_audio():
+            with os.fdopen(audio_r, "rb") as f:
+                audio_chunks.append(f.read())
+
+        reader = threading.Thread(target=_drain_audio, daemon=True)
+        reader.start()
+
+    video_bytes, stderr = proc.communicate()
+    if reader is not None:
+        reader.join()
+    return _decode_output(proc.returncode, video_bytes, b"".join(audio_chunks), stderr, frame_size)
+
+
+async def _read_fd(fd):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", 0)
+    )
+    try:
+        return await reader.read()
+    finally:
+        transport.close()
 
-    if end == 0 or end > duration:
-        end = min(duration, 300.0)
-    if end - start > 300:
-        end = start + 300.0
-
-    output_path = os.path.join(TMP_DIR, f"trimmed_{uuid.uuid4().hex}.mp4")
-
-    # Build a clean ffmpeg command:
-    # - maps only first video and first audio stream
-    # - forces re-encode (avoids "At least one output file" issue)
-    ffmpeg_cmd = [
-        "ffmpeg", "-y",
-        "-ss", str(start),
-        "-to", str(end),
-        "-i", input_path,
-        "-map", "0:v:0", "-map", "0:a:0?",
-        "-c:v", "libx264", "-preset", "ultrafast",
-        "-c:a", "aac", "-b:a", "128k",
-        "-ac", "2",  # force stereo
-        "-movflags", "+faststart",
-        output_path
-    ]
 
+async def decode_clip_async(input_path, start, end, num_frames=16, frame_size=112,
+                            sample_rate=16000, audio_seconds=1.0, probe=None, frame_rate=None):
+    """`decode_clip` on an asyncio subprocess, reading both pipes without blocking the loop."""
+    probe = probe or await probe_media_async(input_path)
+    audio_r, audio_w = os.pipe() if probe["has_audio"] else (None, None)
     try:
-        result = subprocess.run(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"ffmpeg failed:\n{e.stderr.decode(errors='ignore')[:500]}")
+        cmd = _decode_command(input_path, start, end, probe, audio_w, num_frames, frame_size,
+                              sample_rate, audio_seconds, frame_rate)
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            pass_fds=(audio_w,) if audio_w is not None else (),
+        )
+    except Exception:
+        for fd in (audio_r, audio_w):
+            if fd is not None:
+                os.close(fd)
+        raise
 
-    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
-        raise RuntimeError("ffmpeg trimming succeeded but output file is empty.")
+    audio_read = None
+    if audio_w is not None:
+        os.close(audio_w)
+        audio_read = asyncio.ensure_future(_read_fd(audio_r))
 
-    return output_path, end - start
+    video_bytes, stderr = await proc.communicate()
+    audio_bytes = await audio_read if audio_read is not None else b""
+    return _decode_output(proc.returncode, video_bytes, audio_bytes, stderr, frame_size)
+
+
+async def decode_file_async(input_path, start=None, end=None, probe=None):
+    """
+    Probe a file already on disk and decode model inputs for the window.
+    Returns (audio, frames, clip_duration_seconds).
+    """
+    probe = probe or await probe_media_async(input_path)
+    start, end = resolve_window(start, end, probe["duration"])
+    audio, frames = await decode_clip_async(input_path, start, end, probe=probe)
+    return audio, frames, end - start
+
+
+async def decode_timeline_async(input_path, start=None, end=None, window_seconds=2.0,
+                                window_frames=16, sample_rate=16000, probe=None):
+    """
+    Decode the whole window once for timeline analysis.
+
+    Frames are sampled at `window_frames / window_seconds` fps so that any
+    run of `window_frames` consecutive frames spans one window, and audio is
+    kept for the full span. Returns (audio, frames, duration, frame_rate);
+    callers slice per-window inputs out of these arrays.
+    """
+    probe = probe or await probe_media_async(input_path)
+    start, end = resolve_window(start, end, probe["duration"])
+    span = max(end - start, 1e-3)
+    frame_rate = window_frames / window_seconds
+    num_frames = max(window_frames, int(math.ceil(span * frame_rate)))
+    audio, frames = await decode_clip_async(
+        input_path, start, end, num_frames=num_frames, sample_rate=sample_rate,
+        audio_seconds=span, probe=probe, frame_rate=frame_rate,
+    )
+    return audio, frames, end - start, frame_rate
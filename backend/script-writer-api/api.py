@@ -1,41 +1,58 @@
 # pyright: reportMissingImports=false
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import os
 import json
+import re
+import uuid
 import warnings
 import sys
 from pathlib import Path
-import fitz  # PyMuPDF for text extraction
+from typing import List
 
 """Ensure local src layout is importable: script_writer/src."""
 SRC_PATH = Path(__file__).parent / "script_writer" / "src"
 if str(SRC_PATH) not in sys.path:
     sys.path.insert(0, str(SRC_PATH))
 
-from script_writer.crew import ScriptWriter
+from script_writer.crew import draft_review_pool, rewrite_pool
+from script_writer.decisions import InvalidDecision, decision_stats
+from script_writer.llm_cache import LLM_MAX_CONCURRENCY, response_cache
+from script_writer.jobs import JobCancelled, JobLimitExceeded, job_manager_from_env
+from script_writer.streaming import STREAMING_SUPPORTED, task_sink, token_sink
+from script_writer.scenes import run_scene_generation, should_split
+from script_writer.patches import INCREMENTAL_REFINE, parse_edits, refine_script
+from script_writer.quality import gate_stats, review_draft
+from script_writer.pdf_ingest import (
+    PREVIEW_CHARS, extract_pdf_text, preview, save_pdf_upload, save_pdf_upload_async, shutdown_pool,
+    start_upload_gc, stop_upload_gc,
+)
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_manager.recover()
+    start_upload_gc(active_pdf_paths)
+    yield
+    stop_upload_gc()
+    job_manager.shutdown()
+    shutdown_pool()
+
+
 app = FastAPI(
     title="Script Writer API",
     description="An AI-powered multi-agent system that transforms scripts into a specified genre with iterative improvements.",
     version="1.2.0",
+    lifespan=lifespan,
 )
 
-# -------------------------------
-# Helper: Extract Text from PDF
-# -------------------------------
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extracts all text from a PDF file using PyMuPDF."""
-    text = ""
-    with fitz.open(pdf_path) as doc:
-        for page in doc:
-            text += page.get_text("text") + "\n"
-    return text.strip()
-
 # -------------------------------
 # Helper: Format Script Output
 # -------------------------------
@@ -55,12 +72,22 @@ def format_script_output(script_text: str, genre: str, review_text: str = "") ->
 """
     return formatted_output.strip()
 
+def output_path(genre: str, iteration: int) -> str:
+    """Unique per run, so concurrent runs (and genres) never overwrite each other's files."""
+    slug = re.sub(r"[^a-z0-9]+", "-", genre.lower()).strip("-") or "script"
+    return f"output/final_script_{slug}_{uuid.uuid4().hex[:8]}_iter_{iteration}.md"
+
 # -------------------------------
 # Core Logic Function
 # -------------------------------
-def run_script_generation(original_script: str, genre: str):
-    """Reusable function for both direct text and PDF input."""
+def run_script_generation(original_script: str, genre: str, on_event=None):
+    """
+    Reusable function for both direct text and PDF input.
+    `on_event(dict)` is called at iteration boundaries, after every task and
+    with the supervisor's decision; raising from it aborts the run.
+    """
     os.makedirs("output", exist_ok=True)
+    emit = on_event or (lambda event: None)
 
     script_to_rewrite = original_script
     target_genre = genre
@@ -71,27 +98,43 @@ def run_script_generation(original_script: str, genre: str):
     final_script_text = ""
     final_review_text = ""
 
-    while iteration < max_iterations:
-        iteration += 1
-        print(f"\n====================\n=== ITERATION {iteration} ===\n====================\n")
+    # Long screenplays are rewritten scene by scene in parallel instead of in one prompt
+    if should_split(original_script):
+        final_script_text, final_review_text, final_output = run_scene_generation(
+            original_script, target_genre, max_iterations=max_iterations, emit=emit
+        )
+        iteration = final_output["iteration"]
 
-        crew = ScriptWriter().crew()
+    edits = []
+    last_good_script = original_script
 
-        inputs = {
-            "original_script": script_to_rewrite,
-            "genre": target_genre,
-        }
-
-        supervisor_results = crew.kickoff(inputs=inputs)
-        rewritten_script = crew.tasks[0].output.raw
-        review_report = crew.tasks[1].output.raw
+    while not final_output and iteration < max_iterations:
+        iteration += 1
+        print(f"\n====================\n=== ITERATION {iteration} ===\n====================\n")
+        emit({"type": "iteration_start", "iteration": iteration, "max_iterations": max_iterations})
 
-        final_script_text = rewritten_script
-        final_review_text = review_report
+        def task_done(output, iteration=iteration):
+            emit({"type": "task_complete", "iteration": iteration, "task": output.name, "output": output.raw})
 
         try:
-            supervisor_data = json.loads(supervisor_results.raw)
-        except json.JSONDecodeError:
+            if edits:
+                # Only the targeted scenes go back to the LLM; the patches are applied here
+                rewritten_script, review_report, supervisor_data = refine_script(
+                    final_script_text, edits, target_genre, iteration, emit
+                )
+            else:
+                inputs = {
+                    "original_script": script_to_rewrite,
+                    "genre": target_genre,
+                }
+                with rewrite_pool.checkout() as crew, task_sink(task_done):
+                    rewritten_script = crew.kickoff(inputs=inputs).raw
+                final_script_text = rewritten_script
+                # Clear passes and fails are decided locally; only uncertain drafts reach the reviewers
+                review_report, supervisor_data = review_draft(
+                    rewritten_script, original_script, target_genre, iteration, emit
+                )
+        except InvalidDecision:
             final_output = {
                 "iteration": iteration,
                 "ready": False,
@@ -99,17 +142,35 @@ def run_script_generation(original_script: str, genre: str):
             }
             break
 
+        final_script_text = rewritten_script
+        final_review_text = review_report or final_review_text
+        edits = parse_edits(supervisor_data, final_script_text) if INCREMENTAL_REFINE else []
+
+        emit({
+            "type": "decision",
+            "iteration": iteration,
+            "ready": bool(supervisor_data.get("ready", False)),
+            "rewrite_instructions": supervisor_data.get("rewrite_instructions", ""),
+            "edits": edits,
+        })
+
         if supervisor_data.get("ready", False):
             final_output = {
                 "iteration": iteration,
                 "ready": True,
-                "message": "Script approved by supervisor.",
+                "message": (
+                    "Script approved by quality gate." if supervisor_data.get("gate") == "pass"
+                    else "Script approved by supervisor."
+                ),
             }
             break
-        else:
+        elif not edits:
             rewrite_instructions = supervisor_data.get("rewrite_instructions", "")
+            # A draft that failed the gate (e.g. cut off) isn't worth building on; redo the last good one
+            if supervisor_data.get("gate") != "fail":
+                last_good_script = rewritten_script
             script_to_rewrite = (
-                f"### PREVIOUS SCRIPT VERSION:\n{rewritten_script}\n\n"
+                f"### PREVIOUS SCRIPT VERSION:\n{last_good_script}\n\n"
                 f"### INSTRUCTIONS FOR NEXT REWRITE:\n{rewrite_instructions}"
             )
 
@@ -124,7 +185,7 @@ def run_script_generation(original_script: str, genre: str):
     structured_script = format_script_output(final_script_text, genre)
 
     # Save it to file
-    final_path = f"output/final_script_structured_iter_{iteration}.md"
+    final_path = output_path(genre, iteration)
     with open(final_path, "w", encoding="utf-8") as f:
         f.write(structured_script)
 
@@ -153,31 +214,264 @@ def generate_script(request: ScriptRequest):
 async def generate_script_from_pdf(file: UploadFile = File(...), genre: str = Form(...)):
     """Accepts a PDF file, extracts text, and generates the rewritten script."""
     try:
-        os.makedirs("uploads", exist_ok=True)
-        file_path = f"uploads/{file.filename}"
-
-        # Save PDF
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
+        # Save PDF (streamed in chunks, named by content hash)
+        file_path, digest = await save_pdf_upload_async(file)
 
-        # Extract text
-        extracted_text = extract_text_from_pdf(file_path)
+        # Extract text off the event loop; pages are spread over a process pool
+        extracted_text = await run_in_threadpool(extract_pdf_text, file_path, digest)
         if not extracted_text.strip():
             raise HTTPException(status_code=400, detail="No text could be extracted from the PDF.")
 
         # Run generation
-        result = run_script_generation(extracted_text, genre)
+        result = await run_in_threadpool(run_script_generation, extracted_text, genre)
 
         # Include extracted text for frontend preview
-        result["extracted_text_preview"] = (
-            extracted_text[:1500] + "..." if len(extracted_text) > 1500 else extracted_text
-        )
+        result["extracted_text_preview"] = preview(extracted_text)
 
         return JSONResponse(content=result)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# -------------------------------
+# 3️⃣ Streaming (Server-Sent Events)
+# -------------------------------
+# The loop only keeps weak references to tasks; streams whose client left keep running until the crew stops
+stream_workers = set()
+
+def sse_event(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@app.post("/generate-script/stream")
+async def generate_script_stream(request: ScriptRequest):
+    """
+    Runs the crew and streams its progress as Server-Sent Events:
+    `iteration_start`, `token` (rewrite tokens, when the LLM streams),
+    `task_complete` (each task's full output), `decision` (the
+    supervisor's ready flag), then a final `result` or `error`.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    disconnected = False
+
+    def push(event):
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def on_event(event):
+        if disconnected:
+            raise JobCancelled("client disconnected")
+        push(event)
+
+    def on_token(text, task_name):
+        push({"type": "token", "task": task_name, "text": text})
+
+    def run():
+        with token_sink(on_token):
+            return run_script_generation(request.original_script, request.genre, on_event=on_event)
+
+    async def worker():
+        try:
+            result = await run_in_threadpool(run)
+            push({"type": "result", **result})
+        except JobCancelled:
+            pass
+        except Exception as e:
+            push({"type": "error", "detail": str(e)})
+        finally:
+            push(None)
+
+    task = asyncio.create_task(worker())
+    stream_workers.add(task)
+    task.add_done_callback(stream_workers.discard)
+
+    async def events():
+        nonlocal disconnected
+        try:
+            yield sse_event({"type": "start", "genre": request.genre, "token_streaming": STREAMING_SUPPORTED})
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield sse_event(event)
+        except (GeneratorExit, asyncio.CancelledError):
+            # Stop the crew at its next task boundary if the client went away
+            disconnected = True
+            raise
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# -------------------------------
+# 4️⃣ Background Jobs
+# -------------------------------
+def run_generation_job(genre: str, original_script: str = None, extracted_text_preview: str = None,
+                       pdf_path: str = None, pdf_digest: str = None, on_event=None):
+    if original_script is None:
+        # PDF jobs only stored the upload; the full extraction happens here, off the request
+        original_script = extract_pdf_text(pdf_path, pdf_digest)
+    result = run_script_generation(original_script, genre, on_event=on_event)
+    if extracted_text_preview is not None:
+        result["extracted_text_preview"] = extracted_text_preview
+    return result
+
+job_manager = job_manager_from_env(run_generation_job)
+
+def active_pdf_paths():
+    """Uploads that queued or running PDF jobs will still read."""
+    jobs = (job_manager.store.get(job_id) for job_id in job_manager.store.active_ids())
+    return [job["params"].get("pdf_path") for job in jobs if job]
+
+def submit_job(user_id: str, params: dict):
+    try:
+        job_id = job_manager.submit(user_id, params)
+    except JobLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+@app.post("/jobs/generate-script/")
+def submit_script_job(request: ScriptRequest, x_user_id: str = Header("anonymous")):
+    """Queues a generation run and returns its job id immediately."""
+    return submit_job(x_user_id, {"original_script": request.original_script, "genre": request.genre})
+
+@app.post("/jobs/generate-script-from-pdf/")
+def submit_pdf_job(file: UploadFile = File(...), genre: str = Form(...), x_user_id: str = Header("anonymous")):
+    """Reads just enough of the PDF for the preview, then queues the generation run."""
+    file_path, digest = save_pdf_upload(file)
+
+    head = extract_pdf_text(file_path, digest, max_chars=PREVIEW_CHARS + 1)
+    if not head.strip():
+        raise HTTPException(status_code=400, detail="No text could be extracted from the PDF.")
+
+    return submit_job(x_user_id, {
+        "genre": genre,
+        "pdf_path": file_path,
+        "pdf_digest": digest,
+        "extracted_text_preview": preview(head),
+    })
+
+def public_job(job: dict) -> dict:
+    """Job record without the (potentially huge) submitted script."""
+    return {
+        "job_id": job["id"],
+        "user_id": job["user_id"],
+        "status": job["status"],
+        "genre": job["params"].get("genre"),
+        "progress": job["progress"],
+        "result": job["result"],
+        "error": job["error"],
+        "cancel_requested": job["cancel_requested"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+@app.get("/jobs/")
+def list_jobs(x_user_id: str = Header("anonymous")):
+    return [public_job(job) for job in job_manager.store.list_for_user(x_user_id)]
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return public_job(job)
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancels a queued job, or stops a running one at its next task boundary."""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return public_job(job)
+
+# -------------------------------
+# 5️⃣ Multi-Genre Fan-Out
+# -------------------------------
+MAX_GENRES = int(os.getenv("MAX_GENRES", "8"))
+
+class MultiGenreRequest(BaseModel):
+    original_script: str
+    genres: List[str]
+
+def parse_genres(genres) -> list:
+    """Dedupes (case-insensitively) and validates the requested genres."""
+    unique = list({g.strip().lower(): g.strip() for g in genres if g and g.strip()}.values())
+    if not unique:
+        raise HTTPException(status_code=400, detail="Provide at least one genre.")
+    if len(unique) > MAX_GENRES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_GENRES} genres per request.")
+    return unique
+
+def fan_out_genres(original_script: str, genres: list, extracted_text_preview: str = None):
+    """
+    Runs one generation per genre concurrently and streams NDJSON lines as
+    each genre finishes. All runs share the process-wide LLM concurrency cap,
+    so adding genres queues LLM calls instead of multiplying them.
+    """
+    disconnected = False
+
+    def on_event(event):
+        if disconnected:
+            raise JobCancelled("client disconnected")
+
+    async def run_genre(genre):
+        try:
+            result = await run_in_threadpool(run_script_generation, original_script, genre, on_event)
+            return {"type": "genre_result", "genre": genre, **result}
+        except JobCancelled:
+            return {"type": "genre_cancelled", "genre": genre}
+        except Exception as e:
+            return {"type": "genre_error", "genre": genre, "detail": str(e)}
+
+    async def events():
+        nonlocal disconnected
+        start = {"type": "start", "genres": genres, "llm_max_concurrency": LLM_MAX_CONCURRENCY}
+        if extracted_text_preview is not None:
+            start["extracted_text_preview"] = extracted_text_preview
+        yield json.dumps(start) + "\n"
+        tasks = [asyncio.ensure_future(run_genre(genre)) for genre in genres]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+            yield json.dumps({"type": "done"}) + "\n"
+        except (GeneratorExit, asyncio.CancelledError):
+            # Remaining genres stop at their next task boundary if the client went away
+            disconnected = True
+            raise
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/generate-script/genres")
+async def generate_script_genres(request: MultiGenreRequest):
+    """Adapts one script into several genres at once; streams NDJSON as each genre finishes."""
+    return fan_out_genres(request.original_script, parse_genres(request.genres))
+
+@app.post("/generate-script-from-pdf/genres")
+async def generate_script_genres_from_pdf(file: UploadFile = File(...), genres: str = Form(...)):
+    """Same as `/generate-script/genres` for a PDF; `genres` is comma separated. The PDF is read once."""
+    genre_list = parse_genres(genres.split(","))
+    file_path, digest = await save_pdf_upload_async(file)
+    extracted_text = await run_in_threadpool(extract_pdf_text, file_path, digest)
+    if not extracted_text.strip():
+        raise HTTPException(status_code=400, detail="No text could be extracted from the PDF.")
+    return fan_out_genres(extracted_text, genre_list, preview(extracted_text))
+
+# -------------------------------
+# Cache / Pool Stats
+# -------------------------------
+@app.get("/stats")
+def stats():
+    return {
+        "llm_response_cache": response_cache.stats(),
+        "crews_built": rewrite_pool.created + draft_review_pool.created,
+        "quality_gate": gate_stats(),
+        "supervisor_decisions": decision_stats(),
+    }
+
 # -------------------------------
 # Run Locally
 # -------------------------------
@@ -1,8 +1,12 @@
+import os
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
 from typing import List
-from crewai_tools import SerperDevTool
+
+from script_writer.llm_cache import CachedLLM
+from script_writer.pool import CrewPool
+from script_writer.streaming import forward_task_output
 
 @CrewBase
 class ScriptWriter():
@@ -18,45 +22,172 @@ class ScriptWriter():
     def script_transformer(self) -> Agent:
         return Agent(
             config=self.agents_config['script_transformer'],
+            # Streamed so /generate-script/stream can push rewrite tokens as they arrive
+            llm=CachedLLM(model=self.agents_config['script_transformer']['llm'],
+                          stream=os.getenv("LLM_STREAM", "1") == "1"),
+            verbose=True,
+        )
+
+    @task
+    def rewrite_task(self) -> Task:
+        return Task(
+            config=self.tasks_config['rewrite_task'], 
+        )
+
+    def rewrite_crew(self) -> Crew:
+        """Only the rewrite, so the draft can be checked locally before any reviewer sees it"""
+        return Crew(
+            agents=[self.script_transformer()],
+            tasks=[self.rewrite_task()],
+            process=Process.sequential,
+            task_callback=forward_task_output,
             verbose=True,
         )
 
+
+@CrewBase
+class DraftReviewer():
+    """Reviews a finished draft passed in as input"""
+
+    agents: List[BaseAgent]
+    tasks: List[Task]
+
+    agents_config = 'config/agents.yaml'
+    tasks_config = 'config/review_tasks.yaml'
+
     @agent
     def quality_editor(self) -> Agent:
         return Agent(
-            config=self.agents_config['quality_editor'], 
+            config=self.agents_config['quality_editor'],
+            llm=CachedLLM(model=self.agents_config['quality_editor']['llm']),
             verbose=True
         )
+
     @agent
     def iteration_supervisor(self) -> Agent:
         return Agent(
             config=self.agents_config['iteration_supervisor'],
+            llm=CachedLLM(model=self.agents_config['iteration_supervisor']['llm']),
             verbose=True
-    )
-
-    @task
-    def rewrite_task(self) -> Task:
-        return Task(
-            config=self.tasks_config['rewrite_task'], 
         )
 
     @task
-    def review_task(self) -> Task:
+    def draft_review_task(self) -> Task:
         return Task(
-            config=self.tasks_config['review_task']
+            config=self.tasks_config['draft_review_task'],
         )
+
     @task
-    def improvement_task(self)->Task:
+    def draft_supervisor_task(self) -> Task:
         return Task(
-            config= self.tasks_config['improvement_task'],
+            config=self.tasks_config['draft_supervisor_task'],
         )
 
     @crew
     def crew(self) -> Crew:
-        """Creates the ScriptWriter crew"""
+        """Creates the DraftReviewer crew"""
         return Crew(
-            agents=self.agents, 
+            agents=self.agents,
             tasks=self.tasks,
             process=Process.sequential,
+            task_callback=forward_task_output,
+            verbose=True,
+        )
+
+
+@CrewBase
+class SceneWriter():
+    """Per-scene crews used to rewrite long screenplays in parallel"""
+
+    agents: List[BaseAgent]
+    tasks: List[Task]
+
+    agents_config = 'config/agents.yaml'
+    tasks_config = 'config/scene_tasks.yaml'
+
+    @agent
+    def script_transformer(self) -> Agent:
+        return Agent(
+            config=self.agents_config['script_transformer'],
+            llm=CachedLLM(model=self.agents_config['script_transformer']['llm']),
+            verbose=True,
+        )
+
+    @agent
+    def quality_editor(self) -> Agent:
+        return Agent(
+            config=self.agents_config['quality_editor'],
+            llm=CachedLLM(model=self.agents_config['quality_editor']['llm']),
+            verbose=True
+        )
+
+    @agent
+    def iteration_supervisor(self) -> Agent:
+        return Agent(
+            config=self.agents_config['iteration_supervisor'],
+            llm=CachedLLM(model=self.agents_config['iteration_supervisor']['llm']),
+            verbose=True
+        )
+
+    @task
+    def scene_rewrite_task(self) -> Task:
+        return Task(
+            config=self.tasks_config['scene_rewrite_task'],
+        )
+
+    @task
+    def scene_review_task(self) -> Task:
+        return Task(
+            config=self.tasks_config['scene_review_task'],
+        )
+
+    @task
+    def scene_supervisor_task(self) -> Task:
+        return Task(
+            config=self.tasks_config['scene_supervisor_task'],
+        )
+
+    @task
+    def patch_task(self) -> Task:
+        return Task(
+            config=self.tasks_config['patch_task'],
+        )
+
+    def rewrite_crew(self) -> Crew:
+        """Rewrites a single scene"""
+        return Crew(
+            agents=[self.script_transformer()],
+            tasks=[self.scene_rewrite_task()],
+            process=Process.sequential,
+            task_callback=forward_task_output,
             verbose=True,
         )
+
+    def patch_crew(self) -> Crew:
+        """Rewrites only the excerpts a supervisor targeted and returns them as patches"""
+        return Crew(
+            agents=[self.script_transformer()],
+            tasks=[self.patch_task()],
+            process=Process.sequential,
+            task_callback=forward_task_output,
+            verbose=True,
+        )
+
+    def review_crew(self) -> Crew:
+        """Reviews a batch of scenes and flags the ones that need another pass"""
+        return Crew(
+            agents=[self.quality_editor(), self.iteration_supervisor()],
+            tasks=[self.scene_review_task(), self.scene_supervisor_task()],
+            process=Process.sequential,
+            task_callback=forward_task_output,
+            verbose=True,
+        )
+
+
+# Built once per process: re-parsing the YAML and reconstructing every Agent
+# on each iteration is pure overhead.
+rewrite_pool = CrewPool(lambda: ScriptWriter().rewrite_crew(), max_idle=int(os.getenv("CREW_POOL_SIZE", "8")))
+draft_review_pool = CrewPool(lambda: DraftReviewer().crew(), max_idle=int(os.getenv("CREW_POOL_SIZE", "8")))
+scene_rewrite_pool = CrewPool(lambda: SceneWriter().rewrite_crew(), max_idle=int(os.getenv("CREW_POOL_SIZE", "8")))
+scene_review_pool = CrewPool(lambda: SceneWriter().review_crew(), max_idle=int(os.getenv("CREW_POOL_SIZE", "8")))
+patch_pool = CrewPool(lambda: SceneWriter().patch_crew(), max_idle=int(os.getenv("CREW_POOL_SIZE", "8")))
@@ -0,0 +1,91 @@
+import json
+import os
+import re
+import threading
+from typing import List
+
+from pydantic import BaseModel, ConfigDict, ValidationError
+
+from script_writer.llm_cache import CachedLLM
+
+# Small model asked to fix a supervisor answer that doesn't match the schema; empty disables the retry
+DECISION_REPAIR_MODEL = os.getenv("DECISION_REPAIR_MODEL", "openai/gpt-4o-mini")
+
+FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+
+
+class InvalidDecision(ValueError):
+    """The supervisor's answer couldn't be read as a decision, even after the repair retry."""
+
+
+class SupervisorDecision(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    ready: bool
+    rewrite_instructions: str = ""
+    edits: List[dict] = []
+    scenes: List[dict] = []
+
+
+_stats = {"parsed": 0, "repaired": 0, "invalid": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def decision_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def extract_json(raw: str) -> dict:
+    """The JSON object in an LLM answer, ignoring code fences and surrounding prose. Raises ValueError."""
+    text = FENCE.sub("", raw or "")
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("no JSON object found")
+    return json.loads(text[start:end + 1])
+
+
+def _load(raw: str) -> dict:
+    """Validate the JSON object in `raw` against SupervisorDecision."""
+    return SupervisorDecision.model_validate(extract_json(raw)).model_dump()
+
+
+def _repair(raw: str) -> str:
+    llm = CachedLLM(model=DECISION_REPAIR_MODEL, temperature=0)
+    schema = json.dumps(SupervisorDecision.model_json_schema())
+    return llm.call([
+        {"role": "system", "content": (
+            "Convert the user's message into a single JSON object matching this JSON schema. "
+            f"Keep its meaning, invent nothing, and reply with the JSON only.\n{schema}"
+        )},
+        {"role": "user", "content": raw},
+    ])
+
+
+def parse_decision(raw: str, repair: bool = True) -> dict:
+    """
+    The supervisor's decision as a dict with ready, rewrite_instructions,
+    edits and scenes. Answers that don't validate get one repair call to
+    DECISION_REPAIR_MODEL; raises InvalidDecision if that fails too.
+    """
+    try:
+        decision = _load(raw)
+        _count("parsed")
+        return decision
+    except (ValueError, ValidationError) as e:
+        error = e
+    if repair and DECISION_REPAIR_MODEL:
+        try:
+            decision = _load(_repair(raw))
+            _count("repaired")
+            return decision
+        except Exception as e:
+            error = e
+    _count("invalid")
+    raise InvalidDecision(str(error))
+
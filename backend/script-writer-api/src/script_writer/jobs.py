@@ -0,0 +1,277 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ACTIVE_STATES = ("queued", "running")
+FINAL_STATES = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised from the progress hook to stop a run the client cancelled."""
+
+
+class JobLimitExceeded(Exception):
+    """The user already has the maximum number of queued or running jobs."""
+
+
+class JobStore:
+    """SQLite-backed job records, so queued work and results survive restarts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner TEXT
+                )
+            """)
+            if "owner" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_user_status ON jobs (user_id, status)")
+            # One row per live JobManager process, refreshed by its heartbeat
+            conn.execute("CREATE TABLE IF NOT EXISTS workers (owner TEXT PRIMARY KEY, seen_at REAL NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def insert(self, job_id, user_id, params, owner=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, user_id, status, params, created_at, updated_at, owner)"
+                " VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, user_id, json.dumps(params), now, now, owner),
+            )
+
+    def start(self, job_id, owner, progress) -> bool:
+        """Mark a queued job running if `owner` still holds it; False if someone else got there first."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', progress = ?, updated_at = ?"
+                " WHERE id = ? AND status = 'queued' AND owner = ?",
+                (json.dumps(progress), time.time(), job_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, owner, expired_before):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO workers (owner, seen_at) VALUES (?, ?)", (owner, time.time()))
+            conn.execute("DELETE FROM workers WHERE seen_at < ?", (expired_before,))
+
+    def claim_orphans(self, owner, expired_before):
+        """
+        Hand every queued or running job whose owner has no heartbeat since
+        `expired_before` to `owner`, requeued. The claim is a single UPDATE,
+        so concurrent claimers never share a job. Returns the ids `owner`
+        now holds in the queue, oldest first.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET owner = ?, status = 'queued', updated_at = ?"
+                " WHERE status IN ('queued', 'running')"
+                " AND (owner IS NULL OR owner NOT IN (SELECT owner FROM workers WHERE seen_at >= ?))",
+                (owner, time.time(), expired_before),
+            )
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE owner = ? AND status = 'queued' ORDER BY created_at", (owner,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def update(self, job_id, **fields):
+        for key in ("progress", "result"):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_for_user(self, user_id, limit=50):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count_active(self, user_id):
+        with self._connect() as conn:
+            (count,) = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')", (user_id,)
+            ).fetchone()
+        return count
+
+    def active_ids(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["progress"] = json.loads(job["progress"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+
+class JobManager:
+    """
+    Runs script generation jobs on a bounded worker pool.
+
+    `runner(**params, on_event=hook)` does the work; the hook records
+    per-iteration / per-task progress and raises `JobCancelled` at the
+    next task boundary once a cancel was requested. Each user may have at
+    most `max_per_user` jobs queued or running.
+
+    Several processes can share one store: every job is owned by the
+    manager that queued or adopted it, and each manager heartbeats while
+    it lives. Jobs whose owner misses heartbeats for `lease_s` are adopted
+    by exactly one surviving manager.
+    """
+
+    def __init__(self, store: JobStore, runner, max_workers: int = 4, max_per_user: int = 2,
+                 lease_s: float = 60):
+        self.store = store
+        self.runner = runner
+        self.max_per_user = max(int(max_per_user), 1)
+        self.lease_s = float(lease_s)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix="job")
+        self._submit_lock = threading.Lock()
+        self._queued = set()
+        self._closing = False
+        self._heartbeat = None
+
+    def submit(self, user_id, params):
+        with self._submit_lock:
+            if self.store.count_active(user_id) >= self.max_per_user:
+                raise JobLimitExceeded(f"User {user_id} already has {self.max_per_user} active jobs.")
+            job_id = uuid.uuid4().hex
+            self.store.insert(job_id, user_id, params, owner=self.owner)
+        self._enqueue(job_id)
+        return job_id
+
+    def _enqueue(self, job_id):
+        with self._submit_lock:
+            if job_id in self._queued:
+                return
+            self._queued.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def cancel(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINAL_STATES:
+            return job
+        if job["status"] == "queued":
+            self.store.update(job_id, status="cancelled", cancel_requested=1)
+        else:
+            self.store.update(job_id, cancel_requested=1)
+        return self.store.get(job_id)
+
+    def recover(self):
+        """
+        Adopt and requeue the jobs of processes that stopped (including this
+        one's previous run), then keep doing so from a heartbeat thread.
+        """
+        self._adopt()
+        if self._heartbeat is None and self.lease_s > 0:
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _adopt(self):
+        # Heartbeat first, so a concurrent claimer never mistakes this process for a dead one
+        expired_before = time.time() - self.lease_s
+        self.store.heartbeat(self.owner, expired_before)
+        if self._closing:
+            return
+        for job_id in self.store.claim_orphans(self.owner, expired_before):
+            self._enqueue(job_id)
+
+    def _heartbeat_loop(self):
+        # Keeps beating after shutdown() while running jobs finish, so nobody adopts them mid-run
+        while True:
+            time.sleep(self.lease_s / 3)
+            try:
+                self._adopt()
+            except sqlite3.Error:
+                pass  # Locked or busy; the next beat is well within the lease
+
+    def shutdown(self):
+        self._closing = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id):
+        try:
+            self._run_claimed(job_id)
+        finally:
+            with self._submit_lock:
+                self._queued.discard(job_id)
+
+    def _run_claimed(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job["status"] != "queued" or job["owner"] != self.owner:
+            return
+        if job["cancel_requested"]:
+            self.store.update(job_id, status="cancelled")
+            return
+
+        progress = {"iteration": 0, "tasks_completed": [], "events": []}
+        if not self.store.start(job_id, self.owner, progress):
+            return
+
+        def on_event(event):
+            if event["type"] == "iteration_start":
+                progress["iteration"] = event["iteration"]
+                progress["max_iterations"] = event.get("max_iterations")
+            elif event["type"] == "task_complete":
+                progress["tasks_completed"].append({"iteration": event["iteration"], "task": event["task"]})
+            summary = {k: v for k, v in event.items() if k != "output"}
+            progress["events"] = (progress["events"] + [summary])[-20:]
+            self.store.update(job_id, progress=progress)
+            if self.store.get(job_id)["cancel_requested"]:
+                raise JobCancelled(job_id)
+
+        try:
+            result = self.runner(**job["params"], on_event=on_event)
+        except JobCancelled:
+            self.store.update(job_id, status="cancelled")
+        except Exception as e:
+            self.store.update(job_id, status="failed", error=str(e))
+        else:
+            self.store.update(job_id, status="completed", result=result)
+
+
+def job_manager_from_env(runner):
+    return JobManager(
+        JobStore(os.getenv("JOBS_DB", "jobs.db")),
+        runner,
+        max_workers=int(os.getenv("JOB_WORKERS", "4")),
+        max_per_user=int(os.getenv("JOBS_PER_USER", "2")),
+        lease_s=float(os.getenv("JOB_LEASE_S", "60")),
+    )
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from crewai import LLM
+
+
+class ResponseCache:
+    """
+    Bounded LRU of LLM completions keyed by (task, rendered prompt, model).
+
+    Optionally mirrored to `cache_dir` as one JSON file per entry so demo
+    scripts stay warm across restarts.
+    """
+
+    def __init__(self, max_entries: int = 512, cache_dir: str = None):
+        self.max_entries = max(int(max_entries), 0)
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model: str, messages, task_name: str = "") -> str:
+        payload = json.dumps({"task": task_name, "model": model, "messages": messages}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(key), encoding="utf-8") as f:
+                    value = json.load(f)["response"]
+            except (OSError, ValueError, KeyError):
+                value = None
+            if value is not None:
+                self._remember(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value: str):
+        if self.max_entries == 0:
+            return
+        self._remember(key, value)
+        if self.cache_dir:
+            tmp_path = f"{self._disk_path(key)}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"response": value}, f)
+                os.replace(tmp_path, self._disk_path(key))
+            except OSError:
+                pass
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "512")),
+    cache_dir=os.getenv("LLM_CACHE_DIR") or None,
+)
+
+
+# Process-wide cap on LLM calls in flight, however many crews run concurrently
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+llm_slots = threading.BoundedSemaphore(max(LLM_MAX_CONCURRENCY, 1))
+
+
+class CachedLLM(LLM):
+    """
+    crewAI LLM that serves identical (task, prompt, model) calls from
+    `response_cache`; calls that do reach the provider wait for one of the
+    LLM_MAX_CONCURRENCY slots.
+    """
+
+    def call(self, messages, *args, **kwargs):
+        # Tool-calling turns depend on tool results, so only plain completions are cached
+        if kwargs.get("tools") or kwargs.get("available_functions"):
+            with llm_slots:
+                return super().call(messages, *args, **kwargs)
+
+        task = kwargs.get("from_task")
+        key = ResponseCache.make_key(self.model, messages, getattr(task, "name", None) or "")
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+        with llm_slots:
+            response = super().call(messages, *args, **kwargs)
+        if isinstance(response, str):
+            response_cache.put(key, response)
+        return response
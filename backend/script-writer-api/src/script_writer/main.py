@@ -2,7 +2,10 @@
 import warnings
 import json
 import os
-from script_writer.crew import ScriptWriter
+from script_writer.crew import rewrite_pool
+from script_writer.decisions import InvalidDecision
+from script_writer.patches import INCREMENTAL_REFINE, parse_edits, refine_script
+from script_writer.quality import review_draft
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
@@ -28,6 +31,11 @@ The tension is high, the situation extremely dangerous.
     target_genre = "Comedy"
     script_to_rewrite = initial_script
     
+    rewritten_script = ""
+    review_report = ""
+    edits = []
+    last_good_script = initial_script
+
     iteration = 0
     max_iterations = 3
 
@@ -35,26 +43,23 @@ The tension is high, the situation extremely dangerous.
         iteration += 1
         print(f"\n====================\n=== ITERATION {iteration} ===\n====================\n")
 
-        crew = ScriptWriter().crew()
-
-        inputs = {
-            "original_script": script_to_rewrite,
-            "genre": target_genre,
-        }
-
-        supervisor_results = crew.kickoff(inputs=inputs)
-
-        print("\n\n########################")
-        print(f"## Crew Execution for Iteration {iteration} Finished!")
-        print("########################\n")
-        print("Supervisor's decision for this iteration:")
-        print(supervisor_results.raw)
-        rewritten_script = crew.tasks[0].output.raw
-        review_report = crew.tasks[1].output.raw
-        
         try:
-            supervisor_data = json.loads(supervisor_results.raw)
-        except json.JSONDecodeError:
+            if edits:
+                # Only the scenes the supervisor targeted are sent back; patches are applied locally
+                rewritten_script, review_report, supervisor_data = refine_script(
+                    rewritten_script, edits, target_genre, iteration
+                )
+            else:
+                inputs = {
+                    "original_script": script_to_rewrite,
+                    "genre": target_genre,
+                }
+
+                with rewrite_pool.checkout() as crew:
+                    rewritten_script = crew.kickoff(inputs=inputs).raw
+                review_report, supervisor_data = review_draft(rewritten_script, initial_script, target_genre, iteration)
+            supervisor_raw = json.dumps(supervisor_data)
+        except InvalidDecision:
             print("\n⚠️ Supervisor output not valid JSON. Stopping loop.")
             with open(f"output/final_script_iter_{iteration}.md", "w", encoding="utf-8") as f:
                 f.write(rewritten_script)
@@ -62,6 +67,12 @@ The tension is high, the situation extremely dangerous.
                 f.write(review_report)
             break
 
+        print("\n\n########################")
+        print(f"## Crew Execution for Iteration {iteration} Finished!")
+        print("########################\n")
+        print("Supervisor's decision for this iteration:")
+        print(supervisor_raw)
+
         if supervisor_data.get("ready", False):
             print("\n🎬 Script is ready for production!")
             with open("output/final_script_approved.md", "w", encoding="utf-8") as f:
@@ -69,9 +80,15 @@ The tension is high, the situation extremely dangerous.
             with open("output/final_review_approved.md", "w", encoding="utf-8") as f:
                 f.write(review_report)
             break
+
+        edits = parse_edits(supervisor_data, rewritten_script) if INCREMENTAL_REFINE else []
+        if edits:
+            print(f"\n🔄 Script not ready. Patching {', '.join(e['target'] for e in edits)} next iteration.")
         else:
             rewrite_instructions = supervisor_data.get("rewrite_instructions", "")
-            script_to_rewrite = f"### PREVIOUS SCRIPT VERSION:\n{rewritten_script}\n\n### INSTRUCTIONS FOR NEXT REWRITE:\n{rewrite_instructions}"
+            if supervisor_data.get("gate") != "fail":
+                last_good_script = rewritten_script
+            script_to_rewrite = f"### PREVIOUS SCRIPT VERSION:\n{last_good_script}\n\n### INSTRUCTIONS FOR NEXT REWRITE:\n{rewrite_instructions}"
             print("\n🔄 Script not ready. Preparing for next iteration with new instructions.")
 
     print("\n✅ Iterative process complete. Check the 'output/' folder for all generated files.")
@@ -0,0 +1,170 @@
+import os
+import re
+
+from script_writer.crew import patch_pool, scene_review_pool
+from script_writer.decisions import extract_json, parse_decision
+from script_writer.scenes import scene_spans
+
+# Set to 0 to always resend the whole previous draft with the supervisor's instructions
+INCREMENTAL_REFINE = os.getenv("INCREMENTAL_REFINE", "1") == "1"
+
+TARGET = re.compile(r"^\s*(?:SCENE\s+(\d+)|LINES?\s+(\d+)\s*[-–]\s*(\d+))\s*$", re.I)
+
+
+def format_target(start_line=None, end_line=None, scene=None) -> str:
+    if scene is not None:
+        return f"SCENE {int(scene)}"
+    return f"LINES {int(start_line)}-{int(end_line)}"
+
+
+def _line_spans(text):
+    spans, pos = [], 0
+    for line in text.splitlines(keepends=True):
+        spans.append((pos, pos + len(line)))
+        pos += len(line)
+    return spans
+
+
+def resolve_target(text: str, target: str):
+    """
+    Character range (start, end) of a "SCENE <n>" or "LINES <a>-<b>" target
+    in `text` (1-based, inclusive), or None if it doesn't exist.
+    """
+    m = TARGET.match(target or "")
+    if not m:
+        return None
+    if m.group(1):
+        spans = scene_spans(text)
+        index = int(m.group(1)) - 1
+        return spans[index] if 0 <= index < len(spans) else None
+    lines = _line_spans(text)
+    first, last = int(m.group(2)), int(m.group(3))
+    if not lines or first < 1 or last < first or first > len(lines):
+        return None
+    return lines[first - 1][0], lines[min(last, len(lines)) - 1][1]
+
+
+def parse_edits(decision: dict, text: str) -> list:
+    """
+    Normalize a supervisor decision into [{"target", "instruction"}] entries that resolve in `text`.
+
+    Accepts `"edits": [{"target": "SCENE 2", "instruction": ...}]` as well as
+    `{"scene": 2}`, `{"lines": "4-9"}` or `{"start_line": 4, "end_line": 9}`
+    entries and the per-scene `"scenes": [{"scene": 2, "rewrite_instructions": ...}]` shape.
+    """
+    entries = list(decision.get("edits") or []) + list(decision.get("scenes") or [])
+    edits, seen = [], set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            if entry.get("target"):
+                target = str(entry["target"]).strip().upper()
+            elif entry.get("scene") is not None:
+                target = format_target(scene=entry["scene"])
+            elif entry.get("lines"):
+                target = format_target(*[int(n) for n in str(entry["lines"]).replace("–", "-").split("-", 1)])
+            elif entry.get("start_line") is not None:
+                target = format_target(start_line=entry["start_line"], end_line=entry.get("end_line", entry["start_line"]))
+            else:
+                continue
+        except (TypeError, ValueError):
+            continue
+        if target in seen or resolve_target(text, target) is None:
+            continue
+        seen.add(target)
+        instruction = entry.get("instruction") or entry.get("rewrite_instructions") or ""
+        edits.append({"target": target, "instruction": instruction})
+    return edits
+
+
+def render_excerpts(text: str, edits: list) -> str:
+    """Only the targeted parts of the script, each under a "### <TARGET>" marker with its instructions."""
+    blocks = []
+    for edit in edits:
+        start, end = resolve_target(text, edit["target"])
+        block = f"### {edit['target']}\n"
+        if edit.get("instruction"):
+            block += f"INSTRUCTIONS: {edit['instruction']}\n"
+        block += f"CURRENT TEXT:\n{text[start:end].strip()}"
+        blocks.append(block)
+    return "\n\n".join(blocks)
+
+
+def apply_patches(text: str, patches: list) -> tuple:
+    """
+    Replace each patch's target range with its text, resolved against the
+    unpatched `text` and applied back to front so offsets stay valid.
+    Overlapping or unresolvable patches are skipped.
+    Returns (new_text, applied_targets).
+    """
+    resolved = []
+    for patch in patches:
+        if not isinstance(patch, dict) or not isinstance(patch.get("text"), str):
+            continue
+        target = str(patch.get("target", "")).strip().upper()
+        span = resolve_target(text, target)
+        if span is not None:
+            resolved.append((span, target, patch["text"]))
+
+    resolved.sort(key=lambda item: item[0][0])
+    kept, last_end = [], -1
+    for span, target, replacement in resolved:
+        if span[0] < last_end:
+            continue
+        kept.append((span, target, replacement))
+        last_end = span[1]
+
+    for (start, end), _, replacement in reversed(kept):
+        original = text[start:end]
+        # Keep the blank-line layout around the excerpt
+        trailing = original[len(original.rstrip()):]
+        text = text[:start] + replacement.strip() + trailing + text[end:]
+    return text, [target for _, target, _ in kept]
+
+
+def changed_targets(new_text: str, applied: list) -> list:
+    """Targets to re-review after patching: scenes keep their numbers, line ranges don't."""
+    targets = []
+    for target in applied:
+        if target.startswith("SCENE") and resolve_target(new_text, target) is not None:
+            targets.append(target)
+    if len(targets) < len(applied):
+        # Line-number targets shifted; re-review the whole (usually short) script by lines
+        targets = [format_target(start_line=1, end_line=max(len(new_text.splitlines()), 1))]
+    return targets
+
+
+def refine_script(script: str, edits: list, genre: str, iteration: int, emit=None):
+    """
+    One incremental iteration: the transformer only sees the targeted
+    excerpts and returns replacement text for each, which is spliced into the
+    script locally; then only the changed parts are reviewed.
+    Returns (script, review, decision). Raises InvalidDecision if the
+    supervisor output can't be parsed, even after the repair retry.
+    """
+    emit = emit or (lambda event: None)
+    with patch_pool.checkout() as crew:
+        result = crew.kickoff(inputs={"genre": genre, "excerpts": render_excerpts(script, edits)})
+    try:
+        patches = extract_json(result.raw).get("patches", [])
+    except ValueError:
+        patches = []
+
+    patched, applied = apply_patches(script, patches)
+    emit({"type": "task_complete", "iteration": iteration, "task": "patch_task",
+          "targets": applied, "output": result.raw})
+    if not applied:
+        # Nothing usable came back; the caller falls back to a full rewrite with these instructions
+        return script, "", {"ready": False, "rewrite_instructions": "; ".join(e["instruction"] for e in edits)}
+
+    targets = changed_targets(patched, applied)
+    scene_batch = "\n\n".join(
+        f"### {target}\n{patched[slice(*resolve_target(patched, target))].strip()}" for target in targets
+    )
+    with scene_review_pool.checkout() as crew:
+        decision = crew.kickoff(inputs={"genre": genre, "scene_batch": scene_batch})
+        review = crew.tasks[0].output.raw
+    emit({"type": "task_complete", "iteration": iteration, "task": "scene_review_task",
+          "targets": targets, "output": review})
+    return patched, review, parse_decision(decision.raw)
@@ -0,0 +1,275 @@
+import hashlib
+import multiprocessing
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(UPLOAD_DIR, "text_cache"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Below this many pages, process start-up costs more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+PREVIEW_CHARS = 1500
+# Stored uploads and cached text older than this, or beyond this many bytes (oldest first), are removed
+UPLOAD_MAX_AGE_S = float(os.getenv("UPLOAD_MAX_AGE_S", str(24 * 3600)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+UPLOAD_GC_INTERVAL_S = float(os.getenv("UPLOAD_GC_INTERVAL_S", "600"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_gc_stop = threading.Event()
+_gc_thread = None
+
+
+# -------------------------------
+# Upload
+# -------------------------------
+def _open_spool():
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, suffix=".part", delete=False)
+
+
+def _finish_spool(tmp_path, digest):
+    """Content-addressed name: identical uploads share a file and never clobber each other."""
+    path = os.path.join(UPLOAD_DIR, f"{digest}.pdf")
+    os.replace(tmp_path, path)
+    return path, digest
+
+
+def save_pdf_upload(upload) -> tuple:
+    """Stream an UploadFile to disk in chunks. Returns (path, sha256 hex)."""
+    sha = hashlib.sha256()
+    with _open_spool() as out:
+        while chunk := upload.file.read(UPLOAD_CHUNK_SIZE):
+            sha.update(chunk)
+            out.write(chunk)
+    return _finish_spool(out.name, sha.hexdigest())
+
+
+async def save_pdf_upload_async(upload) -> tuple:
+    sha = hashlib.sha256()
+    with _open_spool() as out:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            sha.update(chunk)
+            out.write(chunk)
+    return _finish_spool(out.name, sha.hexdigest())
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+# -------------------------------
+# Layout-preserving page text
+# -------------------------------
+def page_text(page) -> str:
+    """
+    Text of one page with screenplay layout kept: one paragraph per block and
+    each line indented by its horizontal offset from the page's left margin,
+    so character cues, parentheticals and dialogue stay distinguishable.
+    """
+    lines = []
+    for block in page.get_text("dict", sort=True)["blocks"]:
+        if block.get("type") != 0:
+            continue
+        block_lines = []
+        for line in block["lines"]:
+            text = "".join(span["text"] for span in line["spans"]).rstrip()
+            if text.strip():
+                block_lines.append((line["bbox"][0], line["bbox"][2], text))
+        if block_lines:
+            lines.append(block_lines)
+    if not lines:
+        return ""
+
+    flat = [entry for block in lines for entry in block]
+    left = min(x0 for x0, _, _ in flat)
+    # Screenplays are monospaced; the median glyph width turns points into columns
+    widths = [(x1 - x0) / len(text) for x0, x1, text in flat if len(text) > 3]
+    char_width = (statistics.median(widths) if widths else 0) or 7.2
+
+    paragraphs = []
+    for block in lines:
+        paragraphs.append("\n".join(
+            " " * round((x0 - left) / char_width) + text.strip() for x0, _, text in block
+        ))
+    return "\n\n".join(paragraphs)
+
+
+def _extract_pages(path, start, stop):
+    """Worker entry point: text of pages [start, stop)."""
+    with fitz.open(path) as doc:
+        return [page_text(doc[i]) for i in range(start, stop)]
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a process that already runs threads (uvicorn, crews, the job pool) can copy held locks
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=max(PDF_WORKERS, 1), mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+# -------------------------------
+# Cache
+# -------------------------------
+def _cache_path(digest):
+    return os.path.join(PDF_CACHE_DIR, f"{digest}.txt")
+
+
+def _cache_get(digest):
+    try:
+        with open(_cache_path(digest), encoding="utf-8") as f:
+            text = f.read()
+        os.utime(_cache_path(digest))  # Recently used entries are the last to be collected
+        return text
+    except OSError:
+        return None
+
+
+def _cache_put(digest, text):
+    try:
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        tmp = f"{_cache_path(digest)}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, _cache_path(digest))
+    except OSError:
+        pass  # The cache is an optimization only
+
+
+# -------------------------------
+# Collection
+# -------------------------------
+def collect_uploads(keep=(), max_age_s: float = UPLOAD_MAX_AGE_S, max_bytes: int = UPLOAD_MAX_BYTES) -> int:
+    """
+    Remove stored uploads and cached text older than `max_age_s`, then the
+    oldest of the rest until they fit in `max_bytes`. Paths in `keep` (PDFs
+    that queued jobs still need) are never removed, and unfinished ".part"
+    spools only by age. Returns the bytes freed.
+    """
+    keep = {os.path.abspath(path) for path in keep if path}
+    entries = []
+    for root in (UPLOAD_DIR, PDF_CACHE_DIR):
+        try:
+            listing = list(os.scandir(root))
+        except OSError:
+            continue
+        for entry in listing:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - max_age_s
+    freed = 0
+    for mtime, size, path in entries:
+        expired = mtime < cutoff
+        if not expired and total <= max_bytes:
+            break
+        if os.path.abspath(path) in keep or (path.endswith(".part") and not expired):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        freed += size
+    return freed
+
+
+def start_upload_gc(keep=lambda: ()):
+    """Run `collect_uploads` every UPLOAD_GC_INTERVAL_S; `keep()` returns the paths to spare."""
+    global _gc_thread
+    if _gc_thread is not None or UPLOAD_GC_INTERVAL_S <= 0:
+        return
+
+    def loop():
+        while not _gc_stop.wait(UPLOAD_GC_INTERVAL_S):
+            try:
+                collect_uploads(keep())
+            except Exception:
+                pass  # Try again on the next pass
+
+    _gc_stop.clear()
+    _gc_thread = threading.Thread(target=loop, name="upload-gc", daemon=True)
+    _gc_thread.start()
+
+
+def stop_upload_gc():
+    global _gc_thread
+    _gc_stop.set()
+    if _gc_thread is not None:
+        _gc_thread.join(timeout=5)
+        _gc_thread = None
+
+
+# -------------------------------
+# Extraction
+# -------------------------------
+def extract_pdf_text(path: str, digest: str = None, max_chars: int = None) -> str:
+    """
+    Layout-preserving text of a PDF, cached by content hash.
+
+    With `max_chars`, pages are read in order only until that many characters
+    are available (the result is cut to `max_chars`).
+    Otherwise page ranges are extracted in parallel across a process pool and
+    joined in page order.
+    """
+    digest = digest or file_digest(path)
+    cached = _cache_get(digest)
+    if cached is not None:
+        return cached[:max_chars] if max_chars else cached
+
+    with fitz.open(path) as doc:
+        page_count = doc.page_count
+        if max_chars or page_count < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS <= 1:
+            pages, size = [], 0
+            for page in doc:
+                pages.append(page_text(page))
+                size += len(pages[-1]) + 2
+                if max_chars and size >= max_chars:
+                    break
+            text = "\n\n".join(p for p in pages if p).strip()
+            if len(pages) == page_count:
+                _cache_put(digest, text)
+            return text[:max_chars] if max_chars else text
+
+    pool = _get_pool()
+    chunk = -(-page_count // (PDF_WORKERS * 2))
+    ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+    pages = []
+    for result in pool.map(_extract_pages, [path] * len(ranges), *zip(*ranges)):
+        pages.extend(result)
+    text = "\n\n".join(p for p in pages if p).strip()
+    _cache_put(digest, text)
+    return text
+
+
+def preview(text: str) -> str:
+    return text[:PREVIEW_CHARS] + "..." if len(text) > PREVIEW_CHARS else text
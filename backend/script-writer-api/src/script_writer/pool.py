@@ -0,0 +1,36 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class CrewPool:
+    """
+    Reuses fully built crews across runs instead of rebuilding them per iteration.
+
+    A crew keeps per-run state on its tasks (outputs, interpolated prompts),
+    so each one is handed to a single caller at a time. Idle crews are
+    kept up to `max_idle`; concurrent callers beyond that get a fresh crew
+    that is dropped when they are done.
+    """
+
+    def __init__(self, factory, max_idle: int = 8):
+        self._factory = factory
+        self._idle = queue.LifoQueue(maxsize=max(int(max_idle), 1))
+        self._lock = threading.Lock()
+        self.created = 0
+
+    @contextmanager
+    def checkout(self):
+        try:
+            crew = self._idle.get_nowait()
+        except queue.Empty:
+            crew = self._factory()
+            with self._lock:
+                self.created += 1
+        try:
+            yield crew
+        finally:
+            try:
+                self._idle.put_nowait(crew)
+            except queue.Full:
+                pass
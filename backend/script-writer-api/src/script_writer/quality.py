@@ -0,0 +1,260 @@
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+
+from script_writer.crew import draft_review_pool
+from script_writer.decisions import parse_decision
+from script_writer.scenes import SCENE_HEADING
+from script_writer.streaming import task_sink
+
+# off: always ask the LLM reviewers; fail_only: only short-circuit clear failures; on: also skip them on clear passes
+QUALITY_GATE = os.getenv("QUALITY_GATE", "fail_only")
+GATE_PASS_LEXICON = float(os.getenv("GATE_PASS_LEXICON", "0.5"))
+GATE_FAIL_LEXICON = float(os.getenv("GATE_FAIL_LEXICON", "0.1"))
+# Soft signals (an unpunctuated ending, thin genre vocabulary) only fail a draft when this many agree
+GATE_FAIL_SIGNALS = int(os.getenv("GATE_FAIL_SIGNALS", "2"))
+# A rewrite shorter than this fraction of its input is treated as cut off
+GATE_MIN_LENGTH_RATIO = float(os.getenv("GATE_MIN_LENGTH_RATIO", "0.4"))
+
+CHARACTER_CUE = re.compile(r"^[ \t]*([A-Z][A-Z0-9 .'\-]{0,33}[A-Z0-9.])(?:[ \t]*\([^)]*\))*[ \t]*$")
+# All-caps lines that are layout, not speakers
+NOT_A_CUE = re.compile(
+    r"^(?:TITLE(?: PAGE| CARD)?|CONTINUED|MORE|INTERCUT\b.*|MONTAGE\b.*|SERIES OF SHOTS\b.*|BACK TO\b.*"
+    r"|SUPER\b.*|END\b.*|ACT [A-Z0-9]+|TEASER|PROLOGUE|EPILOGUE|FLASHBACK\b.*|BEGIN\b.*)$"
+)
+TRANSITION = re.compile(r"(?:\bTO:|FADE (?:IN|OUT)|CUT TO BLACK|THE END|DISSOLVE|SMASH CUT)", re.I)
+TERMINAL = tuple('.!?"\')]…—*')
+
+# Words whose presence marks a genre's tone; matched as whole words, with their plain inflections
+GENRE_LEXICONS = {
+    "comedy": ["laugh", "joke", "grin", "absurd", "awkward", "prank", "giggle", "snort", "ridiculous", "silly",
+               "pratfall", "deadpan", "chuckle", "hilarious", "oops", "banter", "sarcastic", "embarrass"],
+    "horror": ["scream", "blood", "shadow", "dark", "creak", "whisper", "dread", "corpse", "terror", "flicker",
+               "fog", "curse", "monster", "haunt", "shriek", "tremble", "grotesque", "eerie"],
+    "thriller": ["gun", "chase", "clock", "threat", "betray", "escape", "tension", "trap", "hostage", "sweat",
+                 "evidence", "suspect", "countdown", "danger", "ambush", "secret", "panic", "deadline"],
+    "romance": ["kiss", "heart", "love", "blush", "gaze", "touch", "longing", "tender", "embrace", "smile",
+                "date", "flirt", "passion", "darling", "hold", "warm", "yearn", "sweetheart"],
+    "drama": ["silence", "tear", "regret", "memory", "grief", "forgive", "family", "truth", "sacrifice", "pain",
+              "hope", "loss", "choice", "confess", "quiet", "broken", "promise", "burden"],
+    "action": ["explode", "punch", "kick", "sprint", "crash", "gunfire", "dodge", "slam", "chase", "leap",
+               "debris", "fight", "blast", "weapon", "engine", "adrenaline", "smash", "roar"],
+    "sci-fi": ["ship", "laser", "android", "galaxy", "hologram", "quantum", "alien", "orbit", "signal", "colony",
+               "reactor", "cyborg", "planet", "console", "drone", "warp", "protocol", "synthetic"],
+    "fantasy": ["magic", "spell", "sword", "dragon", "kingdom", "prophecy", "rune", "enchant", "quest", "wizard",
+                "realm", "ancient", "elf", "potion", "crown", "oath", "beast", "sorcerer"],
+    "mystery": ["clue", "detective", "alibi", "suspect", "motive", "evidence", "witness", "secret", "riddle",
+                "footprint", "victim", "interrogate", "missing", "lie", "reveal", "investigate", "murder", "puzzle"],
+    "western": ["saloon", "horse", "sheriff", "dust", "revolver", "outlaw", "frontier", "cattle", "spur", "ranch",
+                "stagecoach", "desert", "bounty", "draw", "whiskey", "posse", "canyon", "holster"],
+    "noir": ["rain", "smoke", "cigarette", "neon", "dame", "detective", "shadow", "bourbon", "alley", "double-cross",
+             "fedora", "cop", "murder", "night", "city", "trenchcoat", "gun", "corrupt"],
+}
+GENRE_ALIASES = {"science fiction": "sci-fi", "scifi": "sci-fi", "sci fi": "sci-fi", "romantic": "romance",
+                 "film noir": "noir", "funny": "comedy", "scary": "horror"}
+
+
+def _inflections(word: str) -> set:
+    forms = {word, word + "s", word + "es", word + "ed", word + "ing", word + "ly"}
+    if word.endswith("e"):
+        forms |= {word + "d", word[:-1] + "ing", word[:-1] + "y"}
+    if word.endswith("ie"):
+        forms.add(word[:-2] + "ying")
+    if word.endswith("y"):
+        forms |= {word[:-1] + "ies", word[:-1] + "ied", word[:-1] + "ily"}
+    return forms
+
+
+_LEXICON_FORMS = {
+    genre: [_inflections(word) for word in words] for genre, words in GENRE_LEXICONS.items()
+}
+
+
+@dataclass
+class StructureReport:
+    scene_headings: int
+    character_cues: int
+    dialogue_blocks: int
+    characters: int
+
+
+@dataclass
+class GateResult:
+    verdict: str  # "pass", "fail" or "uncertain"
+    reasons: list = field(default_factory=list)
+    metrics: dict = field(default_factory=dict)
+
+    def review_text(self) -> str:
+        lines = [f"Automated quality check: {self.verdict.upper()}"]
+        lines += [f"- {reason}" for reason in self.reasons]
+        return "\n".join(lines)
+
+    def rewrite_instructions(self) -> str:
+        return " ".join(self.reasons)
+
+
+def check_structure(text: str) -> StructureReport:
+    """Scene headings, character cues and dialogue blocks (a cue followed directly by a spoken line)."""
+    lines = text.splitlines()
+    cues, blocks, names = 0, 0, set()
+    for i, line in enumerate(lines):
+        if SCENE_HEADING.match(line) or TRANSITION.search(line):
+            continue
+        match = CHARACTER_CUE.match(line)
+        if not match or not any(c.isalpha() for c in match.group(1)) or NOT_A_CUE.match(match.group(1).strip()):
+            continue
+        # A cue is directly followed by its dialogue or a parenthetical; a lone caps line is something else
+        following = lines[i + 1].strip() if i + 1 < len(lines) else ""
+        if not following or SCENE_HEADING.match(lines[i + 1]):
+            continue
+        cues += 1
+        names.add(match.group(1).strip())
+        if not CHARACTER_CUE.match(lines[i + 1]):
+            blocks += 1
+    return StructureReport(
+        scene_headings=len(SCENE_HEADING.findall(text)),
+        character_cues=cues,
+        dialogue_blocks=blocks,
+        characters=len(names),
+    )
+
+
+def looks_truncated(text: str, source: str = "") -> str:
+    """Why the rewrite is clearly cut off, or "" if it isn't."""
+    stripped = text.rstrip()
+    if not stripped:
+        return "The rewrite is empty."
+    last_line = stripped.splitlines()[-1].strip()
+    if last_line.count("(") > last_line.count(")"):
+        return "The rewrite ends inside an unclosed parenthetical."
+    if len(source) >= 500 and len(stripped) < GATE_MIN_LENGTH_RATIO * len(source.strip()):
+        return f"The rewrite is under {int(GATE_MIN_LENGTH_RATIO * 100)}% of the original length."
+    return ""
+
+
+def ends_mid_sentence(text: str) -> bool:
+    """
+    Whether the last line reads like prose that stopped without punctuation.
+    Scene headings, transitions, parentheticals and all-caps lines (character
+    cues, THE END) end without punctuation in any case.
+    """
+    stripped = text.rstrip()
+    if not stripped:
+        return False
+    last_line = stripped.splitlines()[-1].strip()
+    if last_line.endswith(TERMINAL) or last_line == last_line.upper():
+        return False
+    if SCENE_HEADING.match(last_line) or TRANSITION.search(last_line):
+        return False
+    return not (last_line.startswith("(") and last_line.endswith(")"))
+
+
+def lexicon_coverage(text: str, genre: str, source: str = ""):
+    """
+    Share of the genre's marker words that appear in `text` but not in
+    `source` (0-1), or None for genres without a lexicon. Without a source
+    this is plain coverage of `text`.
+    """
+    key = genre.strip().lower()
+    markers = _LEXICON_FORMS.get(GENRE_ALIASES.get(key, key))
+    if not markers:
+        return None
+    words = set(re.findall(r"[a-z][a-z\-']*", text.lower()))
+    source_words = set(re.findall(r"[a-z][a-z\-']*", source.lower()))
+    hits = sum(bool(forms & words) and not forms & source_words for forms in markers)
+    # Nobody uses every marker; hitting half of them counts as full coverage
+    return round(min(hits / (len(markers) / 2), 1.0), 3)
+
+
+def quality_gate(rewrite: str, source: str, genre: str) -> GateResult:
+    """
+    Deterministic pre-check of a rewrite against its input.
+
+    "fail" when the rewrite is clearly cut off or lost its scene headings
+    or dialogue, or when GATE_FAIL_SIGNALS soft signals agree (it seems to
+    stop mid-sentence, it barely uses the genre's vocabulary); "pass" when
+    structure survived, no soft signal fired and the genre markers it added
+    over the source reach GATE_PASS_LEXICON; "uncertain" otherwise, which
+    leaves the decision to the LLM reviewers.
+    """
+    before, after = check_structure(source), check_structure(rewrite)
+    coverage = lexicon_coverage(rewrite, genre)
+    # Markers the source already had don't show that the rewrite moved toward the genre
+    gained = lexicon_coverage(rewrite, genre, source)
+    metrics = {
+        "scene_headings": after.scene_headings,
+        "character_cues": after.character_cues,
+        "dialogue_blocks": after.dialogue_blocks,
+        "source_dialogue_blocks": before.dialogue_blocks,
+        "lexicon_coverage": coverage,
+        "lexicon_gained": gained,
+        "length_ratio": round(len(rewrite.strip()) / max(len(source.strip()), 1), 3),
+    }
+
+    failures, doubts = [], []
+    truncated = looks_truncated(rewrite, source)
+    if truncated:
+        failures.append(f"{truncated} Deliver the complete script through its final scene.")
+    if before.scene_headings and not after.scene_headings:
+        failures.append("Scene headings (INT./EXT.) are missing; keep standard screenplay scene headings.")
+    if before.dialogue_blocks and not after.dialogue_blocks:
+        failures.append("Dialogue is missing; keep character cues followed by their lines.")
+    if ends_mid_sentence(rewrite):
+        doubts.append("The rewrite may stop mid-sentence; deliver the complete script through its final scene.")
+    if coverage is not None and coverage < GATE_FAIL_LEXICON:
+        doubts.append(f"The {genre} tone barely comes through; lean into the genre's conventions and vocabulary.")
+    if failures or len(doubts) >= GATE_FAIL_SIGNALS:
+        return GateResult("fail", failures + doubts, metrics)
+    if doubts:
+        return GateResult("uncertain", doubts, metrics)
+
+    structure_kept = (
+        after.scene_headings >= min(before.scene_headings, 1)
+        and after.dialogue_blocks >= before.dialogue_blocks * 0.5
+    )
+    if structure_kept and gained is not None and gained >= GATE_PASS_LEXICON:
+        return GateResult("pass", [
+            f"Structure kept ({after.scene_headings} scene headings, {after.dialogue_blocks} dialogue blocks).",
+            f"Genre lexicon coverage gained over the original {gained:.0%}.",
+        ], metrics)
+    return GateResult("uncertain", [], metrics)
+
+
+_verdicts = {"pass": 0, "fail": 0, "uncertain": 0}
+_verdicts_lock = threading.Lock()
+
+
+def gate_stats() -> dict:
+    with _verdicts_lock:
+        return dict(_verdicts)
+
+
+def review_draft(rewritten: str, source: str, genre: str, iteration: int, emit=None):
+    """
+    Review a full rewrite. The local quality gate runs first: a clear fail
+    comes back with its own rewrite instructions and a clear pass (with
+    QUALITY_GATE=on) is approved, both without any LLM call; only uncertain
+    drafts go to the reviewer and supervisor. Returns (review, decision).
+    """
+    emit = emit or (lambda event: None)
+    gate = quality_gate(rewritten, source, genre) if QUALITY_GATE != "off" else None
+    if gate is not None:
+        with _verdicts_lock:
+            _verdicts[gate.verdict] += 1
+        emit({"type": "quality_gate", "iteration": iteration, "verdict": gate.verdict,
+              "reasons": gate.reasons, "metrics": gate.metrics})
+        if gate.verdict == "fail":
+            return gate.review_text(), {"ready": False, "rewrite_instructions": gate.rewrite_instructions(),
+                                        "edits": [], "scenes": [], "gate": "fail"}
+        if gate.verdict == "pass" and QUALITY_GATE == "on":
+            return gate.review_text(), {"ready": True, "rewrite_instructions": "",
+                                        "edits": [], "scenes": [], "gate": "pass"}
+
+    def task_done(output):
+        emit({"type": "task_complete", "iteration": iteration, "task": output.name, "output": output.raw})
+
+    with draft_review_pool.checkout() as crew, task_sink(task_done):
+        result = crew.kickoff(inputs={"genre": genre, "rewritten_script": rewritten})
+        review = crew.tasks[0].output.raw
+    return review, parse_decision(result.raw)
@@ -0,0 +1,159 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from script_writer.crew import scene_review_pool, scene_rewrite_pool
+from script_writer.decisions import InvalidDecision, parse_decision
+
+# Scene headings: "INT. KITCHEN - DAY", "EXT. ROOF – NIGHT", "INT./EXT. CAR", "I/E. HALLWAY",
+# optionally preceded by a scene number ("12 INT. ...")
+SCENE_HEADING = re.compile(r"^[ \t]*(?:\d+[A-Z]?\.?[ \t]+)?(?:INT\.?/EXT\.?|EXT\.?/INT\.?|I/E\.?|INT\.|EXT\.)", re.M)
+
+LONG_SCRIPT_CHARS = int(os.getenv("LONG_SCRIPT_CHARS", "12000"))
+SCENE_PARALLELISM = int(os.getenv("SCENE_PARALLELISM", "4"))
+SCENE_REVIEW_BATCH_CHARS = int(os.getenv("SCENE_REVIEW_BATCH_CHARS", "8000"))
+
+
+def scene_spans(text: str) -> list:
+    """
+    (start, end) character ranges of each scene, split on INT./EXT. scene headings.
+    Anything before the first heading (title page, cold open) stays attached to the first scene.
+    """
+    starts = [m.start() for m in SCENE_HEADING.finditer(text)]
+    if not starts:
+        return [(0, len(text))] if text.strip() else []
+    starts[0] = 0
+    bounds = starts + [len(text)]
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if text[a:b].strip()]
+
+
+def split_scenes(text: str) -> list:
+    """Split a screenplay into scenes, keeping each heading with its scene."""
+    return [text[a:b].strip() for a, b in scene_spans(text)]
+
+
+def join_scenes(scenes: list) -> str:
+    return "\n\n".join(scene.strip() for scene in scenes)
+
+
+def batch_scenes(indices: list, scenes: list, max_chars: int = SCENE_REVIEW_BATCH_CHARS) -> list:
+    """Group scene indices (in order) into batches of roughly `max_chars` for review."""
+    batches, current, size = [], [], 0
+    for i in indices:
+        length = len(scenes[i])
+        if current and size + length > max_chars:
+            batches.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += length
+    if current:
+        batches.append(current)
+    return batches
+
+
+def should_split(text: str) -> bool:
+    return len(text) > LONG_SCRIPT_CHARS and len(split_scenes(text)) > 1
+
+
+def _rewrite_scene(scene, number, count, genre, instructions):
+    inputs = {
+        "original_script": scene,
+        "genre": genre,
+        "scene_number": number,
+        "scene_count": count,
+        "scene_instructions": f"Apply these notes from the previous review: {instructions}" if instructions else "",
+    }
+    with scene_rewrite_pool.checkout() as crew:
+        return crew.kickoff(inputs=inputs).raw
+
+
+def _review_batch(batch, scenes, genre):
+    """
+    Returns (review text, {scene index: instructions}) for the scenes flagged
+    in this batch. Raises InvalidDecision if the supervisor's output can't be read.
+    """
+    scene_batch = "\n\n".join(f"### SCENE {i + 1}\n{scenes[i]}" for i in batch)
+    with scene_review_pool.checkout() as crew:
+        decision = crew.kickoff(inputs={"genre": genre, "scene_batch": scene_batch})
+        review = crew.tasks[0].output.raw
+    flagged = {}
+    for entry in parse_decision(decision.raw).get("scenes", []) or []:
+        try:
+            index = int(entry.get("scene")) - 1
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if index in batch:
+            flagged[index] = entry.get("rewrite_instructions", "")
+    return review, flagged
+
+
+def run_scene_generation(original_script: str, genre: str, max_iterations: int = 2, emit=None):
+    """
+    Rewrite a long screenplay scene by scene.
+
+    Scenes are rewritten concurrently (at most SCENE_PARALLELISM crews at
+    once), reviewed in batches, and reassembled in their original order.
+    Later iterations only rewrite the scenes the supervisor flagged, with
+    that scene's instructions. Returns (script, review, final_output).
+    """
+    emit = emit or (lambda event: None)
+    scenes = split_scenes(original_script)
+    count = len(scenes)
+    current = list(scenes)
+    pending = {i: "" for i in range(count)}
+    reviews = [""] * count
+    final_output = {}
+    iteration = 0
+
+    pool = ThreadPoolExecutor(max_workers=max(SCENE_PARALLELISM, 1), thread_name_prefix="scene")
+    try:
+        while iteration < max_iterations:
+            iteration += 1
+            emit({"type": "iteration_start", "iteration": iteration, "max_iterations": max_iterations,
+                  "scenes": sorted(i + 1 for i in pending)})
+
+            order = sorted(pending)
+            # Later iterations revise the previous rewrite of each flagged scene, not the original
+            futures = {i: pool.submit(_rewrite_scene, current[i], i + 1, count, genre, pending[i]) for i in order}
+            for i in order:
+                current[i] = futures[i].result()
+                emit({"type": "task_complete", "iteration": iteration, "task": "scene_rewrite_task",
+                      "scene": i + 1, "output": current[i]})
+
+            batches = batch_scenes(order, current)
+            flagged = {}
+            try:
+                for batch, (review, batch_flags) in zip(batches, pool.map(lambda b: _review_batch(b, current, genre), batches)):
+                    for i in batch:
+                        reviews[i] = review
+                    flagged.update(batch_flags)
+                    emit({"type": "task_complete", "iteration": iteration, "task": "scene_review_task",
+                          "scenes": [i + 1 for i in batch], "output": review})
+            except InvalidDecision:
+                # Unreadable output is not an approval; stop like the single-prompt path does
+                final_output = {"iteration": iteration, "ready": False,
+                                "message": "Supervisor output invalid JSON, stopped early."}
+                break
+
+            emit({
+                "type": "decision",
+                "iteration": iteration,
+                "ready": not flagged,
+                "rewrite_instructions": {str(i + 1): text for i, text in flagged.items()},
+            })
+            if not flagged:
+                final_output = {"iteration": iteration, "ready": True, "message": "All scenes approved by supervisor."}
+                break
+            pending = flagged
+    except BaseException:
+        # A cancelled run (emit raised) shouldn't wait for rewrites nobody will read
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    if not final_output:
+        final_output = {"iteration": iteration, "ready": False, "message": "Max iterations reached without approval."}
+    final_output["scene_count"] = count
+
+    review_text = "\n\n".join(dict.fromkeys(r for r in reviews if r))
+    return join_scenes(current), review_text, final_output
@@ -0,0 +1,64 @@
+import threading
+from contextlib import contextmanager
+
+# crewAI moved its event bus between releases; token streaming is optional either way
+try:
+    from crewai.events import crewai_event_bus
+    from crewai.events.types.llm_events import LLMStreamChunkEvent
+except ImportError:
+    try:
+        from crewai.utilities.events import crewai_event_bus
+        from crewai.utilities.events.llm_events import LLMStreamChunkEvent
+    except ImportError:
+        crewai_event_bus = LLMStreamChunkEvent = None
+
+STREAMING_SUPPORTED = crewai_event_bus is not None
+
+_local = threading.local()
+
+
+@contextmanager
+def token_sink(callback):
+    """
+    Route LLM stream chunks emitted on this thread to `callback(text, task_name)`.
+
+    The event bus is process-wide, so the sink is thread-local: concurrent
+    runs each see only the tokens of the crew they are executing.
+    """
+    previous = getattr(_local, "sink", None)
+    _local.sink = callback
+    try:
+        yield
+    finally:
+        _local.sink = previous
+
+
+if STREAMING_SUPPORTED:
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def _forward_chunk(source, event):
+        sink = getattr(_local, "sink", None)
+        if sink is not None and event.chunk:
+            sink(event.chunk, getattr(event, "task_name", None))
+
+
+@contextmanager
+def task_sink(callback):
+    """
+    Route task outputs finished on this thread to `callback(output)`.
+
+    Pooled crews are built with `forward_task_output` as their fixed
+    `task_callback` (crewAI copies it onto every task for good), so the
+    per-run callback lives here instead of on shared crew state.
+    """
+    previous = getattr(_local, "task_sink", None)
+    _local.task_sink = callback
+    try:
+        yield
+    finally:
+        _local.task_sink = previous
+
+
+def forward_task_output(output):
+    sink = getattr(_local, "task_sink", None)
+    if sink is not None:
+        sink(output)
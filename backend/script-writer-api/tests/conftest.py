@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+# Read by the app modules at import time, so they are set before any test imports them
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ["LLM_CACHE_SIZE"] = "0"
+os.environ["LLM_STREAM"] = "0"
+os.environ["QUALITY_GATE"] = "off"
+os.environ["INCREMENTAL_REFINE"] = "0"
+os.environ.setdefault("JOBS_DB", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+
+class FakeLLM:
+    """
+    Stands in for the provider behind every CachedLLM. Each call is answered
+    from `replies[task_name]` (a string or a function of the messages) and
+    recorded in `calls`; while `hold` is cleared, calls block until it is set.
+    """
+
+    def __init__(self):
+        self.replies = {}
+        self.calls = []
+        self.hold = threading.Event()
+        self.hold.set()
+        self.entered = threading.Event()
+
+    def __call__(self, messages, *args, **kwargs):
+        task = getattr(kwargs.get("from_task"), "name", None) or ""
+        self.calls.append(task)
+        self.entered.set()
+        self.hold.wait(10)
+        reply = self.replies.get(task, f"{task} done.")
+        if callable(reply):
+            reply = reply(messages)
+        return f"Thought: I now can give a great answer\nFinal Answer: {reply}"
+
+
+@pytest.fixture
+def fake_llm(monkeypatch, tmp_path):
+    pytest.importorskip("crewai")
+    from script_writer.llm_cache import CachedLLM
+
+    fake = FakeLLM()
+    fake.replies.update({
+        "rewrite_task": "INT. BANK - NIGHT\n\nLEAD ROBBER\nNobody move, I lost my keys.",
+        "draft_review_task": "Funny enough.",
+        "draft_supervisor_task": '{"ready": true, "rewrite_instructions": ""}',
+    })
+    monkeypatch.setattr(CachedLLM, "call", lambda self, messages, *args, **kwargs: fake(messages, *args, **kwargs))
+    # Runs write their final script under ./output
+    monkeypatch.chdir(tmp_path)
+    yield fake
+    fake.hold.set()
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from script_writer.jobs import JobManager, JobStore
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+def test_each_orphaned_job_is_recovered_by_exactly_one_process(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    # Left behind by a process that died without a heartbeat, plus one from before owners existed
+    orphans = [f"job{i}" for i in range(6)]
+    for job_id in orphans[:-1]:
+        store.insert(job_id, "user", {"n": job_id}, owner="dead-process")
+    store.insert(orphans[-1], "user", {"n": orphans[-1]})
+    store.update(orphans[0], status="running")
+
+    ran, lock = [], threading.Lock()
+
+    def runner(n, on_event):
+        with lock:
+            ran.append(n)
+        return {"n": n}
+
+    managers = [JobManager(JobStore(store.path), runner, lease_s=30) for _ in range(3)]
+    threads = [threading.Thread(target=manager.recover) for manager in managers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    _wait_for(lambda: all(store.get(job_id)["status"] == "completed" for job_id in orphans))
+    assert sorted(ran) == orphans
+    for manager in managers:
+        manager.shutdown()
+
+
+def test_jobs_of_a_live_process_are_left_alone(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.heartbeat("live-process", expired_before=0)
+    store.insert("busy", "user", {}, owner="live-process")
+    store.update("busy", status="running")
+
+    manager = JobManager(JobStore(store.path), lambda on_event: {}, lease_s=60)
+    assert store.claim_orphans(manager.owner, time.time() - manager.lease_s) == []
+    assert store.get("busy")["owner"] == "live-process"
+    assert store.get("busy")["status"] == "running"
+    manager.shutdown()
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+SCRIPT = "INT. BANK - NIGHT\n\nGUARD\nFreeze.\n\nEXT. STREET - NIGHT\n\nSirens.\n"
+
+
+def test_scene_and_line_targets_resolve_to_character_ranges():
+    from script_writer.patches import resolve_target
+
+    start, end = resolve_target(SCRIPT, "SCENE 2")
+    assert SCRIPT[start:end] == "EXT. STREET - NIGHT\n\nSirens.\n"
+    start, end = resolve_target(SCRIPT, "lines 3-4")
+    assert SCRIPT[start:end] == "GUARD\nFreeze.\n"
+    # Ranges running past the end are clipped to the last line
+    assert resolve_target(SCRIPT, "LINES 8-99")[1] == len(SCRIPT)
+
+
+@pytest.mark.parametrize("target", ["SCENE 0", "SCENE 3", "LINES 4-3", "LINES 99-100", "PAGE 2", ""])
+def test_targets_outside_the_script_do_not_resolve(target):
+    from script_writer.patches import resolve_target
+
+    assert resolve_target(SCRIPT, target) is None
+
+
+def test_patches_are_applied_against_the_original_offsets():
+    from script_writer.patches import apply_patches
+
+    patched, applied = apply_patches(SCRIPT, [
+        {"target": "scene 2", "text": "EXT. STREET - NIGHT\n\nA kazoo solo.\n\n"},
+        {"target": "LINES 3-4", "text": "GUARD\nFreeze, or I sneeze."},
+    ])
+
+    assert patched == "INT. BANK - NIGHT\n\nGUARD\nFreeze, or I sneeze.\n\nEXT. STREET - NIGHT\n\nA kazoo solo.\n"
+    assert applied == ["LINES 3-4", "SCENE 2"]
+
+
+def test_overlapping_and_malformed_patches_are_skipped():
+    from script_writer.patches import apply_patches
+
+    patched, applied = apply_patches(SCRIPT, [
+        {"target": "SCENE 1", "text": "INT. VAULT - NIGHT\n\nSilence."},
+        {"target": "LINES 3-4", "text": "overlaps scene 1"},
+        {"target": "SCENE 9", "text": "missing"},
+        {"target": "SCENE 2"},
+        "not a patch",
+    ])
+
+    assert applied == ["SCENE 1"]
+    assert patched == "INT. VAULT - NIGHT\n\nSilence.\n\nEXT. STREET - NIGHT\n\nSirens.\n"
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+SCRIPT = """TITLE PAGE
+
+INT. BANK - NIGHT
+
+GUARD
+Freeze.
+
+12 EXT. ROOF – DAY
+
+Wind.
+
+INT./EXT. CAR - CONTINUOUS
+
+I/E. HALLWAY
+
+Footsteps."""
+
+
+def test_split_keeps_headings_with_their_scenes_and_the_title_with_the_first():
+    from script_writer.scenes import join_scenes, split_scenes
+
+    scenes = split_scenes(SCRIPT)
+
+    assert [scene.splitlines()[0] for scene in scenes] == [
+        "TITLE PAGE", "12 EXT. ROOF – DAY", "INT./EXT. CAR - CONTINUOUS", "I/E. HALLWAY",
+    ]
+    assert "INT. BANK - NIGHT" in scenes[0]
+    assert split_scenes(join_scenes(scenes)) == scenes
+
+
+def test_text_without_headings_is_one_scene():
+    from script_writer.scenes import split_scenes
+
+    assert split_scenes("Just some prose.\n") == ["Just some prose."]
+    assert split_scenes("  \n") == []
+
+
+def test_batches_stay_under_the_size_and_in_order():
+    from script_writer.scenes import batch_scenes
+
+    scenes = ["a" * 40, "b" * 40, "c" * 30, "d" * 100, "e" * 10]
+    assert batch_scenes([0, 1, 2, 3, 4], scenes, max_chars=80) == [[0, 1], [2], [3], [4]]
+    # Only the indices passed in are batched
+    assert batch_scenes([1, 4], scenes, max_chars=80) == [[1, 4]]
+    assert batch_scenes([], scenes) == []
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+REQUEST = {"original_script": "INT. BANK - NIGHT\n\nGUARD\nFreeze.", "genre": "Comedy"}
+TASKS = ["rewrite_task", "draft_review_task", "draft_supervisor_task"]
+
+
+def sse_events(body):
+    return [json.loads(block.split("data: ", 1)[1]) for block in body.strip().split("\n\n")]
+
+
+@pytest.fixture
+def client(fake_llm):
+    from fastapi.testclient import TestClient
+
+    from api import app
+
+    return TestClient(app)
+
+
+def test_stream_reports_progress_in_order(client):
+    resp = client.post("/generate-script/stream", json=REQUEST)
+
+    assert resp.status_code == 200
+    events = sse_events(resp.text)
+    assert [e["type"] for e in events] == [
+        "start", "iteration_start", "task_complete", "task_complete", "task_complete", "decision", "result",
+    ]
+    completed = [e for e in events if e["type"] == "task_complete"]
+    assert [e["task"] for e in completed] == TASKS
+    assert all(e["iteration"] == 1 and e["output"] for e in completed)
+    assert events[-1]["result"]["ready"] is True
+
+
+def test_finished_stream_does_not_cancel_later_runs(client):
+    assert sse_events(client.post("/generate-script/stream", json=REQUEST).text)[-1]["type"] == "result"
+
+    resp = client.post("/generate-script/", json=REQUEST)
+
+    assert resp.status_code == 200
+    assert resp.json()["result"]["ready"] is True
+
+
+def test_disconnect_cancels_the_run(fake_llm, monkeypatch):
+    import api
+    from script_writer.jobs import JobCancelled
+
+    outcome = {}
+    done = threading.Event()
+    real_run = api.run_script_generation
+
+    def recording_run(*args, **kwargs):
+        try:
+            outcome["result"] = real_run(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+            raise
+        finally:
+            done.set()
+
+    monkeypatch.setattr(api, "run_script_generation", recording_run)
+    fake_llm.hold.clear()
+
+    async def disconnect_mid_rewrite():
+        loop = asyncio.get_running_loop()
+        response = await api.generate_script_stream(api.ScriptRequest(**REQUEST))
+        body = response.body_iterator
+        assert "event: start" in await body.__anext__()
+        assert await loop.run_in_executor(None, fake_llm.entered.wait, 10)
+        await body.aclose()
+        fake_llm.hold.set()
+        assert await loop.run_in_executor(None, done.wait, 10)
+        # Let the worker task see the cancellation before the loop closes
+        await asyncio.sleep(0.1)
+
+    asyncio.run(disconnect_mid_rewrite())
+
+    assert isinstance(outcome.get("error"), JobCancelled)
+    assert fake_llm.calls == ["rewrite_task"]
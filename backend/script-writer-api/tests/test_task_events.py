@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+TASKS = ["rewrite_task", "draft_review_task", "draft_supervisor_task"]
+
+
+def test_back_to_back_runs_on_a_pooled_crew_keep_their_own_events(fake_llm):
+    from api import run_script_generation
+    from script_writer.crew import draft_review_pool, rewrite_pool
+    from script_writer.jobs import JobCancelled
+
+    first, second = [], []
+    finished = False
+
+    def first_on_event(event):
+        # Like the SSE and fan-out callbacks once their client is gone
+        if finished:
+            raise JobCancelled("client disconnected")
+        first.append(event)
+
+    run_script_generation("INT. BANK - NIGHT\n\nGUARD\nFreeze.", "Comedy", on_event=first_on_event)
+    finished = True
+    built = rewrite_pool.created + draft_review_pool.created
+
+    result = run_script_generation("INT. BANK - NIGHT\n\nGUARD\nFreeze.", "Comedy", on_event=second.append)
+
+    # Same crews reused, and none of the second run's events reached the first run's callback
+    assert rewrite_pool.created + draft_review_pool.created == built
+    assert [e["task"] for e in first if e["type"] == "task_complete"] == TASKS
+    assert [e["task"] for e in second if e["type"] == "task_complete"] == TASKS
+    assert result["result"]["ready"] is True
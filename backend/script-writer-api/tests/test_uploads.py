@@ -0,0 +1,35 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("fitz")
+
+
+def _write(path, size, age_s):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    stamp = time.time() - age_s
+    os.utime(path, (stamp, stamp))
+
+
+def test_collect_uploads_drops_expired_then_oldest_over_quota(monkeypatch, tmp_path):
+    from script_writer import pdf_ingest
+
+    uploads, cache = tmp_path / "uploads", tmp_path / "uploads" / "text_cache"
+    cache.mkdir(parents=True)
+    monkeypatch.setattr(pdf_ingest, "UPLOAD_DIR", str(uploads))
+    monkeypatch.setattr(pdf_ingest, "PDF_CACHE_DIR", str(cache))
+
+    _write(uploads / "expired.pdf", 10, 500)
+    _write(uploads / "queued.pdf", 10, 500)
+    _write(uploads / "old.pdf", 10, 30)
+    _write(cache / "old.txt", 10, 20)
+    _write(uploads / "new.pdf", 10, 10)
+    _write(uploads / "spool.part", 10, 40)
+
+    freed = pdf_ingest.collect_uploads(keep=[str(uploads / "queued.pdf")], max_age_s=100, max_bytes=30)
+
+    assert freed == 30
+    assert sorted(os.listdir(uploads)) == ["new.pdf", "queued.pdf", "spool.part", "text_cache"]
+    assert os.listdir(cache) == []